@@ -0,0 +1,169 @@
+# app/agent/async_customer_support_agent.py
+
+import asyncio
+from typing import Literal, Optional
+
+from app.agent.async_supervisor_agent import AsyncSupervisorAgent
+from app.agent.customer_support_agent import CustomerSupportAgent, REQUIRED_KEYS, MAX_MSG
+from app.agent.post_call_worker import post_call_job
+from app.llm_modules.model_router import for_purpose
+from app.utils.io_comunications import AsyncUserIO
+from app.utils.storage import save_conversation
+
+
+class AsyncCustomerSupportAgent(CustomerSupportAgent):
+    """
+    Async version of the CustomerSupportAgent.
+
+    Every model call is awaited (model needs `achat`) and the input/output goes through an async
+    transport, so one event loop can hold hundreds of sessions at the same time, each one only
+    using the loop while it is not waiting on the model or on the user.
+    The conversation flow is the same one as the sync agent.
+    """
+    def __init__(self, model, mode: Literal["rigid", "natural"] = "rigid", company: str = "ExampleCorp", audio_mode: bool = True, lang: str = "en", verbose: bool = False, read_silence_duration: float = 2.0, read_max_duration: int = 60, read_silence_threshold: int = 5, extraction_mode: Literal["per_field", "structured"] = "per_field", context_budget: Optional[int] = 3000, speculative_reply: bool = False, checkpoint_store=None, session_id: Optional[str] = None, fast_extraction: bool = False, post_call_queue=None, supervisor_mode: Literal["dialogue", "verdict"] = "dialogue", userIO=None) -> None:
+        """
+        Same arguments as CustomerSupportAgent, plus:
+            userIO: Async input/output with `async read(prefix, audio)` and `async write(msg, audio)`.
+                    If None, the console/microphone UserIO is used from a worker thread.
+        """
+        super().__init__(model, mode, company, audio_mode, lang, verbose, read_silence_duration, read_max_duration, read_silence_threshold, extraction_mode, context_budget, speculative_reply, checkpoint_store, session_id, fast_extraction, post_call_queue, supervisor_mode)
+        self.supervisor = AsyncSupervisorAgent(for_purpose(model, "supervisor"), REQUIRED_KEYS, lang, verbose, mode=supervisor_mode)
+        self.userIO = userIO if userIO else AsyncUserIO(self.userIO)
+
+    async def start(self):
+        if self.mode == "rigid":
+            await self._start_rigid()
+        elif self.mode == "natural":
+            await self._start_natural()
+        else:
+            raise ValueError("Mode must be 'rigid' or 'natural'")
+
+    async def _start_rigid(self):
+        questions = self.prompts["questions"]
+
+        if not self.conversation: # Else resumed from a checkpoint, the answered questions are skipped
+            self.conversation.append({"role": "developer", "content": self.prompts["system_prompt"]})
+
+        for key, q in questions.items():
+            if key in self.extracted:
+                continue # Already given by the user in a previous answer (structured extraction)
+            while True:
+                await self.userIO.write(f"🤖 {q}", audio=self.audio_mode)
+                user_input = await self.userIO.read("> ", audio=self.audio_mode)
+                self.conversation.extend([{"role": "assistant", "content": q}, {"role": "user", "content": user_input}])
+
+                keys = [key] if self.extractor.mode == "per_field" else [k for k in REQUIRED_KEYS if k not in self.extracted]
+                self._store_extracted(await self.extractor.aextract(await self.context_budget.afit(self.conversation), keys, invalid_response="INVALID"))
+                await self._acheckpoint()
+                if key in self.extracted:
+                    break
+                await self.userIO.write(self.prompts["invalid_input"], audio=self.audio_mode)
+
+        await self._finish_call("rigid", frustration_role="developer")
+
+    async def _start_natural(self):
+        if self.full_conversation:
+            # Resumed from a checkpoint, repeat the last message the user got
+            await self.userIO.write(f"🤖 {self._last_assistant_message()}", audio=self.audio_mode)
+        else:
+            welcome = self.prompts["welcome"].format(company=self.company)
+            await self.userIO.write(f"🤖 {welcome}", audio=self.audio_mode)
+            self.store.append("system", self.prompts["system_prompt"])
+            self.store.append("assistant", welcome)
+            await self._acheckpoint()
+
+        while not self._all_info_collected() and self.msgs_count < MAX_MSG: # To prevent infinite conversations
+            self.store.new_turn()
+
+            user_input = await self.userIO.read("> ", audio=self.audio_mode)
+            self.store.append("user", user_input)
+
+            msg = self.prompts["partial_notes"].format(extracted=self.extracted)
+            self.store.append("developer", msg)
+            self.conversation = await self.context_budget.afit(self.store.turn)
+
+            speculative = speculative_prompt = None
+            if self.speculative_reply:
+                # Copied, the views of the store change with the messages added during the turn
+                speculative_prompt = list(await self._areply_prompt(self._known_history()))
+                speculative = asyncio.create_task(for_purpose(self.model, "reply").achat(speculative_prompt))
+
+            missing_keys = [key for key in REQUIRED_KEYS if key not in self.extracted]
+            self._store_extracted(await self.extractor.aextract(self.conversation, missing_keys, invalid_response="NONE"))
+
+            if self._all_info_collected() or self.msgs_count % self.check_every_n_msg == 0:
+                validation = await (self.supervisor.review if self.adaptive_supervisor else self.supervisor.validate)(self.conversation, self.extracted)
+                if validation:
+                    if speculative:
+                        speculative.cancel()
+                    await self.userIO.write(f"🤖 {self.prompts['thanks_message']}", audio=self.audio_mode)
+                    break
+                else:
+                    msg = self.prompts["supervisor_correction"].format(extracted=self.extracted, required_keys=REQUIRED_KEYS)
+                    self._add_message("developer", msg)
+
+            # Reading the stored sessions is file I/O, keep it out of the event loop
+            conv_history = await asyncio.to_thread(self._check_and_add_history)
+            reply_prompt = await self._areply_prompt(conv_history)
+
+            if speculative and reply_prompt == speculative_prompt:
+                self.speculative_hits += 1
+                assistant_reply = await speculative
+            else:
+                if speculative:
+                    speculative.cancel()
+                    self.speculative_misses += 1
+                assistant_reply = await for_purpose(self.model, "reply").achat(reply_prompt)
+            await self.userIO.write(f"🤖 {assistant_reply}", audio=self.audio_mode)
+            self._add_message("assistant", assistant_reply)
+            if self.verbose:
+                print(f"[DEBUG] \n MODEL Prompt: {reply_prompt} \n assistant_reply: {assistant_reply}")
+
+            self.msgs_count += 1
+            await self._acheckpoint()
+
+        self.conversation = self.remove_developer_notes()
+        msg = self.prompts["partial_notes"].format(extracted=self.extracted)
+        self.conversation.append({"role": "developer", "content": msg})
+        await self._finish_call("natural", frustration_role="assistant")
+
+    async def _acheckpoint(self):
+        # Writing to the store is file I/O, keep it out of the event loop
+        if self.checkpointer:
+            await asyncio.to_thread(self.checkpointer.checkpoint, self)
+
+    async def _areply_prompt(self, conv_history):
+        """
+        Async version of `_reply_prompt`.
+        """
+        if not conv_history:
+            return self.conversation
+        self.store.pin(conv_history)
+        return await self.context_budget.afit(self.store.reply())
+
+    async def _finish_call(self, mode: str, frustration_role: str):
+        """
+        Summarizes the conversation and scores the customer frustration (both calls run concurrently),
+        then saves the session and shows the results.
+        """
+        summary_prompt, frustration_prompt = self._post_call_prompts(await self.context_budget.afit(self.conversation), frustration_role)
+        if self.post_call_queue:
+            # Writing the job is file I/O, keep it out of the event loop
+            await asyncio.to_thread(self.post_call_queue.put, post_call_job(self.extracted, self.conversation, summary_prompt, frustration_prompt, mode, self.lang))
+            if self.checkpointer:
+                await asyncio.to_thread(self.checkpointer.delete)
+            await self.userIO.write(self.prompts["extracted_info"].format(extracted=self.extracted), audio=self.audio_mode)
+            return
+
+        summary, frustration_score = await asyncio.gather(
+            for_purpose(self.model, "summary").achat(summary_prompt),
+            for_purpose(self.model, "frustration").achat(frustration_prompt),
+        )
+        frustration_score = self._parse_frustration_score(frustration_prompt, frustration_score)
+
+        await asyncio.to_thread(save_conversation, self.extracted, self.conversation, summary, mode, frustration_score, self.lang)
+        if self.checkpointer:
+            await asyncio.to_thread(self.checkpointer.delete) # The session is saved, it can not be resumed anymore
+
+        for msg in self._results_messages(summary, frustration_score):
+            await self.userIO.write(msg, audio=self.audio_mode)
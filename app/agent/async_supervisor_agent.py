@@ -0,0 +1,38 @@
+# app/agent/async_supervisor_agent.py
+
+from app.agent.supervisor_agent import SupervisorAgent
+
+
+class AsyncSupervisorAgent(SupervisorAgent):
+    """
+    Async version of the SupervisorAgent, the model calls are awaited (model needs `achat`)
+    so many sessions can be reviewed concurrently on one event loop.
+    The review dialogue is the same one as the sync supervisor (`_validation_steps`).
+    """
+
+    async def validate(self, conversation, extracted):
+        """
+        Runs the supervisor review of the notes, fixing `extracted` in place.
+
+        Returns:
+            bool: True if the notes are correct and complete.
+        """
+        return await self._arun(self._validation_steps(conversation, extracted))
+
+    async def review(self, conversation, extracted):
+        """
+        Adaptive version of `validate`, see `SupervisorAgent.review`.
+
+        Returns:
+            bool: True if the notes are correct and complete.
+        """
+        return await self._arun(self._review_steps(conversation, extracted))
+
+    async def _arun(self, steps):
+        try:
+            manager_conv = next(steps)
+            while True:
+                self.calls += 1
+                manager_conv = steps.send(await self.model.achat(manager_conv))
+        except StopIteration as done:
+            return done.value
@@ -0,0 +1,243 @@
+# app/agent/bulk_rescorer.py
+#
+# Re-runs the summary and the frustration score of the stored sessions, e.g. after changing the
+# `summary_instruction` or `customer_frustration` prompts:
+#   python -m app.agent.bulk_rescorer --backend ollama --workers 16
+#   python -m app.agent.bulk_rescorer --only frustration --checkpoint data/rescore_frustration.json
+# Stopped runs continue from their checkpoint, --restart starts over.
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from app.agent.context_budget import ContextBudget
+from app.agent.post_call_worker import FRUSTRATION_ROLES, parse_frustration_score, post_call_prompts
+from app.llm_modules.model_router import for_purpose
+from app.utils.prompt_loader import load_prompts
+from app.utils.storage import list_all_orders, load_conversations, update_sessions
+
+FIELDS = ("summary", "frustration")
+
+
+class BulkRescorer:
+    """
+    Recomputes the summary and/or the frustration score of every stored session with the current prompts.
+
+    The orders are streamed in name order: the sessions of each order are loaded with `load_conversations`,
+    rescored by a pool of `workers` threads (the calls are I/O bound, so threads are enough and the model
+    clients are shared), and the order file is written back atomically once all its sessions are done.
+    At most `2 * workers` sessions are loaded at a time, whatever the number of stored sessions.
+
+    After each order the progress is written to a checkpoint file (last order done and the orders with
+    failed sessions), so a stopped run continues where it stopped. The checkpoint holds a fingerprint of
+    the prompts and fields, a run with other prompts starts over.
+    """
+    def __init__(self, model, checkpoint_path: Optional[str] = "data/rescore_checkpoint.json", workers: int = 8,
+                 fields: Iterable[str] = FIELDS, context_budget: Optional[int] = 3000, verbose: bool = False) -> None:
+        """
+        Args:
+            model: LLM model exposing a `chat(messages)` method (the calls are tagged "summary" and "frustration").
+            checkpoint_path (Optional[str]): Progress file of the run, None to disable the resume.
+            workers (int): Sessions rescored at the same time.
+            fields (Iterable[str]): Fields to recompute, "summary" and/or "frustration".
+            context_budget (Optional[int]): Token budget of the prompts, as in the agents (None to disable).
+            verbose (bool): If True, prints the errors of the failed sessions.
+        """
+        self.fields = tuple(fields)
+        if not self.fields or any(field not in FIELDS for field in self.fields):
+            raise ValueError(f"fields must be a non empty subset of {FIELDS}")
+        self.model = model
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path else None
+        self.workers = workers
+        self.context_budget = context_budget
+        self.verbose = verbose
+
+        self._prompts = {} # lang -> customer support prompts
+        self._fingerprint_value = None
+        self._lock = threading.Lock()
+        self.orders = 0
+        self.sessions = 0
+        self.calls = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    def run(self, restart: bool = False, report_every: Optional[float] = 10.0) -> Dict[str, float]:
+        """
+        Rescores all the orders not done by a previous run.
+
+        Args:
+            restart (bool): If True, ignores the checkpoint and rescores every order.
+            report_every (Optional[float]): Seconds between the progress lines, None for no output.
+
+        Returns:
+            Dict[str, float]: The stats of the run (see `stats`).
+        """
+        checkpoint = None if restart else self._load_checkpoint()
+        last_order = checkpoint["last_order"] if checkpoint else None
+        retry = set(checkpoint["failed_orders"]) if checkpoint else set()
+        failed_orders = []
+        orders = [order for order in sorted(list_all_orders()) if last_order is None or order > last_order or order in retry]
+
+        start = time.perf_counter()
+        last_report = start
+        pending = deque() # (order, futures of its sessions), finished in order
+        in_flight = 0
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="rescore") as pool:
+            for order in orders + [None]:
+                if order is not None:
+                    sessions = load_conversations(order)
+                    pending.append((order, [(session.get("timestamp"), pool.submit(self.rescore, session)) for session in sessions]))
+                    in_flight += len(sessions)
+
+                # Write the oldest orders once their sessions are done (all of them after the last order)
+                while pending and (order is None or in_flight > 2 * self.workers or all(f.done() for _, f in pending[0][1])):
+                    done_order, futures = pending.popleft()
+                    in_flight -= len(futures)
+                    if not self._write_order(done_order, futures):
+                        failed_orders.append(done_order)
+                    if last_order is None or done_order > last_order:
+                        last_order = done_order
+                    self._save_checkpoint(last_order, failed_orders + [o for o in retry if o > done_order])
+
+                    self.elapsed = time.perf_counter() - start
+                    if report_every is not None and time.perf_counter() - last_report >= report_every:
+                        last_report = time.perf_counter()
+                        print(self.report())
+
+        self.elapsed = time.perf_counter() - start
+        return self.stats()
+
+    def rescore(self, session: dict) -> Dict[str, object]:
+        """
+        Returns the recomputed fields of a session ("summary" and/or "frustration_score").
+        """
+        lang = session.get("lang", "en")
+        prompts = self._load_prompts(lang)
+        budget = ContextBudget(for_purpose(self.model, "summary"), prompts, max_tokens=self.context_budget)
+        conversation = budget.fit(session.get("conversation", []))
+        summary_prompt, frustration_prompt = post_call_prompts(prompts, conversation, FRUSTRATION_ROLES.get(session.get("mode"), "assistant"))
+
+        results = {}
+        if "summary" in self.fields:
+            results["summary"] = for_purpose(self.model, "summary").chat(summary_prompt)
+        if "frustration" in self.fields:
+            results["frustration_score"] = parse_frustration_score(for_purpose(self.model, "frustration").chat(frustration_prompt))
+        with self._lock:
+            self.calls += len(results) + budget.compactions
+        return results
+
+    def stats(self) -> Dict[str, float]:
+        """
+        Returns:
+            Dict[str, float]: Orders and sessions rescored, LLM calls, failed sessions, elapsed seconds, sessions/sec and calls/sec.
+        """
+        with self._lock:
+            elapsed = max(self.elapsed, 1e-9)
+            return {"orders": self.orders, "sessions": self.sessions, "calls": self.calls, "failed": self.failed,
+                    "elapsed": self.elapsed, "sessions_per_sec": self.sessions / elapsed, "calls_per_sec": self.calls / elapsed}
+
+    def report(self) -> str:
+        stats = self.stats()
+        return (f"{stats['orders']} orders, {stats['sessions']} sessions ({stats['failed']} failed), {stats['calls']} calls "
+                f"in {stats['elapsed']:.1f}s: {stats['sessions_per_sec']:.2f} sessions/s, {stats['calls_per_sec']:.2f} calls/s")
+
+    def _write_order(self, order: str, futures: List) -> bool:
+        """
+        Writes the results of the sessions of an order, returns False if one of them failed.
+        """
+        results = {}
+        failed = 0
+        for timestamp, future in futures:
+            try:
+                results[timestamp] = future.result()
+            except Exception as e:
+                failed += 1
+                if self.verbose:
+                    print(f"[DEBUG] Rescoring {order} {timestamp} failed: {e!r}")
+
+        def update(session):
+            result = results.get(session.get("timestamp"))
+            if result is None:
+                return False # Failed, or saved after the order was loaded
+            session.update(result)
+            return True
+
+        update_sessions(order, update)
+        with self._lock:
+            self.orders += 1
+            self.sessions += len(results)
+            self.failed += failed
+        return not failed
+
+    def _load_prompts(self, lang: str) -> dict:
+        if lang not in self._prompts:
+            self._prompts[lang] = load_prompts("customer_support", lang)
+        return self._prompts[lang]
+
+    def _fingerprint(self) -> str:
+        if self._fingerprint_value:
+            return self._fingerprint_value
+        prompts = {}
+        for name in sorted(os.listdir(os.path.join("app", "prompts", "customer_support"))):
+            lang = Path(name).stem
+            prompts[lang] = [self._load_prompts(lang)[key] for key in ("summary_instruction", "customer_frustration", "compaction_instruction")]
+        self._fingerprint_value = hashlib.sha256(json.dumps([self.fields, prompts], sort_keys=True).encode()).hexdigest()
+        return self._fingerprint_value
+
+    def _load_checkpoint(self) -> Optional[dict]:
+        if not self.checkpoint_path or not self.checkpoint_path.exists():
+            return None
+        with open(self.checkpoint_path, "r") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("fingerprint") != self._fingerprint():
+            print(f"{self.checkpoint_path} was written with other prompts or fields, starting over")
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, last_order: str, failed_orders: List[str]) -> None:
+        if not self.checkpoint_path:
+            return
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_name(f".{self.checkpoint_path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump({"fingerprint": self._fingerprint(), "last_order": last_order, "failed_orders": sorted(failed_orders)}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recomputes the summary and frustration score of the stored sessions.")
+    parser.add_argument("--backend", default="openai", choices=["openai", "ollama"])
+    parser.add_argument("--base-url", default=None, help="Ollama API (or OpenAI compatible API) to use")
+    parser.add_argument("--workers", type=int, default=8, help="Sessions rescored at the same time")
+    parser.add_argument("--only", default=None, choices=FIELDS, help="Recompute only one of the fields")
+    parser.add_argument("--checkpoint", default="data/rescore_checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint of a previous run")
+    parser.add_argument("--context-budget", type=int, default=3000)
+    parser.add_argument("--report-every", type=float, default=10.0, help="Seconds between progress lines")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    if args.backend == "ollama":
+        from app.llm_modules.http_transport import HTTPTransport
+        from app.llm_modules.ollama_mistral7b import OllamaMistral7B_Model
+        model = OllamaMistral7B_Model(base_url=args.base_url, transport=HTTPTransport(pool_size=args.workers))
+    else:
+        from openai import OpenAI
+        from app.llm_modules.open_ai import OpenAI_Model
+        model = OpenAI_Model(client=OpenAI(base_url=args.base_url))
+
+    rescorer = BulkRescorer(model, args.checkpoint, workers=args.workers, fields=[args.only] if args.only else FIELDS,
+                            context_budget=args.context_budget, verbose=args.verbose)
+    rescorer.run(restart=args.restart, report_every=args.report_every)
+    print(rescorer.report())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+# app/agent/context_budget.py
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.utils.tokens import estimate_tokens
+
+
+class ContextBudget:
+    """
+    Keeps the prompts of a conversation under a token budget.
+
+    While the conversation fits in the budget it is sent as it is. Once it does not, the system prompt,
+    the latest notes (developer messages after the last user message) and the `keep_recent` last messages
+    are kept verbatim, and the older turns and the injected order history are folded into a rolling summary
+    (one developer message after the system prompt, tagged with `"summary": True`). The messages already in the summary are remembered,
+    so each compaction only summarizes the messages that left the recent window since the previous one,
+    and older messages are kept verbatim again until the budget is exceeded (the prompt prefix stays the
+    same between compactions).
+    """
+
+    def __init__(self, model, prompts: dict, max_tokens: Optional[int] = 3000, keep_recent: int = 6, verbose: bool = False) -> None:
+        """
+        Args:
+            model: LLM model exposing a `chat(messages)` method (`achat` for `afit`), used to write the summary.
+            prompts (dict): Customer support prompts (needs `compaction_instruction` and `compacted_history`).
+            max_tokens (Optional[int]): Estimated tokens allowed per prompt, None or 0 to disable the compaction.
+            keep_recent (int): Number of latest messages always kept verbatim.
+            verbose (bool): If True, prints the compaction prompts and results.
+        """
+        self.model = model
+        self.prompts = prompts
+        self.max_tokens = max_tokens
+        self.keep_recent = keep_recent
+        self.verbose = verbose
+
+        self.summary = None # Rolling summary of the compacted messages
+        self._summarized = set() # (role, content) of the messages already in the summary
+        self.compactions = 0
+
+    def summarized_messages(self) -> Set[Tuple[str, str]]:
+        """
+        Returns the (role, content) of the messages already in the summary (a copy).
+        """
+        return set(self._summarized)
+
+    def restore(self, summary: Optional[str], summarized: Set[Tuple[str, str]], compactions: int) -> None:
+        """
+        Sets the summary state of a previous budget of the conversation (e.g. from a checkpoint).
+
+        Args:
+            summary (Optional[str]): Rolling summary, None if there was no compaction.
+            summarized (Set[Tuple[str, str]]): (role, content) of the messages in the summary.
+            compactions (int): Compactions done.
+        """
+        self.summary = summary
+        self._summarized = set(summarized)
+        self.compactions = compactions
+
+    def fit(self, conversation: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Returns the conversation to send to the model, compacted if it exceeds the budget.
+        The given list is not modified.
+
+        Args:
+            conversation (List[Dict[str, str]]): Full conversation of the call.
+
+        Returns:
+            List[Dict[str, str]]: The conversation, or its compacted version.
+        """
+        steps = self._fit_steps(conversation)
+        try:
+            compaction_prompt = next(steps)
+            while True:
+                compaction_prompt = steps.send(self.model.chat(compaction_prompt))
+        except StopIteration as done:
+            return done.value
+
+    async def afit(self, conversation: List[Dict[str, str]]) -> List[Dict[str, str]]:
+        """
+        Async version of `fit` (model needs `achat`).
+        """
+        steps = self._fit_steps(conversation)
+        try:
+            compaction_prompt = next(steps)
+            while True:
+                compaction_prompt = steps.send(await self.model.achat(compaction_prompt))
+        except StopIteration as done:
+            return done.value
+
+    def _fit_steps(self, conversation: List[Dict[str, str]]):
+        """
+        Compaction logic, shared by `fit` and `afit`. Yields the compaction prompt when a summary
+        is needed and receives the model answer back. Returns the conversation to send.
+        """
+        if not self.max_tokens or estimate_tokens(conversation) <= self.max_tokens:
+            return conversation
+
+        # A conversation that was already compacted may be given again (e.g. after inserting the history)
+        summary_messages = self._summary_messages()
+        conversation = [m for m in conversation if not m.get("summary")]
+
+        head, older, recent = self._split(conversation)
+        pending = [m for m in older if self._message_key(m) not in self._summarized]
+
+        candidate = head + summary_messages + pending + recent
+        if estimate_tokens(candidate) <= self.max_tokens or not pending:
+            return candidate # The previous summary is enough (or only the verbatim messages are left)
+
+        compaction_prompt = [{
+            "role": "developer",
+            "content": self.prompts["compaction_instruction"].format(summary=self.summary or "", messages=self._render(pending))
+        }]
+        summary = yield compaction_prompt
+        if self.verbose:
+            print(f"[DEBUG] \n Compaction Prompt: {compaction_prompt} \n Summary: {summary}")
+
+        self.summary = summary.strip()
+        self._summarized.update(self._message_key(m) for m in pending)
+        self.compactions += 1
+        return head + self._summary_messages() + recent
+
+    def _split(self, conversation: List[Dict[str, str]]) -> Tuple[List[Dict[str, str]], List[Dict[str, str]], List[Dict[str, str]]]:
+        """
+        Splits the conversation in (system prompt, older messages, messages kept verbatim).
+        """
+        head = conversation[:1] if conversation and conversation[0].get("role") in ("system", "developer") else []
+        body = conversation[len(head):]
+
+        last_user = max((i for i, m in enumerate(body) if m.get("role") == "user"), default=-1)
+        recent_start = max(len(body) - self.keep_recent, 0)
+        older, recent = [], []
+        for i, message in enumerate(body):
+            is_latest_note = i > last_user and message.get("role") == "developer"
+            if i >= recent_start or is_latest_note:
+                recent.append(message)
+            else:
+                older.append(message)
+        return head, older, recent
+
+    def _summary_messages(self) -> List[Dict[str, str]]:
+        if not self.summary:
+            return []
+        # Tagged, so the prompts that embed the conversation (e.g. the supervisor transcript) can tell it from the notes
+        return [{"role": "developer", "content": self.prompts["compacted_history"].format(summary=self.summary), "summary": True}]
+
+    @staticmethod
+    def _render(messages: List[Dict[str, str]]) -> str:
+        return "\n".join(f"[{m.get('role', '').upper()}]: {m.get('content', '')}" for m in messages)
+
+    @staticmethod
+    def _message_key(message: Dict[str, str]) -> Tuple[str, str]:
+        return message.get("role", ""), message.get("content", "")
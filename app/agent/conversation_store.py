@@ -0,0 +1,87 @@
+# app/agent/conversation_store.py
+
+from typing import Dict, List, Optional
+
+
+class ConversationStore:
+    """
+    Keeps the messages of a natural conversation once and the views the prompts are built from.
+
+    Views (lists holding the same message dicts as the log, updated as messages are appended):
+        - messages: every message, developer notes included (what is checkpointed).
+        - dialog: the messages without the developer notes (what is saved at the end of the call).
+        - turn: the dialog plus the notes of the current turn (extraction and supervisor prompts).
+        - reply: the turn view with the pinned context (order history) after the system prompt.
+
+    The notes of a turn are always after its user message, so `new_turn` only removes them from the
+    tail of the views and the work of each turn depends on the new messages, not on the conversation length.
+    The views are returned as they are, callers that keep a prompt for later must copy it.
+    """
+    def __init__(self, messages: Optional[List[Dict[str, str]]] = None) -> None:
+        """
+        Args:
+            messages (Optional[List[Dict[str, str]]]): Log of a previous run (e.g. restored from a checkpoint).
+        """
+        self.messages = []
+        self.dialog = []
+        self.turn = []
+        self._reply = None # Turn view with the context message, None while there is no context
+        self._notes = [] # Positions of the current notes in the turn view
+        if messages:
+            last_user = max((i for i, m in enumerate(messages) if m["role"] == "user"), default=-1)
+            for i, message in enumerate(messages):
+                self.messages.append(message)
+                if message["role"] != "developer":
+                    self.dialog.append(message)
+                    self.turn.append(message)
+                elif i > last_user:
+                    self._notes.append(len(self.turn))
+                    self.turn.append(message)
+
+    def append(self, role: str, content: str) -> Dict[str, str]:
+        """
+        Adds a message to the log and to the views.
+
+        Returns:
+            Dict[str, str]: The message, shared by the log and the views.
+        """
+        message = {"role": role, "content": content}
+        self.messages.append(message)
+        if role == "developer":
+            self._notes.append(len(self.turn))
+        else:
+            self.dialog.append(message)
+        self.turn.append(message)
+        if self._reply is not None:
+            self._reply.append(message)
+        return message
+
+    def new_turn(self) -> None:
+        """
+        Removes the notes of the previous turn from the turn and reply views (they stay in the log).
+        """
+        for position in reversed(self._notes):
+            del self.turn[position]
+            if self._reply is not None:
+                del self._reply[position + 1]
+        self._notes = []
+
+    def pin(self, content: Optional[str]) -> None:
+        """
+        Sets the context message of the reply view (a developer message after the system prompt).
+        The view is built the first time, a new content only replaces the message.
+        """
+        if not content:
+            self._reply = None
+            return
+        message = {"role": "developer", "content": content}
+        if self._reply is None:
+            self._reply = self.turn[:1] + [message] + self.turn[1:]
+        elif self._reply[1]["content"] != content:
+            self._reply[1] = message
+
+    def reply(self) -> List[Dict[str, str]]:
+        """
+        Returns the reply view, the turn view if no context is pinned.
+        """
+        return self._reply if self._reply is not None else self.turn
@@ -2,10 +2,19 @@
 
 
 from app.agent.supervisor_agent import SupervisorAgent
+from app.agent.field_extractor import FieldExtractor
+from app.agent.context_budget import ContextBudget
+from app.agent.conversation_store import ConversationStore
+from app.agent.history_retriever import HistoryRetriever
+from app.agent.post_call_worker import parse_frustration_score, post_call_job, post_call_prompts
+from app.agent.speculative_reply import SpeculativeReply
+from app.agent.session_checkpoint import SessionCheckpointer, apply_state, restore_state
+from app.llm_modules.model_router import for_purpose
 
 from app.utils.io_comunications import UserIO #write, read
-from app.utils.storage import save_conversation, load_conversations, list_all_orders
-from typing import Literal
+from app.utils.storage import save_conversation, load_order_history
+from typing import Literal, Optional
+import uuid
 
 from app.utils.prompt_loader import load_prompts
 
@@ -17,22 +26,64 @@ MAX_MSG = 50
 
 class CustomerSupportAgent:
     check_every_n_msg = 3 # After how many msg the suppervisor is going to check the work of the customer agent
-    cached_order_logs = None
-    def __init__(self, model, mode: Literal["rigid", "natural"] = "rigid", company: str = "ExampleCorp", audio_mode:bool = True, lang: str = "en", verbose:bool = False, read_silence_duration:float= 2.0, read_max_duration:int = 60, read_silence_threshold:int = 5) -> None:
+    adaptive_supervisor = False # If True, the supervisor model only reviews notes that changed since its last approval or failed the local checks (saves calls on long calls only, see benchmarks/supervisor_calls.py)
+    history_top_k = 4 # Snippets of the previous sessions of the order selected by relevance
+    history_budget = 400 # Estimated tokens of the order history added to the reply prompt
+    history_query_keys = ("category", "description") # Issue fields used to find the relevant snippets, the history is retrieved again only when they change
+    history_query_messages = 4 # Latest user messages used instead while none of those fields is known
+    def __init__(self, model, mode: Literal["rigid", "natural"] = "rigid", company: str = "ExampleCorp", audio_mode:bool = True, lang: str = "en", verbose:bool = False, read_silence_duration:float= 2.0, read_max_duration:int = 60, read_silence_threshold:int = 5, extraction_mode: Literal["per_field", "structured"] = "per_field", context_budget: Optional[int] = 3000, speculative_reply: bool = False, checkpoint_store=None, session_id: Optional[str] = None, fast_extraction: bool = False, post_call_queue=None, supervisor_mode: Literal["dialogue", "verdict"] = "dialogue") -> None:
         self.model = model
         self.mode = mode
         self.company = company
         self.audio_mode = audio_mode
         self.verbose = verbose
         self.lang = lang
+        self.speculative_reply = speculative_reply # Start the reply while the notes are extracted (natural mode)
+        self.speculative_hits = 0 # Speculative replies used
+        self.speculative_misses = 0 # Speculative replies discarded because the reply prompt changed
         self.prompts = load_prompts("customer_support", lang)
 
         self.conversation = [] # This will contain only the latest notes, al previous ones are removed from the conversation
-        self.full_conversation = [] # Contains all the notes
+        self.store = ConversationStore() # Natural mode: the full log (with all the notes) and the prompt views, updated as messages are added
         self.extracted = {}
-        self.supervisor = SupervisorAgent(model, REQUIRED_KEYS, lang, verbose)
+        self.msgs_count = 1 # count the msg wiht the user
+        self.cached_order_logs = None # History of the order rendered for the prompts of this session
+        self._history_sessions = None # Stored sessions indexed by the retriever (shared by the order history cache)
+        self._history_retriever = None
+        self._history_key = None # Order and issue fields of the rendered history
+        # The state is written to the checkpoint store after each turn, so another process can resume the session (None to disable)
+        self.session_id = session_id if session_id else (uuid.uuid4().hex if checkpoint_store else None)
+        self.checkpointer = SessionCheckpointer(checkpoint_store, self.session_id) if checkpoint_store else None
+        # With a PostCallQueue the summary, the frustration score and the storage are left to a PostCallWorker, the call ends with the last reply
+        self.post_call_queue = post_call_queue
+        # Each kind of call is tagged with its purpose, so a Routed_Model can send it to a different backend
+        self.supervisor = SupervisorAgent(for_purpose(model, "supervisor"), REQUIRED_KEYS, lang, verbose, mode=supervisor_mode) # verdict: one JSON call per review, dialogue: 2 to 4 yes/no and fix calls
+        self.extractor = FieldExtractor(for_purpose(model, "extraction"), self.prompts, verbose, mode=extraction_mode, lang=lang, fast_path=fast_extraction) # per_field: concurrent call per missing key, structured: one JSON call per turn. The fast path settles the order numbers and the answers that are only a category/urgency without the model
+        self.context_budget = ContextBudget(for_purpose(model, "summary"), self.prompts, max_tokens=context_budget, verbose=verbose) # Compacts older turns and history once the prompts exceed the budget (None to disable)
         self.userIO = UserIO(model, verbose, silence_duration=read_silence_duration, max_duration=read_max_duration,silence_threshold=read_silence_threshold)# Needed for text/audio input/ouputs comunications
         
+    @classmethod
+    def from_checkpoint(cls, model, checkpoint_store, session_id: str, **kwargs):
+        """
+        Rebuilds the agent of a session from its checkpoint, `start()` continues the conversation.
+
+        Args:
+            model: LLM model used by the agent.
+            checkpoint_store: Store holding the checkpoint of the session.
+            session_id (str): Id of the session.
+            **kwargs: Arguments that are not part of the checkpoint (verbose, read_* options, userIO of the async agent).
+
+        Raises:
+            KeyError: If the store has no checkpoint for the session.
+        """
+        records = checkpoint_store.load(session_id)
+        if not records:
+            raise KeyError(f"No checkpoint for session {session_id}")
+        state = restore_state(records)
+        agent = cls(model, **state["config"], checkpoint_store=checkpoint_store, session_id=session_id, **kwargs)
+        apply_state(agent, state)
+        agent.checkpointer.resumed(agent)
+        return agent
 
 
     def start(self):
@@ -54,9 +105,12 @@ class CustomerSupportAgent:
         }"""
         questions = self.prompts["questions"]
 
-        self.conversation.append({"role": "developer", "content": self.prompts["system_prompt"]}) 
+        if not self.conversation: # Else resumed from a checkpoint, the answered questions are skipped
+            self.conversation.append({"role": "developer", "content": self.prompts["system_prompt"]}) 
 
         for key, q in questions.items():
+            if key in self.extracted:
+                continue # Already given by the user in a previous answer (structured extraction)
             while True:
                 convo_input = {"role": "assistant", "content": q}
                 if self.verbose:
@@ -67,165 +121,207 @@ class CustomerSupportAgent:
                 convo_user = {"role": "user", "content": user_input}
                 self.conversation.extend([convo_input, convo_user])
 
-                validate_prompt = self.conversation + [
-                    {
-                        "role": "developer",
-                        "content": self.prompts["validation_instruction"].format(key=key, invalid_response="INVALID") 
-                    }
-                ]
-                result = self.model.chat(validate_prompt)
-                
-                if self.verbose:
-                    print(f"[DEBUG] \n Validate Prompt: {validate_prompt} \n Result: {result}")
-                if result.lower() != "invalid":
-                    self.extracted[key] = result
+                # The structured mode also picks up the other missing fields the user may have given
+                keys = [key] if self.extractor.mode == "per_field" else [k for k in REQUIRED_KEYS if k not in self.extracted]
+                self._store_extracted(self.extractor.extract(self.context_budget.fit(self.conversation), keys, invalid_response="INVALID"))
+                self._checkpoint()
+                if key in self.extracted:
                     break
                 else:
                     self.userIO.write(self.prompts["invalid_input"], audio=self.audio_mode)
 
-        summary_prompt = self.conversation + [
-            {"role": "developer", "content": self.prompts["summary_instruction"]}
-        ]
-        summary = self.model.chat(summary_prompt)
-
-
-        # Find Customer frustration
-        frustration_prompt = self.conversation + [
-            {"role": "developer", "content": self.prompts["customer_frustration"]}
-        ]
-        frustration_score = self.model.chat(frustration_prompt)
-        if self.verbose:
-            print(f"[DEBUG] \n Frustration Prompt: {frustration_prompt} \n frustration_score: {frustration_score}")
-        try:
-            score = int(frustration_score)
-            if 0 <= score <= 10:
-                frustration_score = score
-            else:
-                frustration_score = None
-        except ValueError:
-            frustration_score = None
-        if self.verbose:
-            print(f"[DEBUG] \n Frustration Prompt: {frustration_prompt} \n frustration_score: {frustration_score}")
-
-
-        # Save the conversation + the info extracted + summary to json + frustration score
-        save_conversation(self.extracted, self.conversation, summary, "rigid", frustration_score,  self.lang)
-
-        self.userIO.write(self.prompts["extracted_info"].format(extracted=self.extracted), audio=self.audio_mode)
-        self.userIO.write(self.prompts["summary_prefix"].format(summary=summary), audio=self.audio_mode) 
-        self.userIO.write(self.prompts["frustration_info"].format(frustration_score=frustration_score), audio=self.audio_mode)
+        self._finish_call("rigid", frustration_role="developer")
 
     def _start_natural(self):
-        welcome = self.prompts["welcome"].format(company=self.company) 
-        if self.verbose:
-            print("\n")
-        self.userIO.write(f"🤖 {welcome}", audio = self.audio_mode)
-        self.full_conversation.append({"role": "system", "content": self.prompts["system_prompt"]}) 
-        self.full_conversation.append({"role": "assistant", "content": welcome})
-
-        msgs_count = 1 # count the msg wiht the user
+        if self.full_conversation:
+            # Resumed from a checkpoint, repeat the last message the user got
+            self.userIO.write(f"🤖 {self._last_assistant_message()}", audio = self.audio_mode)
+        else:
+            welcome = self.prompts["welcome"].format(company=self.company) 
+            if self.verbose:
+                print("\n")
+            self.userIO.write(f"🤖 {welcome}", audio = self.audio_mode)
+            self.store.append("system", self.prompts["system_prompt"])
+            self.store.append("assistant", welcome)
+            self._checkpoint()
 
-        while not self._all_info_collected() and msgs_count < MAX_MSG: # To prevent infinite conversations
+        while not self._all_info_collected() and self.msgs_count < MAX_MSG: # To prevent infinite conversations
             # remove all past developer comments, this is done to track only the conversation + the last notes
-            self.conversation = self.remove_developer_notes() # clean previous developer coments, and add the new ones
+            self.store.new_turn() # Only the notes of the previous turn are removed from the views
 
             user_input = self.userIO.read("> ", audio=self.audio_mode)
-            self.full_conversation.append({"role": "user", "content": user_input})
-            self.conversation.append({"role": "user", "content": user_input})
-
+            self.store.append("user", user_input)
 
             msg = self.prompts["partial_notes"].format(extracted=self.extracted) 
-            self.full_conversation.append({"role": "developer", "content":msg})
-            self.conversation.append({"role": "developer", "content":msg}) # Add the notes also to the conversation, so that the extraction have context on the notes
+            self.store.append("developer", msg) # Add the notes also to the conversation, so that the extraction have context on the notes
+            # The compacted version (a new list) is only used for this turn prompts, the store keeps every message
+            self.conversation = self.context_budget.fit(self.store.turn)
 
+            # Start the reply with the prompt it will have if the extraction and the supervisor do not change it
+            speculative = None
+            if self.speculative_reply:
+                speculative = SpeculativeReply(for_purpose(self.model, "reply"), self._reply_prompt(self._known_history()))
 
-            # Try to extract info
-            for key in REQUIRED_KEYS:
-                if key in self.extracted:
-                    continue
-                # We are using the conversation without the history of notes, just the last notes taken
-                extract_prompt = self.conversation + [
-                    {
-                        "role": "developer",
-                        "content": self.prompts["validation_instruction"].format(key=key, invalid_response="NONE") 
-                    }
-                ]
-                result = self.model.chat(extract_prompt)
 
-                if self.verbose:
-                    print(f"[DEBUG] \n Validate Prompt: {extract_prompt} \n Result: {result}")
-                if result.lower() != "none":
-                    self.extracted[key] = result
+            # Try to extract info (one concurrent call per missing key, or a single structured call)
+            # We are using the conversation without the history of notes, just the last notes taken
+            missing_keys = [key for key in REQUIRED_KEYS if key not in self.extracted]
+            self._store_extracted(self.extractor.extract(self.conversation, missing_keys, invalid_response="NONE"))
 
             # Check the information is correct
-            if self._all_info_collected() or msgs_count%self.check_every_n_msg==0: # we also check every 'self.check_every_n_msg' msg in case the main agent missed something
-                validation = self.supervisor.validate(self.conversation, self.extracted)
+            if self._all_info_collected() or self.msgs_count%self.check_every_n_msg==0: # we also check every 'self.check_every_n_msg' msg in case the main agent missed something
+                validation = (self.supervisor.review if self.adaptive_supervisor else self.supervisor.validate)(self.conversation, self.extracted)
                 if validation:
                     # Correct we stop
+                    if speculative:
+                        speculative.cancel()
                     self.userIO.write(f"🤖 {self.prompts["thanks_message"]}", audio=self.audio_mode) 
                     break
                 else:
                     msg = self.prompts["supervisor_correction"].format(extracted=self.extracted, required_keys=REQUIRED_KEYS)
-                    self.full_conversation.append({"role": "developer", "content":msg})
-                    self.conversation.append({"role": "developer", "content":msg})
+                    self._add_message("developer", msg)
 
 
             # Check if previous conversation with this order. if its the case add the previous conversations as a history:
             conv_history = self._check_and_add_history()
-            if conv_history: # Only save if there is a history
-                self.conversation.insert(1, {"role": "developer", "content":conv_history}) # We dont save it to the full conversation since we dont want to save the history again to the json
+            reply_prompt = self._reply_prompt(conv_history) # The history is only in the reply view, we dont want to save it again to the json
 
             
-            # Get assistant reply
-            assistant_reply = self.model.chat(self.conversation)
-            self.full_conversation.append({"role": "assistant", "content": assistant_reply})
-            self.conversation.append({"role": "assistant", "content": assistant_reply})
-            self.userIO.write(f"🤖 {assistant_reply}", audio=self.audio_mode)
+            # Get assistant reply, streamed to the user as it is generated
+            if speculative and speculative.matches(reply_prompt):
+                self.speculative_hits += 1
+                assistant_reply = self.userIO.write_stream(speculative.deltas(), prefix="🤖 ", audio=self.audio_mode)
+            else:
+                if speculative:
+                    # The notes changed the reply prompt (supervisor correction, history found), generate it again
+                    speculative.cancel()
+                    self.speculative_misses += 1
+                assistant_reply = self._reply(reply_prompt)
+            self._add_message("assistant", assistant_reply)
             if self.verbose:
-                print(f"[DEBUG] \n MODEL Prompt: {self.conversation} \n assistant_reply: {assistant_reply}")
+                print(f"[DEBUG] \n MODEL Prompt: {reply_prompt} \n assistant_reply: {assistant_reply}")
                 print("\n")
             
-            msgs_count+=1# Increase the number of msg with the users
+            self.msgs_count+=1# Increase the number of msg with the users
+            self._checkpoint()
         # End loop
 
         self.conversation = self.remove_developer_notes() # Remove all the developer notes, since those are auxiliary msg to add context to the model, but not important for the summary
         msg = self.prompts["partial_notes"].format(extracted=self.extracted) 
         self.conversation.append({"role": "developer", "content":msg})
-        summary_prompt = self.conversation + [
-            {"role": "developer", "content": self.prompts["summary_instruction"]}
-        ]
-        summary = self.model.chat(summary_prompt)
+        self._finish_call("natural", frustration_role="assistant")
+
+
+    def _finish_call(self, mode: str, frustration_role: str):
+        """
+        Summarizes the conversation, scores the customer frustration, saves the session and shows the results.
+        """
+        summary_prompt, frustration_prompt = self._post_call_prompts(self.context_budget.fit(self.conversation), frustration_role)
+        if self.post_call_queue:
+            self.post_call_queue.put(post_call_job(self.extracted, self.conversation, summary_prompt, frustration_prompt, mode, self.lang))
+            self._end_queued_call()
+            return
+
+        summary = for_purpose(self.model, "summary").chat(summary_prompt)
 
         # Find Customer frustration
-        frustration_prompt = self.conversation + [
-            {"role": "assistant", "content": self.prompts["customer_frustration"]}
-        ]
-        frustration_score = self.model.chat(frustration_prompt)
+        frustration_score = self._parse_frustration_score(frustration_prompt, for_purpose(self.model, "frustration").chat(frustration_prompt))
+
+        # Save the conversation + the info extracted + summary to json + frustration score
+        save_conversation(self.extracted, self.conversation, summary, mode, frustration_score,  self.lang)
+        if self.checkpointer:
+            self.checkpointer.delete() # The session is saved, it can not be resumed anymore
+
+        for msg in self._results_messages(summary, frustration_score):
+            self.userIO.write(msg, audio=self.audio_mode)
+
+    def _end_queued_call(self):
+        if self.checkpointer:
+            self.checkpointer.delete() # The job is in the durable queue, the session can not be resumed anymore
+        self.userIO.write(self.prompts["extracted_info"].format(extracted=self.extracted), audio=self.audio_mode)
+
+    def _post_call_prompts(self, conversation, frustration_role: str):
+        return post_call_prompts(self.prompts, conversation, frustration_role)
+
+    def _parse_frustration_score(self, frustration_prompt, frustration_score):
         if self.verbose:
             print(f"[DEBUG] \n Frustration Prompt: {frustration_prompt} \n frustration_score: {frustration_score}")
-        try:
-            score = int(frustration_score)
-            if 0 <= score <= 10:
-                frustration_score = score
-            else:
-                frustration_score = None
-        except ValueError:
-            frustration_score = None
+        frustration_score = parse_frustration_score(frustration_score)
         if self.verbose:
             print(f"[DEBUG] \n Frustration Prompt: {frustration_prompt} \n frustration_score: {frustration_score}")
+        return frustration_score
 
+    def _results_messages(self, summary, frustration_score):
+        return [
+            self.prompts["extracted_info"].format(extracted=self.extracted),
+            self.prompts["summary_prefix"].format(summary=summary),
+            self.prompts["frustration_info"].format(frustration_score=frustration_score),
+        ]
 
-        # Save the conversation + the info extracted + summary to json + frustration score
-        save_conversation(self.extracted, self.conversation, summary, "natural", frustration_score,  self.lang)
-        
-        self.userIO.write(self.prompts["extracted_info"].format(extracted=self.extracted), audio=self.audio_mode)
-        self.userIO.write(self.prompts["summary_prefix"].format(summary=summary), audio=self.audio_mode)
-        self.userIO.write(self.prompts["frustration_info"].format(frustration_score=frustration_score), audio=self.audio_mode)
-
+    def _store_extracted(self, results):
+        for key, result in results.items(): # Same order as the requested keys
+            if result is not None:
+                self.extracted[key] = result
+
+    def _reply(self, conversation):
+        """
+        Generates the assistant reply and writes it to the user.
+        If the model supports streaming, the reply is written while it is generated, so the user
+        starts reading/hearing it on the first tokens instead of after the full generation.
+        """
+        model = for_purpose(self.model, "reply")
+        if hasattr(model, "chat_stream"):
+            return self.userIO.write_stream(model.chat_stream(conversation), prefix="🤖 ", audio=self.audio_mode)
+
+        assistant_reply = model.chat(conversation)
+        self.userIO.write(f"🤖 {assistant_reply}", audio=self.audio_mode)
+        return assistant_reply
+
+    @property
+    def full_conversation(self):
+        """
+        Every message of the natural conversation, developer notes included (the log of the store).
+        """
+        return self.store.messages
+
+    @full_conversation.setter
+    def full_conversation(self, messages):
+        self.store = ConversationStore(messages)
+
+    def _add_message(self, role, content):
+        """
+        Adds a message of the current turn to the store, and to the turn prompt if it was compacted (a copy of the turn view).
+        """
+        message = self.store.append(role, content)
+        if self.conversation is not self.store.turn:
+            self.conversation.append(message)
+
+    def _reply_prompt(self, conv_history):
+        """
+        Returns the reply prompt: the turn prompt, or the reply view of the store with the history of the order after the system prompt.
+        """
+        if not conv_history: # Only add it if there is a history
+            return self.conversation
+        self.store.pin(conv_history)
+        return self.context_budget.fit(self.store.reply())
+
+    def _known_history(self):
+        """
+        Returns the history `_check_and_add_history` gives if the extraction of this turn does not change the notes.
+        """
+        if "order_number" not in self.extracted or self._history_retriever is None:
+            return None
+        return self._render_history(self.extracted["order_number"])
+
+    def _checkpoint(self):
+        if self.checkpointer:
+            self.checkpointer.checkpoint(self)
+
+    def _last_assistant_message(self):
+        return next((m["content"] for m in reversed(self.full_conversation) if m["role"] == "assistant"), "")
 
     def remove_developer_notes(self):
-        filtered_list = [d for d in self.full_conversation if d.get("role") != "developer"]
-        return filtered_list
+        return list(self.store.dialog) # The dialog view is kept by the store, only copied here
 
     def _all_info_collected(self):
         return all(k in self.extracted for k in REQUIRED_KEYS)
@@ -238,38 +334,54 @@ class CustomerSupportAgent:
         if "order_number" not in self.extracted:
             return None  # Nothing to do if we don't have an order number yet
 
-        if self.cached_order_logs:
-            return self.cached_order_logs  # Already loaded
-
         order_id = self.extracted["order_number"]
+        previous_data = load_order_history(order_id) # Cached by order, no directory scan
 
-        if order_id in list_all_orders():
-            previous_data = load_conversations(order_id)
-
-            msg = self.prompts["history_msg"].format(order_id=order_id) 
-            for conv in previous_data:
-                timestamp_log = conv.get("timestamp", "")
-                conversation_log = conv.get("conversation", "")
-                msg += f"\n\n{timestamp_log} -> "
-                # Loop through each message in the conversation
-                for message in conversation_log:
-                    role = message.get("role")
-                    content = message.get("content", "")
-
-                    # Skip the system messages
-                    if role == "system":
-                        continue
-                    
-                    # Format the conversation based on the role
-                    if role == "user":
-                        msg += f"\n[USER]: \"{content}\""
-                    elif role == "assistant":
-                        msg += f"\n[YOU]: \"{content}\""
-                    elif role == "developer":
-                        msg += f"\n[DEVELOPER]: \"{content}\""
-
-
-            self.cached_order_logs = msg
-            return msg
+        if previous_data:
+            if previous_data is not self._history_sessions: # First lookup, or a session was saved for the order since
+                self._history_sessions = previous_data
+                self._history_retriever = HistoryRetriever(previous_data, self.history_top_k, self.history_budget)
+                self._history_key = None
+            return self._render_history(order_id)
 
+        self.cached_order_logs = self._history_sessions = self._history_retriever = None
         return None  # If order_id not found
+
+    def _render_history(self, order_id):
+        """
+        Renders the snippets of the previous sessions that are relevant to the issue (within `history_budget`).
+        The history is kept until the issue fields change, so the reply prompt (and the summaries of the
+        context budget) do not get a new history every turn.
+        """
+        issue = tuple(str(self.extracted.get(key, "")) for key in self.history_query_keys)
+        if (order_id, issue) == self._history_key:
+            return self.cached_order_logs # Same order and issue as the rendered history
+
+        query = "\n".join(value for value in issue if value)
+        if not query: # Issue not extracted yet, the latest user messages describe it
+            query_messages = []
+            for message in reversed(self.store.dialog):
+                if len(query_messages) == self.history_query_messages:
+                    break
+                if message["role"] == "user":
+                    query_messages.append(message["content"])
+            query = "\n".join(reversed(query_messages))
+
+        msg = self.prompts["history_msg"].format(order_id=order_id) 
+        for conv, messages in self._history_retriever.retrieve(query):
+            msg += f"\n\n{conv.get('timestamp', '')} -> "
+            for message in messages:
+                role = message["role"]
+                content = message["content"]
+
+                # Format the conversation based on the role
+                if role == "summary":
+                    msg += f"\n[SUMMARY]: \"{content}\""
+                elif role == "user":
+                    msg += f"\n[USER]: \"{content}\""
+                elif role == "assistant":
+                    msg += f"\n[YOU]: \"{content}\""
+
+        self._history_key = (order_id, issue)
+        self.cached_order_logs = msg
+        return msg
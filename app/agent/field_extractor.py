@@ -0,0 +1,220 @@
+# app/agent/field_extractor.py
+
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Literal, Optional, Tuple
+
+from app.data_validation.data_validation import validate_and_extract
+from app.data_validation.rule_extractor import RuleExtractor
+
+
+def parse_json_object(text: str) -> Optional[dict]:
+    """
+    Parses the first JSON object found in a model answer (the model may wrap it in text or code fences).
+
+    Returns:
+        Optional[dict]: The parsed object, or None if the answer does not contain a valid JSON object.
+    """
+    start = text.find("{")
+    end = text.rfind("}")
+    if start == -1 or end <= start:
+        return None
+    try:
+        values = json.loads(text[start:end + 1])
+    except ValueError:
+        return None
+    if not isinstance(values, dict):
+        return None
+    return values
+
+
+class FieldExtractor:
+    """
+    Extracts the required fields from a conversation.
+
+    Two modes are supported:
+        - "per_field": one `validation_instruction` call per missing key. The calls are
+          independent from each other, so they are sent concurrently through a thread pool
+          and merged back following the order of the requested keys.
+        - "structured": one `structured_extraction_instruction` call per turn that returns a
+          JSON object with all the missing keys. Each value is checked with `validate_and_extract`
+          and only the keys that fail go through the per-field path.
+
+    With `fast_path`, the last user message first goes through a RuleExtractor (order numbers, and the
+    answers that are only a category/urgency word of the validation mappings), and only the keys it can not settle with a high
+    confidence are sent to the model in either mode.
+    """
+    max_workers = 4 # One worker per required key
+
+    def __init__(self, model, prompts: dict, verbose: bool = False, mode: Literal["per_field", "structured"] = "per_field", lang: str = "en", fast_path: bool = False) -> None:
+        """
+        Args:
+            model: LLM model exposing a `chat(messages)` method.
+            prompts (dict): Customer support prompts (needs `validation_instruction` and `structured_extraction_instruction`).
+            verbose (bool): If True, prints the prompts and results.
+            mode (str): Extraction mode, "per_field" or "structured".
+            lang (str): Language used to validate the structured values (and of the fast path keyword tables).
+            fast_path (bool): If True, the keys settled by the rule extractor are not sent to the model.
+        """
+        if mode not in ("per_field", "structured"):
+            raise ValueError("Extraction mode must be 'per_field' or 'structured'")
+        self.model = model
+        self.prompts = prompts
+        self.verbose = verbose
+        self.mode = mode
+        self.lang = lang
+        self.rules = RuleExtractor(lang) if fast_path else None
+        self.rule_hits = 0 # Keys settled without the model
+        self.model_keys = 0 # Keys sent to the model
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers) # Reused every turn (the threads start on the first concurrent extraction)
+
+    def extract(self, conversation: List[Dict[str, str]], keys: List[str], invalid_response: str = "NONE") -> Dict[str, Optional[str]]:
+        """
+        Asks the model for the value of each key.
+
+        Args:
+            conversation (List[Dict[str, str]]): Conversation used as context for the extraction.
+            keys (List[str]): Keys to extract, the result keeps this order.
+            invalid_response (str): Answer the model gives when the value is not present/valid (per-field prompts).
+
+        Returns:
+            Dict[str, Optional[str]]: Extracted value for each key, None if the value is not present/valid.
+        """
+        if not keys:
+            return {}
+
+        extracted, remaining = self._fast_path(conversation, keys)
+        if remaining:
+            if self.mode == "structured":
+                extracted.update(self._extract_structured(conversation, remaining, invalid_response))
+            else:
+                extracted.update(self._extract_per_field(conversation, remaining, invalid_response))
+        return {key: extracted[key] for key in keys}
+
+    async def aextract(self, conversation: List[Dict[str, str]], keys: List[str], invalid_response: str = "NONE") -> Dict[str, Optional[str]]:
+        """
+        Async version of `extract`, the per-field calls run concurrently on the event loop (model needs `achat`).
+        """
+        if not keys:
+            return {}
+
+        extracted, remaining = self._fast_path(conversation, keys)
+        if remaining and self.mode == "structured":
+            result = await self.model.achat(self._structured_prompt(conversation, remaining))
+            structured, failed_keys = self._parse_structured(result, remaining)
+            extracted.update(structured)
+            if failed_keys:
+                extracted.update(await self._aextract_per_field(conversation, failed_keys, invalid_response))
+        elif remaining:
+            extracted.update(await self._aextract_per_field(conversation, remaining, invalid_response))
+        return {key: extracted[key] for key in keys}
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: Keys settled by the fast path (`rule_hits`) and keys sent to the model (`model_keys`).
+        """
+        return {"rule_hits": self.rule_hits, "model_keys": self.model_keys}
+
+    def _fast_path(self, conversation: List[Dict[str, str]], keys: List[str]) -> Tuple[Dict[str, Optional[str]], List[str]]:
+        """
+        Settles the keys found by the rule extractor in the last user message.
+
+        Returns:
+            Tuple[Dict[str, Optional[str]], List[str]]: The settled values, and the keys left to the model.
+        """
+        settled, remaining = {}, list(keys)
+        text = next((m["content"] for m in reversed(conversation) if m["role"] == "user"), None)
+        if self.rules and text:
+            settled, remaining = self.rules.extract(text, keys)
+            if settled and self.verbose:
+                print(f"[DEBUG] Fast path settled {settled}, asking the model for {remaining}")
+        self.rule_hits += len(settled)
+        self.model_keys += len(remaining)
+        return settled, remaining
+
+    def _extract_per_field(self, conversation: List[Dict[str, str]], keys: List[str], invalid_response: str) -> Dict[str, Optional[str]]:
+        if len(keys) == 1:
+            results = [self._extract_key(conversation, keys[0], invalid_response)]
+        else:
+            # map() returns the results in the order of the keys, independently of which call ends first
+            results = list(self._executor.map(lambda key: self._extract_key(conversation, key, invalid_response), keys))
+
+        return dict(zip(keys, results))
+
+    async def _aextract_per_field(self, conversation: List[Dict[str, str]], keys: List[str], invalid_response: str) -> Dict[str, Optional[str]]:
+        async def extract_key(key):
+            extract_prompt = self._key_prompt(conversation, key, invalid_response)
+            return self._parse_key_result(extract_prompt, await self.model.achat(extract_prompt), invalid_response)
+
+        # gather() keeps the order of the keys
+        results = await asyncio.gather(*(extract_key(key) for key in keys))
+        return dict(zip(keys, results))
+
+    def _extract_key(self, conversation: List[Dict[str, str]], key: str, invalid_response: str) -> Optional[str]:
+        extract_prompt = self._key_prompt(conversation, key, invalid_response)
+        return self._parse_key_result(extract_prompt, self.model.chat(extract_prompt), invalid_response)
+
+    def _key_prompt(self, conversation: List[Dict[str, str]], key: str, invalid_response: str) -> List[Dict[str, str]]:
+        return conversation + [
+            {
+                "role": "developer",
+                "content": self.prompts["validation_instruction"].format(key=key, invalid_response=invalid_response)
+            }
+        ]
+
+    def _parse_key_result(self, extract_prompt: List[Dict[str, str]], result: str, invalid_response: str) -> Optional[str]:
+        if self.verbose:
+            print(f"[DEBUG] \n Validate Prompt: {extract_prompt} \n Result: {result}")
+        if result.lower() == invalid_response.lower():
+            return None
+        return result
+
+    def _extract_structured(self, conversation: List[Dict[str, str]], keys: List[str], invalid_response: str) -> Dict[str, Optional[str]]:
+        result = self.model.chat(self._structured_prompt(conversation, keys))
+        extracted, failed_keys = self._parse_structured(result, keys)
+        if failed_keys:
+            extracted.update(self._extract_per_field(conversation, failed_keys, invalid_response))
+        return {key: extracted[key] for key in keys}
+
+    def _structured_prompt(self, conversation: List[Dict[str, str]], keys: List[str]) -> List[Dict[str, str]]:
+        return conversation + [
+            {
+                "role": "developer",
+                "content": self.prompts["structured_extraction_instruction"].format(keys=keys)
+            }
+        ]
+
+    def _parse_structured(self, result: str, keys: List[str]) -> Tuple[Dict[str, Optional[str]], List[str]]:
+        """
+        Validates the values of the structured answer.
+
+        Returns:
+            Tuple[Dict[str, Optional[str]], List[str]]: The valid (or not given) values, and the keys that
+            need the per-field path (all of them if the answer is malformed).
+        """
+        if self.verbose:
+            print(f"[DEBUG] \n Structured Result: {result}")
+
+        values = parse_json_object(result)
+        if values is None:
+            # Malformed answer, every key goes through the per-field path
+            return {}, list(keys)
+
+        extracted = {}
+        failed_keys = []
+        for key in keys:
+            value = values.get(key)
+            if value is None or str(value).strip() == "":
+                extracted[key] = None # Not given yet by the user
+                continue
+            is_valid, cleaned = validate_and_extract(key, str(value), self.lang)
+            if is_valid:
+                extracted[key] = cleaned
+            else:
+                failed_keys.append(key)
+
+        if failed_keys and self.verbose:
+            print(f"[DEBUG] Structured values failed validation, asking per field: {failed_keys}")
+        return extracted, failed_keys
@@ -0,0 +1,126 @@
+# app/agent/history_retriever.py
+
+import re
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from app.utils.tokens import estimate_tokens
+
+WORD = re.compile(r"\w+")
+
+
+def _terms(text: str) -> List[str]:
+    return WORD.findall(text.lower())
+
+
+class HistoryRetriever:
+    """
+    Selects the parts of the previous sessions of an order that are relevant to the current issue.
+
+    Each stored session is split into snippets: its `summary` and each exchange (a user message and
+    the reply to it). The snippets are indexed with BM25, kept as flat NumPy arrays (snippet, term,
+    weight) so a query is scored with one `bincount` over the matching terms. `retrieve` takes the
+    `top_k` best scored snippets that fit in `max_tokens`, and fills the rest of the budget with the
+    summaries of the latest sessions, so the history added to the prompts has about the same size
+    whatever the number of previous calls.
+    """
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self, sessions: List[dict], top_k: int = 4, max_tokens: int = 400) -> None:
+        """
+        Args:
+            sessions (List[dict]): Stored sessions of the order (as returned by `load_conversations`), oldest first.
+            top_k (int): Max snippets selected by relevance.
+            max_tokens (int): Estimated tokens of all the selected snippets.
+        """
+        self.sessions = sessions
+        self.top_k = top_k
+        self.max_tokens = max_tokens
+
+        self.snippets = [] # (session index, messages of the snippet)
+        for i, session in enumerate(sessions):
+            if session.get("summary"):
+                self.snippets.append((i, [{"role": "summary", "content": session["summary"]}]))
+            exchange = None
+            for message in session.get("conversation", []):
+                if message.get("role") == "user":
+                    exchange = [{"role": "user", "content": message.get("content", "")}]
+                    self.snippets.append((i, exchange))
+                elif message.get("role") == "assistant" and exchange is not None:
+                    exchange.append({"role": "assistant", "content": message.get("content", "")})
+                    exchange = None # Only the reply to the user message, developer and system messages are left out
+        self.costs = np.array([estimate_tokens(messages) for _, messages in self.snippets], dtype=np.int64)
+        self._summaries = [i for i, (_, messages) in enumerate(self.snippets) if messages[0]["role"] == "summary"]
+        self._index()
+
+    def retrieve(self, query: str) -> List[Tuple[dict, List[Dict[str, str]]]]:
+        """
+        Returns the selected snippets grouped by session.
+
+        Args:
+            query (str): Text of the current issue (e.g. the user messages of the conversation).
+
+        Returns:
+            List[Tuple[dict, List[Dict[str, str]]]]: (session, messages) in the order of the sessions, the
+            messages in the order of the session. The role of a summary is "summary".
+        """
+        scores = self.scores(query)
+        chosen = set()
+        used = 0
+        for i in np.argsort(-scores, kind="stable")[:self.top_k]:
+            if scores[i] <= 0:
+                break
+            if used + self.costs[i] <= self.max_tokens:
+                chosen.add(int(i))
+                used += self.costs[i]
+
+        # The summaries of the latest sessions fill the rest of the budget
+        for i in reversed(self._summaries):
+            if i not in chosen and used + self.costs[i] <= self.max_tokens:
+                chosen.add(i)
+                used += self.costs[i]
+
+        grouped = {}
+        for i in sorted(chosen):
+            session, messages = self.snippets[i]
+            grouped.setdefault(session, []).extend(messages)
+        return [(self.sessions[session], messages) for session, messages in sorted(grouped.items())]
+
+    def scores(self, query: str) -> np.ndarray:
+        """
+        Returns:
+            np.ndarray: BM25 score of each snippet for the query.
+        """
+        query_terms = [self._vocabulary[term] for term in set(_terms(query)) if term in self._vocabulary]
+        if not query_terms:
+            return np.zeros(len(self.snippets))
+        matches = np.isin(self._term_ids, query_terms)
+        return np.bincount(self._snippet_ids[matches], weights=self._weights[matches], minlength=len(self.snippets))
+
+    def _index(self) -> None:
+        self._vocabulary = {}
+        snippet_ids, term_ids = [], []
+        for i, (_, messages) in enumerate(self.snippets):
+            for message in messages:
+                for term in _terms(message["content"]):
+                    snippet_ids.append(i)
+                    term_ids.append(self._vocabulary.setdefault(term, len(self._vocabulary)))
+
+        if not snippet_ids:
+            self._snippet_ids = self._term_ids = np.zeros(0, dtype=np.int64)
+            self._weights = np.zeros(0)
+            return
+
+        # One entry per (snippet, term) with its frequency
+        pairs = np.array(snippet_ids, dtype=np.int64) * len(self._vocabulary) + np.array(term_ids, dtype=np.int64)
+        pairs, frequencies = np.unique(pairs, return_counts=True)
+        self._snippet_ids, self._term_ids = np.divmod(pairs, len(self._vocabulary))
+
+        lengths = np.bincount(np.array(snippet_ids, dtype=np.int64), minlength=len(self.snippets)).astype(float)
+        document_frequency = np.bincount(self._term_ids, minlength=len(self._vocabulary))
+        n = len(self.snippets)
+        idf = np.log(1 + (n - document_frequency + 0.5) / (document_frequency + 0.5))
+        norm = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1.0))
+        self._weights = idf[self._term_ids] * frequencies * (self.k1 + 1) / (frequencies + norm[self._snippet_ids])
@@ -0,0 +1,181 @@
+# app/agent/post_call_worker.py
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from app.llm_modules.model_router import for_purpose
+from app.utils.storage import save_conversation
+
+
+def parse_frustration_score(answer: str) -> Optional[int]:
+    """
+    Returns:
+        Optional[int]: The frustration score (0-10) given by the model, None if the answer is not a valid score.
+    """
+    try:
+        score = int(answer)
+    except (TypeError, ValueError):
+        return None
+    return score if 0 <= score <= 10 else None
+
+
+# Role of the frustration instruction in each mode (the rigid conversation has no assistant turns after the questions)
+FRUSTRATION_ROLES = {"rigid": "developer", "natural": "assistant"}
+
+
+def post_call_prompts(prompts: dict, conversation: List[Dict[str, str]], frustration_role: str) -> Tuple[List[Dict[str, str]], List[Dict[str, str]]]:
+    """
+    Returns:
+        Tuple[List[Dict[str, str]], List[Dict[str, str]]]: The summary prompt and the frustration prompt of a conversation.
+    """
+    summary_prompt = conversation + [
+        {"role": "developer", "content": prompts["summary_instruction"]}
+    ]
+    frustration_prompt = conversation + [
+        {"role": frustration_role, "content": prompts["customer_frustration"]}
+    ]
+    return summary_prompt, frustration_prompt
+
+
+def post_call_job(extracted: dict, conversation: List[Dict[str, str]], summary_prompt: List[Dict[str, str]],
+                  frustration_prompt: List[Dict[str, str]], mode: str, lang: str) -> dict:
+    """
+    Returns the job of a finished call, with everything the worker needs (the prompts are already built and compacted).
+    """
+    return {
+        "extracted": extracted,
+        "conversation": conversation,
+        "summary_prompt": summary_prompt,
+        "frustration_prompt": frustration_prompt,
+        "mode": mode,
+        "lang": lang,
+    }
+
+
+class PostCallWorker:
+    """
+    Processes the finished calls of a PostCallQueue in background threads: the summary and the
+    frustration score of each call are asked at the same time, then the session is saved.
+
+    The agents only add the job to the queue, so the user session ends with its last reply. A job
+    that fails is retried `max_attempts` times with an increasing delay, then moved to failed/.
+    """
+    def __init__(self, model, queue, workers: int = 2, max_attempts: int = 3, retry_delay: float = 1.0,
+                 poll_interval: float = 1.0, verbose: bool = False) -> None:
+        """
+        Args:
+            model: LLM model exposing a `chat(messages)` method (the calls are tagged "summary" and "frustration").
+            queue (PostCallQueue): Queue of the finished calls.
+            workers (int): Jobs processed at the same time (each one makes two concurrent calls).
+            max_attempts (int): Attempts of a job before it is moved to failed/.
+            retry_delay (float): Seconds before the second attempt, doubled on each attempt.
+            poll_interval (float): Seconds between checks of the queue when it is empty (jobs added by other processes).
+            verbose (bool): If True, prints the results and the errors.
+        """
+        self.model = model
+        self.queue = queue
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.poll_interval = poll_interval
+        self.verbose = verbose
+
+        self._threads = []
+        self._calls = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.retried = 0
+        self.failed = 0
+
+    def start(self) -> "PostCallWorker":
+        """
+        Recovers the jobs of a previous run and starts the worker threads.
+        """
+        self.queue.recover()
+        self._stopping.clear()
+        self._calls = ThreadPoolExecutor(max_workers=2 * self.workers, thread_name_prefix="post-call")
+        self._threads = [threading.Thread(target=self._run, name=f"post-call-worker-{i}", daemon=True) for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def stop(self, timeout: Optional[float] = None) -> None:
+        """
+        Stops the threads once their current job is done, the pending jobs stay in the queue.
+        """
+        self._stopping.set()
+        self.queue.available.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        if self._calls:
+            self._calls.shutdown(wait=False)
+        self._threads = []
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """
+        Waits until the queue has no pending job.
+
+        Returns:
+            bool: True if the queue is empty, False on timeout.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.queue.pending():
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(0.02)
+        return True
+
+    def process(self, job: dict) -> None:
+        """
+        Asks the summary and the frustration score of a job at the same time and saves the session.
+        """
+        summary_call = self._calls.submit(for_purpose(self.model, "summary").chat, job["summary_prompt"])
+        frustration_call = self._calls.submit(for_purpose(self.model, "frustration").chat, job["frustration_prompt"])
+        summary = summary_call.result()
+        frustration_score = parse_frustration_score(frustration_call.result())
+        if self.verbose:
+            print(f"[DEBUG] Post call {job.get('id')}: summary: {summary} frustration_score: {frustration_score}")
+        save_conversation(job["extracted"], job["conversation"], summary, job["mode"], frustration_score, job["lang"])
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: Jobs processed, retried and failed by this worker, and jobs left in the queue.
+        """
+        with self._lock:
+            return {"processed": self.processed, "retried": self.retried, "failed": self.failed, "pending": self.queue.pending()}
+
+    def _run(self) -> None:
+        while not self._stopping.is_set():
+            self.queue.available.clear() # Before the claim, a job added after it sets it again
+            claimed = self.queue.claim()
+            if claimed is None:
+                self.queue.available.wait(self.poll_interval)
+                continue
+
+            job_id, job = claimed
+            try:
+                self.process(job)
+            except Exception as e:
+                job["attempts"] = job.get("attempts", 0) + 1
+                job["error"] = repr(e)
+                if self.verbose:
+                    print(f"[DEBUG] Post call {job_id} failed (attempt {job['attempts']}): {e!r}")
+                with self._lock:
+                    if job["attempts"] >= self.max_attempts:
+                        self.failed += 1
+                    else:
+                        self.retried += 1
+                if job["attempts"] >= self.max_attempts:
+                    self.queue.fail(job_id, job)
+                else:
+                    self._stopping.wait(self.retry_delay * 2 ** (job["attempts"] - 1))
+                    self.queue.retry(job_id, job)
+                continue
+
+            self.queue.done(job_id)
+            with self._lock:
+                self.processed += 1
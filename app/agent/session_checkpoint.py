@@ -0,0 +1,193 @@
+# app/agent/session_checkpoint.py
+
+from typing import Dict, List
+
+CHECKPOINT_VERSION = 2 # 2: summarized messages by index in full_conversation
+
+# Agent arguments kept in the checkpoint, the other ones (verbose, audio devices, userIO) belong to the process that resumes
+CONFIG_KEYS = ("mode", "company", "audio_mode", "lang", "extraction_mode", "context_budget", "speculative_reply", "fast_extraction", "supervisor_mode")
+
+
+def _pack(messages: List[Dict[str, str]]) -> List[List[str]]:
+    return [[m["role"], m["content"]] for m in messages]
+
+
+def _unpack(messages: List[List[str]]) -> List[Dict[str, str]]:
+    return [{"role": role, "content": content} for role, content in messages]
+
+
+class SessionCheckpointer:
+    """
+    Writes the state of a CustomerSupportAgent to a checkpoint store after each turn, so the session
+    can be rebuilt by another process (`CustomerSupportAgent.from_checkpoint`).
+
+    The first record holds the configuration of the agent and its supervisor, each following record
+    only what changed since the previous one: the new messages, the notes set or removed, the turn
+    count and the new rolling summary of the context budget. Messages are only ever appended, so a
+    turn record is about the size of the messages of that turn. The messages that entered the summary
+    are written as their index in `full`, only the ones that are not there (the order history) as
+    [role, content].
+
+    Records (compact JSON, `v` is the format version):
+        {"v": 2, "t": "start", "config": {...}, "supervisor": {...}}
+        {"v": 2, "t": "turn", "n": 3, "full": [[role, content], ...], "conv": [...], "set": {...}, "del": [...],
+         "summary": "...", "summarized": [4, 5, [role, content], ...], "compactions": 1, "speculative": [hits, misses]}
+    """
+    def __init__(self, store, session_id: str) -> None:
+        """
+        Args:
+            store: Checkpoint store with `append(session_id, record)`, e.g. FileCheckpointStore or SQLiteCheckpointStore.
+            session_id (str): Id of the session in the store.
+        """
+        self.store = store
+        self.session_id = session_id
+        self.bytes_written = 0
+        self._started = False
+        self._full = 0 # Messages of full_conversation already written
+        self._full_index = {} # (role, content) -> first index in full_conversation
+        self._conv = 0 # Messages of conversation already written (rigid mode, where it is only appended)
+        self._extracted = {}
+        self._summary = None
+        self._summarized = set()
+        self._speculative = (0, 0)
+
+    def checkpoint(self, agent) -> None:
+        """
+        Writes the changes of the agent since the previous checkpoint.
+        """
+        if not self._started:
+            self._write({"v": CHECKPOINT_VERSION, "t": "start", "config": agent_config(agent),
+                         "supervisor": {"required_keys": list(agent.supervisor.required_keys), "lang": agent.supervisor.lang}})
+            self._started = True
+
+        record = {"v": CHECKPOINT_VERSION, "t": "turn", "n": agent.msgs_count}
+        if len(agent.full_conversation) > self._full:
+            record["full"] = _pack(agent.full_conversation[self._full:])
+            self._index_full(agent.full_conversation)
+        if agent.mode == "rigid" and len(agent.conversation) > self._conv:
+            record["conv"] = _pack(agent.conversation[self._conv:])
+
+        changed = {key: value for key, value in agent.extracted.items() if self._extracted.get(key, object()) != value}
+        removed = [key for key in self._extracted if key not in agent.extracted]
+        if changed:
+            record["set"] = changed
+        if removed:
+            record["del"] = removed
+
+        budget = agent.context_budget
+        if budget.summary != self._summary:
+            record["summary"] = budget.summary
+            record["compactions"] = budget.compactions
+        new_summarized = budget.summarized_messages() - self._summarized
+        if new_summarized:
+            indexes = sorted(self._full_index[pair] for pair in new_summarized if pair in self._full_index)
+            record["summarized"] = indexes + [list(pair) for pair in new_summarized if pair not in self._full_index]
+
+        speculative = (agent.speculative_hits, agent.speculative_misses)
+        if speculative != self._speculative:
+            record["speculative"] = list(speculative)
+
+        self._write(record)
+        self._conv = len(agent.conversation)
+        self._extracted = dict(agent.extracted)
+        self._summary = budget.summary
+        self._summarized |= new_summarized
+        self._speculative = speculative
+
+    def resumed(self, agent) -> None:
+        """
+        Marks the restored state of the agent as written, the next checkpoint only holds the new changes.
+        """
+        self._started = True
+        self._full = 0
+        self._full_index = {}
+        self._index_full(agent.full_conversation)
+        self._conv = len(agent.conversation)
+        self._extracted = dict(agent.extracted)
+        self._summary = agent.context_budget.summary
+        self._summarized = agent.context_budget.summarized_messages()
+        self._speculative = (agent.speculative_hits, agent.speculative_misses)
+
+    def delete(self) -> None:
+        """
+        Removes the checkpoint of a finished session.
+        """
+        self.store.delete(self.session_id)
+
+    def _index_full(self, full_conversation: List[Dict[str, str]]) -> None:
+        for i in range(self._full, len(full_conversation)):
+            message = full_conversation[i]
+            self._full_index.setdefault((message["role"], message["content"]), i)
+        self._full = len(full_conversation)
+
+    def _write(self, record: dict) -> None:
+        self.bytes_written += self.store.append(self.session_id, record)
+
+
+def agent_config(agent) -> dict:
+    """
+    Returns the arguments needed to build the agent again.
+    """
+    return {
+        "mode": agent.mode,
+        "company": agent.company,
+        "audio_mode": agent.audio_mode,
+        "lang": agent.lang,
+        "extraction_mode": agent.extractor.mode,
+        "context_budget": agent.context_budget.max_tokens,
+        "speculative_reply": agent.speculative_reply,
+        "fast_extraction": agent.extractor.rules is not None,
+        "supervisor_mode": agent.supervisor.mode,
+    }
+
+
+def restore_state(records: List[dict]) -> dict:
+    """
+    Folds the checkpoint records of a session into its last state.
+
+    Raises:
+        ValueError: If there is no start record or a record was written by a newer format version.
+    """
+    state = {"config": None, "supervisor": None, "full_conversation": [], "conversation": [], "extracted": {},
+             "msgs_count": 1, "summary": None, "summarized": set(), "compactions": 0, "speculative": [0, 0]}
+    for record in records:
+        if record.get("v", 0) > CHECKPOINT_VERSION:
+            raise ValueError(f"Checkpoint version {record.get('v')} is not supported (max {CHECKPOINT_VERSION})")
+        if record["t"] == "start":
+            state["config"] = {key: value for key, value in record["config"].items() if key in CONFIG_KEYS}
+            state["supervisor"] = record.get("supervisor")
+            continue
+        state["msgs_count"] = record.get("n", state["msgs_count"])
+        state["full_conversation"].extend(_unpack(record.get("full", [])))
+        state["conversation"].extend(_unpack(record.get("conv", [])))
+        for key in record.get("del", []):
+            state["extracted"].pop(key, None)
+        state["extracted"].update(record.get("set", {}))
+        if "summary" in record:
+            state["summary"] = record["summary"]
+            state["compactions"] = record.get("compactions", state["compactions"])
+        for item in record.get("summarized", []):
+            if isinstance(item, int): # Index in full_conversation (version 2)
+                message = state["full_conversation"][item]
+                state["summarized"].add((message["role"], message["content"]))
+            else:
+                state["summarized"].add(tuple(item))
+        state["speculative"] = record.get("speculative", state["speculative"])
+
+    if state["config"] is None:
+        raise ValueError("The checkpoint has no start record")
+    return state
+
+
+def apply_state(agent, state: dict) -> None:
+    """
+    Sets the restored conversation state on a new agent built with the checkpoint configuration.
+    """
+    agent.full_conversation = state["full_conversation"]
+    agent.conversation = state["conversation"]
+    agent.extracted = state["extracted"]
+    agent.msgs_count = state["msgs_count"]
+    agent.context_budget.restore(state["summary"], state["summarized"], state["compactions"])
+    agent.speculative_hits, agent.speculative_misses = state["speculative"]
+    if state["supervisor"]:
+        agent.supervisor.required_keys = state["supervisor"]["required_keys"]
@@ -0,0 +1,74 @@
+# app/agent/speculative_reply.py
+
+import queue
+import threading
+from typing import Dict, Iterator, List
+
+_DONE = object() # End of the reply
+
+
+class SpeculativeReply:
+    """
+    An assistant reply generated in the background from the prompt predicted before the extraction
+    of the turn ends.
+
+    The reply is streamed into a buffer (the user does not see it yet). If the final reply prompt is
+    the predicted one, `deltas()` gives the buffered text and then the rest as it is generated;
+    otherwise the reply is cancelled and a new one is generated from the final prompt.
+    """
+
+    def __init__(self, model, conversation: List[Dict[str, str]]) -> None:
+        """
+        Args:
+            model: LLM model used for the reply, exposing `chat_stream(messages)` or `chat(messages)`.
+            conversation (List[Dict[str, str]]): Predicted reply prompt.
+        """
+        self.model = model
+        self.prompt = list(conversation)
+        self._queue = queue.Queue()
+        self._cancelled = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="speculative-reply", daemon=True)
+        self._thread.start()
+
+    def matches(self, conversation: List[Dict[str, str]]) -> bool:
+        """
+        Returns True if the reply was generated from this prompt.
+        """
+        return conversation == self.prompt
+
+    def deltas(self) -> Iterator[str]:
+        """
+        Yields the reply text, buffered deltas first. Raises the error of the model call if it failed.
+        """
+        while True:
+            item = self._queue.get()
+            if item is _DONE:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    def cancel(self) -> None:
+        """
+        Stops reading the reply, the streamed request is closed on its next delta.
+        """
+        self._cancelled.set()
+
+    def _run(self) -> None:
+        try:
+            if not hasattr(self.model, "chat_stream"):
+                self._queue.put(self.model.chat(self.prompt))
+                return
+            stream = self.model.chat_stream(self.prompt)
+            try:
+                for delta in stream:
+                    if self._cancelled.is_set():
+                        break
+                    self._queue.put(delta)
+            finally:
+                if hasattr(stream, "close"):
+                    stream.close()
+        except Exception as e:
+            self._queue.put(e)
+        finally:
+            self._queue.put(_DONE)
@@ -1,33 +1,188 @@
 # app/agent/supervisor_agent.py
 
+from app.agent.field_extractor import parse_json_object
+from app.agent.transcript import TranscriptRenderer
 from app.data_validation.data_validation import validate_and_extract
 import ast
+from typing import Literal, Optional, Tuple
 
 from app.utils.prompt_loader import load_prompts
 
 class SupervisorAgent:
-    def __init__(self, model, required_keys, lang: str = "en", verbose: bool = False):
+    max_verdict_chars = 2000 # Longer verdict answers are not parsed (the dialogue is used instead)
+    def __init__(self, model, required_keys, lang: str = "en", verbose: bool = False, mode: Literal["dialogue", "verdict"] = "dialogue"):
+        """
+        Args:
+            model: LLM model used for the reviews.
+            required_keys (list): Fields the notes must have.
+            lang (str): Language of the prompts and of the format validation.
+            verbose (bool): If True, prints the review prompts and results.
+            mode (str): "dialogue" asks yes/no questions and then the fixes (2 to 4 sequential calls),
+                "verdict" asks for one JSON verdict with the fixes (1 call, the dialogue if the answer is malformed).
+        """
+        if mode not in ("dialogue", "verdict"):
+            raise ValueError("Supervisor mode must be 'dialogue' or 'verdict'")
         self.model = model
         self.required_keys = required_keys
         self.verbose = verbose
         self.lang = lang
+        self.mode = mode
         self.prompts = load_prompts("supervisor", lang)
+        # The conversation is embedded in `role_intro` as U:/A: lines, only the new messages are rendered at each review
+        self.transcript = TranscriptRenderer()
+
+        self.approved_notes = {} # Notes confirmed by the last model review, `review` does not ask again while they are unchanged
+        self.reviews = 0 # Reviews with the model
+        self.skipped_reviews = 0 # Reviews settled by the local checks
+        self.avoided_calls = 0 # Model calls `validate` would have made for the skipped reviews
+        self._approval_calls = 0 # Model calls of the review that approved `approved_notes`
+        self.calls = 0 # Model calls of the reviews
+        self.fallbacks = 0 # Malformed verdicts reviewed again with the dialogue
 
     def _format(self, key: str, **kwargs):
         return self.prompts[key].format(**kwargs)
     
     def validate(self, conversation, extracted):
+        """
+        Runs the supervisor review of the notes, fixing `extracted` in place.
+
+        Returns:
+            bool: True if the notes are correct and complete.
+        """
+        return self._run(self._validation_steps(conversation, extracted))
+
+    def review(self, conversation, extracted):
+        """
+        Adaptive version of `validate`: the notes are checked locally first (`validate_format`) and
+        only reviewed by the model if they changed since the last approved review, or if the local
+        check removed a field (the extraction gave a value it could not trust).
+
+        Returns:
+            bool: True if the notes are correct and complete.
+        """
+        return self._run(self._review_steps(conversation, extracted))
+
+    def stats(self) -> dict:
+        """
+        Returns:
+            dict: Reviews with the model, reviews skipped, model calls made, calls avoided compared with `validate`
+            (for each skipped review, the calls of the review that approved the same notes) and malformed verdicts.
+        """
+        return {"reviews": self.reviews, "skipped_reviews": self.skipped_reviews, "calls": self.calls,
+                "avoided_calls": self.avoided_calls, "fallbacks": self.fallbacks}
+
+    def _run(self, steps):
+        try:
+            manager_conv = next(steps)
+            while True:
+                self.calls += 1
+                manager_conv = steps.send(self.model.chat(manager_conv))
+        except StopIteration as done:
+            return done.value
+
+    def _review_steps(self, conversation, extracted):
+        """
+        Local checks of `review`, then the model review (`_validation_steps`) if they are not enough.
+        """
+        fields = set(extracted)
+        complete = self.validate_format(extracted)
+        if set(extracted) == fields and extracted == self.approved_notes:
+            # Same notes as the last approved review and all of them passed the local check
+            self.skipped_reviews += 1
+            self.avoided_calls += self._approval_calls # The same review `validate` would run again
+            if self.verbose:
+                print(f"[DEBUG] Supervisor review skipped, notes unchanged: {extracted}")
+            return complete
+        approved_notes, calls = self.approved_notes, self.calls
+        status = yield from self._validation_steps(conversation, extracted)
+        if self.approved_notes is not approved_notes:
+            self._approval_calls = self.calls - calls
+        return status
+
+    def _validation_steps(self, conversation, extracted):
+        """
+        Review with the model, shared by the sync and async supervisors.
+        Yields the supervisor conversation each time it needs a model answer, and receives the answer back
+        (`result = yield manager_conv`). Returns the final status.
+        """
         if self.verbose:
             print(f"\n\n ----- VALIDATOR -----\n\n ")
+        self.reviews += 1
+        if self.mode == "verdict":
+            return (yield from self._verdict_steps(conversation, extracted))
+        return (yield from self._dialogue_steps(conversation, extracted))
+
+    def _verdict_steps(self, conversation, extracted):
+        """
+        Single call review: the model returns the verdict, the corrections and the fields to drop as JSON.
+        A malformed answer is reviewed again with the dialogue.
+        """
+        prompt = self._format("role_intro", conversation=self.transcript.render(conversation))
+        msg = self._format("verdict", required_keys=self.required_keys, extracted=extracted)
+        manager_conv = [{"role": "system", "content": prompt}, {"role": "user", "content": msg}]
+
+        result = yield manager_conv
+        if self.verbose:
+            print(f"[DEBUG] \n Validator Prompt: {manager_conv} \n Result: {result}\n")
+
+        verdict = self._parse_verdict(result)
+        if verdict is None:
+            self.fallbacks += 1
+            if self.verbose:
+                print("[DEBUG] Malformed verdict, reviewing with the dialogue")
+            return (yield from self._dialogue_steps(conversation, extracted))
+
+        correct, corrections, drop = verdict
+        for key in drop:
+            extracted.pop(key, None)
+        extracted.update(corrections)
+        if drop or (not correct and not corrections):
+            return False # Same as the incorrect categories of the dialogue, the notes are not approved
+
+        status = self.validate_format(extracted)
+        self.approved_notes = dict(extracted)
+        return status
+
+    def _parse_verdict(self, result: str) -> Optional[Tuple[bool, dict, list]]:
+        """
+        Returns:
+            Optional[Tuple[bool, dict, list]]: (correct, corrections of the required keys, required keys to drop),
+            None if the answer is not a verdict.
+        """
+        if len(result) > self.max_verdict_chars:
+            return None
+        values = parse_json_object(result)
+        if values is None:
+            return None
+
+        correct = values.get("correct")
+        if isinstance(correct, str):
+            correct = {"true": True, "yes": True, "false": False, "no": False}.get(correct.strip().lower())
+        corrections = values.get("corrections") or {}
+        drop = values.get("drop") or []
+        if not isinstance(correct, bool) or not isinstance(corrections, dict) or not isinstance(drop, list):
+            return None
+
+        # Only the required keys with a text (or number) value are used, e.g. no nested objects
+        corrections = {key: str(value).strip() for key, value in corrections.items()
+                       if key in self.required_keys and isinstance(value, (str, int, float)) and not isinstance(value, bool) and str(value).strip()}
+        drop = [key for key in drop if key in self.required_keys and key not in corrections]
+        return correct, corrections, drop
+
+    def _dialogue_steps(self, conversation, extracted):
+        """
+        Review dialogue: yes/no questions, then the incorrect fields or the fixed notes (2 to 4 calls).
+        """
+        approved = True
 
         # Initial validation
-        prompt = self._format("role_intro", conversation=conversation)
+        prompt = self._format("role_intro", conversation=self.transcript.render(conversation))
         manager_conv = [{"role": "system", "content": prompt}]
 
         msg = self._format("notes_check", required_keys=self.required_keys, extracted=extracted)
         manager_conv.append({"role": "user", "content": msg})
 
-        result = self.model.chat(manager_conv)
+        result = yield manager_conv
         if self.verbose:
             print(f"[DEBUG] \n Validator Prompt: {manager_conv} \n Result: {result}\n")
 
@@ -39,7 +194,7 @@ class SupervisorAgent:
             fix_prompt = self.prompts["fix_prompt"]
             manager_conv.append({"role": "user", "content": fix_prompt})
             
-            result = self.model.chat(manager_conv)
+            result = yield manager_conv
 
             if self.verbose:
                 print(f"[DEBUG] \n Validator Prompt: {manager_conv} \n Result: {result}\n")
@@ -52,7 +207,7 @@ class SupervisorAgent:
                 categories_prompt = self._format("which_incorrect", required_keys=self.required_keys)
                 manager_conv.append({"role": "user", "content": categories_prompt})
                 
-                result = self.model.chat(manager_conv)
+                result = yield manager_conv
 
                 if self.verbose:
                     print(f"[DEBUG] \n Validator Prompt: {manager_conv} \n Result: {result}\n")
@@ -77,7 +232,7 @@ class SupervisorAgent:
                 fix_notes_prompt = self._format("fix_notes", required_keys=self.required_keys)
                 manager_conv.append({"role": "user", "content": fix_notes_prompt})
                 
-                result = self.model.chat(manager_conv)
+                result = yield manager_conv
 
                 if self.verbose:
                     print(f"[DEBUG] \n Validator Prompt: {manager_conv} \n Result: {result}\n")
@@ -94,6 +249,7 @@ class SupervisorAgent:
                     extracted.update(updates)
 
                 except Exception as e:
+                    approved = False # The notes were not fixed, review them again next time
                     if self.verbose:
                         print("[DEBUG] Error converting to dict:", e)
 
@@ -104,6 +260,8 @@ class SupervisorAgent:
 
         # Validate the format of the output
         status = self.validate_format(extracted)
+        if approved:
+            self.approved_notes = dict(extracted)
         return status
 
     def validate_format(self, extracted: dict) -> bool:
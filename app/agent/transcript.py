@@ -0,0 +1,66 @@
+# app/agent/transcript.py
+
+from typing import Dict, List, Optional
+
+
+class TranscriptRenderer:
+    """
+    Renders a conversation as compact text for the prompts that embed it (e.g. the supervisor `role_intro`),
+    one line per message instead of the `repr` of the message dicts:
+        U: My package never arrived
+        A: Could you give me your order number?
+    The system prompt and the developer notes are left out, except the rolling summary of the context
+    budget (the developer message tagged with `"summary": True`), rendered as an `S:` line.
+
+    The rendered text is kept between calls: a conversation that starts with the messages of the previous
+    call only renders the new messages (the notes at the end of each turn are replaced without rendering
+    the rest again). A renderer belongs to one session.
+    """
+    labels = {"user": "U", "assistant": "A"}
+
+    def __init__(self) -> None:
+        self._messages = [] # Messages of the last call
+        self._ends = [] # Length of the text after each of them
+        self._text = ""
+        self.rendered = 0 # Messages rendered
+        self.reused = 0 # Messages taken from the previous call
+
+    def render(self, conversation: List[Dict[str, str]]) -> str:
+        """
+        Returns:
+            str: The transcript, one `U:`/`A:`/`S:` line per kept message.
+        """
+        common = 0
+        limit = min(len(self._messages), len(conversation))
+        while common < limit and (conversation[common] is self._messages[common] or conversation[common] == self._messages[common]):
+            common += 1
+        if common < len(self._messages):
+            del self._messages[common:]
+            del self._ends[common:]
+            self._text = self._text[:self._ends[-1]] if self._ends else ""
+        self.reused += common
+
+        parts = [self._text]
+        end = len(self._text)
+        for message in conversation[common:]:
+            line = self._line(message)
+            if line is not None:
+                line = line if end == 0 else "\n" + line
+                parts.append(line)
+                end += len(line)
+            self._messages.append(message)
+            self._ends.append(end)
+        self.rendered += len(conversation) - common
+        self._text = "".join(parts)
+        return self._text
+
+    def _line(self, message: Dict[str, str]) -> Optional[str]:
+        role = message.get("role")
+        content = message.get("content", "")
+        if role in self.labels:
+            label = self.labels[role]
+        elif message.get("summary"):
+            label = "S"
+        else:
+            return None # System prompt and notes
+        return f"{label}: {' '.join(content.split())}"
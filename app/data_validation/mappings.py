@@ -25,3 +25,64 @@ URGENCY_MAP = {
         "alta": "high",
     },
 }
+
+# Words that point to a value without naming it, the rule extractor gives them a low confidence
+# (e.g. "package" is said for shipping and for broken products), so the LLM decides
+CATEGORY_SYNONYMS = {
+    "en": {
+        "delivery": "shipping",
+        "delivered": "shipping",
+        "arrived": "shipping",
+        "package": "shipping",
+        "charged": "billing",
+        "charge": "billing",
+        "invoice": "billing",
+        "refund": "billing",
+        "payment": "billing",
+        "broken": "product",
+        "damaged": "product",
+        "defective": "product",
+    },
+    "es": {
+        "entrega": "shipping",
+        "paquete": "shipping",
+        "llegado": "shipping",
+        "cobro": "billing",
+        "cobrado": "billing",
+        "factura": "billing",
+        "reembolso": "billing",
+        "pago": "billing",
+        "roto": "product",
+        "estropeado": "product",
+        "defectuoso": "product",
+    },
+}
+
+URGENCY_SYNONYMS = {
+    "en": {
+        "urgent": "high",
+        "asap": "high",
+        "immediately": "high",
+        "critical": "high",
+        "normal": "medium",
+        "moderate": "medium",
+    },
+    "es": {
+        "urgente": "high",
+        "inmediato": "high",
+        "crítico": "high",
+        "normal": "medium",
+        "moderada": "medium",
+    },
+}
+
+# Words that mark a value as an urgency level ("high priority", "urgencia alta")
+URGENCY_CUES = {
+    "en": ["urgency", "urgent", "priority", "important"],
+    "es": ["urgencia", "urgente", "prioridad", "importante"],
+}
+
+NEGATIONS = {
+    "en": ["not", "no", "isn't", "isnt", "wasn't", "never", "don't", "nor"],
+    "es": ["no", "ni", "nunca", "tampoco"],
+}
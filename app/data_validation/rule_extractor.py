@@ -0,0 +1,125 @@
+# app/data_validation/rule_extractor.py
+
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from app.data_validation.mappings import CATEGORY_MAP, URGENCY_MAP, CATEGORY_SYNONYMS, URGENCY_SYNONYMS, URGENCY_CUES, NEGATIONS
+
+# Compiled once for every extractor
+ORDER_NUMBER = re.compile(r"(?<![a-z0-9])ord(\d+)(?![a-z0-9])", re.IGNORECASE)
+ORDER_NUMBER_LOOSE = re.compile(r"(?<![a-z0-9])ord[\s#:-]+(\d+)(?![a-z0-9])", re.IGNORECASE) # "ORD-123", "ord 123"
+WORD = re.compile(r"[a-z0-9']+")
+
+RULE_KEYS = ("order_number", "category", "urgency") # The description needs the LLM to be cleaned
+
+_tables = {}
+
+
+def _normalize(text: str) -> str:
+    """Lower case without accents, so "envío" and "envio" match the same keyword."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in text if not unicodedata.combining(char))
+
+
+def _lang_tables(lang: str) -> dict:
+    """Keyword tables of a language with normalized words, built the first time the language is used."""
+    if lang not in _tables:
+        _tables[lang] = {
+            "category": ({_normalize(w): v for w, v in CATEGORY_MAP.get(lang, {}).items()},
+                         {_normalize(w): v for w, v in CATEGORY_SYNONYMS.get(lang, {}).items()}),
+            "urgency": ({_normalize(w): v for w, v in URGENCY_MAP.get(lang, {}).items()},
+                        {_normalize(w): v for w, v in URGENCY_SYNONYMS.get(lang, {}).items()}),
+            "cues": {_normalize(w) for w in URGENCY_CUES.get(lang, [])},
+            "negations": {_normalize(w) for w in NEGATIONS.get(lang, [])},
+        }
+    return _tables[lang]
+
+
+class RuleExtractor:
+    """
+    Extracts the fields that have a fixed format from a user message without calling the LLM.
+
+    Each value gets a confidence:
+        - order_number: 1.0 for a single "ORD<digits>" in the message, 0.5 for a loose form ("ord 123").
+        - category / urgency: 1.0 when the whole message is a value of CATEGORY_MAP / URGENCY_MAP (with the urgency
+          cues, "high priority"), 0.8 for an urgency word with a cue in a sentence, 0.7 for a value in a sentence
+          ("the billing of my order", "the price was high") and 0.6 for a synonym ("urgent", "package").
+    A value in a sentence may describe something else ("I was billed twice for a product"), so with the
+    default threshold only the whole answers are settled. Two different values (keywords or synonyms) or
+    a negation anywhere in the message give a confidence of 0.0. The other keys are left to the LLM.
+    """
+    def __init__(self, lang: str = "en", threshold: float = 0.9) -> None:
+        """
+        Args:
+            lang (str): Language of the keyword tables ('en', 'es').
+            threshold (float): Min confidence of a settled value.
+        """
+        self.lang = lang
+        self.threshold = threshold
+        self.tables = _lang_tables(lang)
+
+    def extract(self, text: str, keys: List[str]) -> Tuple[Dict[str, str], List[str]]:
+        """
+        Settles the keys whose value is in the text with a high confidence.
+
+        Args:
+            text (str): User message.
+            keys (List[str]): Keys to extract.
+
+        Returns:
+            Tuple[Dict[str, str], List[str]]: The settled values, and the keys (in order) left to the LLM.
+        """
+        settled = {}
+        remaining = []
+        for key in keys:
+            value, confidence = self.score(key, text)
+            if value is not None and confidence >= self.threshold:
+                settled[key] = value
+            else:
+                remaining.append(key)
+        return settled, remaining
+
+    def score(self, key: str, text: str) -> Tuple[Optional[str], float]:
+        """
+        Returns:
+            Tuple[Optional[str], float]: The normalized (English) value found for the key and its confidence,
+            (None, 0.0) if there is none or the key has no rules.
+        """
+        if key == "order_number":
+            return self._score_order_number(text)
+        if key in ("category", "urgency"):
+            return self._score_words(key, WORD.findall(_normalize(text)))
+        return None, 0.0
+
+    def _score_order_number(self, text: str) -> Tuple[Optional[str], float]:
+        values = {f"ORD{digits}" for digits in ORDER_NUMBER.findall(text)}
+        if len(values) == 1:
+            return values.pop(), 1.0
+        if values:
+            return None, 0.0 # Several order numbers, the LLM knows which one is meant
+        loose = {f"ORD{digits}" for digits in ORDER_NUMBER_LOOSE.findall(text)}
+        if len(loose) == 1:
+            return loose.pop(), 0.5
+        return None, 0.0
+
+    def _score_words(self, key: str, words: List[str]) -> Tuple[Optional[str], float]:
+        keywords, synonyms = self.tables[key]
+        if any(word in self.tables["negations"] for word in words):
+            return None, 0.0 # "it is not a billing problem", "I can not say it is high urgency"
+        strong = {keywords[word] for word in words if word in keywords}
+        weak = {synonyms[word] for word in words if word in synonyms}
+
+        if len(strong) > 1 or len(strong | weak) > 1:
+            return None, 0.0 # "my product never arrived": product and shipping
+        if strong:
+            value = strong.pop()
+            # The whole answer is the value ("billing", "high urgency"), the only case settled without the LLM
+            if all(word in keywords or word in self.tables["cues"] for word in words):
+                return value, 1.0
+            if key == "urgency" and any(word in self.tables["cues"] for word in words):
+                return value, 0.8
+            return value, 0.7
+        if weak:
+            return weak.pop(), 0.6
+        return None, 0.0
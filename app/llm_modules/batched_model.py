@@ -0,0 +1,228 @@
+# app/llm_modules/batched_model.py
+
+import asyncio
+import json
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+from app.llm_modules.model_router import Purpose_View, for_purpose, routes_to_different_models
+
+
+class _Request():
+    """
+    A `chat` call waiting in the scheduler queue.
+    """
+    __slots__ = ("messages", "temperature", "purpose", "future")
+
+    def __init__(self, messages: List[Dict[str, str]], temperature: float, purpose: Optional[str]) -> None:
+        self.messages = messages
+        self.temperature = temperature
+        self.purpose = purpose
+        self.future = Future()
+
+
+class Batched_Model():
+    """
+    A scheduler in front of a model shared by many sessions (e.g. one local OllamaMistral7B_Model).
+
+    The `chat` calls of every session are put in one queue. The scheduler collects the calls that
+    arrive within a small time window (up to `max_batch`), merges the identical ones into a single
+    request, and dispatches them with at most `slots` requests running on the server at a time
+    (match it with the parallel slots of the server, OLLAMA_NUM_PARALLEL). Each answer is given back
+    to the session that asked for it.
+
+    Streamed replies are not batched, they only take a slot while they run. Every other attribute is
+    forwarded to the wrapped model.
+
+    Attributes:
+        model: The wrapped model.
+        window (float): Seconds a batch waits for more calls after its first one.
+        max_batch (int): Maximum number of calls in a batch.
+        slots (int): Maximum number of requests running on the server at the same time.
+        batch_sizes (Counter): Histogram of the number of calls per dispatched batch.
+        queue_depths (Counter): Histogram of the calls waiting (queued or for a slot) when each batch is dispatched.
+    """
+
+    def __init__(self, model, window: float = 0.01, max_batch: int = 16, slots: int = 4) -> None:
+        """
+        Args:
+            model: The model to wrap.
+            window (float): Seconds a batch waits for more calls after its first one (added latency of a lone call).
+            max_batch (int): Maximum number of calls in a batch, a full batch is dispatched without waiting.
+            slots (int): Maximum number of requests running on the server at the same time.
+        """
+        if max_batch < 1 or slots < 1:
+            raise ValueError("max_batch and slots must be at least 1")
+        self.model = model
+        self.window = window
+        self.max_batch = max_batch
+        self.slots = slots
+
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=slots)
+        self._slot_semaphore = threading.BoundedSemaphore(slots) # Shared by batched calls and streams
+        self._dispatcher = None # Started on the first call
+        self._lock = threading.Lock()
+
+        self.requests = 0 # Calls received
+        self.dispatched = 0 # Requests sent to the model (after merging identical calls)
+        self.coalesced = 0 # Calls answered by the request of an identical call
+        self.waiting = 0 # Calls queued or waiting for a slot
+        self.max_waiting = 0
+        self.in_flight = 0 # Requests running on the server
+        self.batch_sizes = Counter()
+        self.queue_depths = Counter()
+
+    def __getattr__(self, name):
+        # Only called for attributes not found in the wrapper
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def route(self, purpose: str) -> Purpose_View:
+        """
+        Returns the scheduler bound to a call purpose.
+        """
+        return Purpose_View(self, purpose)
+
+    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> str:
+        """
+        Queues the call and waits for its answer.
+
+        Args:
+            messages (List[Dict[str, str]]): A list of message dictionaries, each with 'role' and 'content'.
+            temperature (float): Sampling temperature for generation.
+            purpose (Optional[str]): Purpose of the call, forwarded to the wrapped model.
+
+        Returns:
+            str: The assistant's response text.
+        """
+        return self._submit(messages, temperature, purpose).result()
+
+    async def achat(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> str:
+        """
+        Async version of `chat`, the event loop is not blocked while the call waits in the queue.
+        """
+        return await asyncio.wrap_future(self._submit(messages, temperature, purpose))
+
+    def chat_stream(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> Iterator[str]:
+        """
+        Streams the answer of the wrapped model (not batched, it holds a slot until the stream ends).
+        If the wrapped model does not stream, the (batched) `chat` answer is yielded at once.
+        """
+        if not hasattr(for_purpose(self.model, purpose), "chat_stream"):
+            yield self.chat(messages, temperature=temperature, purpose=purpose)
+            return
+        with self._slot_semaphore:
+            with self._lock:
+                self.in_flight += 1
+            try:
+                yield from for_purpose(self.model, purpose).chat_stream(messages, temperature=temperature)
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Returns the scheduler counters and histograms, to tune `window`, `max_batch` and `slots`.
+        """
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "dispatched": self.dispatched,
+                "coalesced": self.coalesced,
+                "queue_depth": self.waiting,
+                "max_queue_depth": self.max_waiting,
+                "in_flight": self.in_flight,
+                "batch_sizes": dict(sorted(self.batch_sizes.items())),
+                "queue_depths": dict(sorted(self.queue_depths.items())),
+            }
+
+    def close(self) -> None:
+        """
+        Stops the scheduler once the queued calls are dispatched and waits for the running ones.
+        """
+        with self._lock:
+            dispatcher = self._dispatcher
+        if dispatcher is not None:
+            self._queue.put(None)
+            dispatcher.join()
+        self._executor.shutdown(wait=True)
+
+    def _submit(self, messages: List[Dict[str, str]], temperature: float, purpose: Optional[str]) -> Future:
+        request = _Request(messages, temperature, purpose)
+        with self._lock:
+            if self._dispatcher is None:
+                self._dispatcher = threading.Thread(target=self._dispatch_loop, name="batched-model", daemon=True)
+                self._dispatcher.start()
+            self.requests += 1
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+        self._queue.put(request)
+        return request.future
+
+    def _dispatch_loop(self) -> None:
+        while True:
+            request = self._queue.get()
+            if request is None:
+                return
+            batch = [request]
+            closing = False
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if request is None:
+                    closing = True
+                    break
+                batch.append(request)
+            self._dispatch(batch)
+            if closing:
+                return
+
+    def _dispatch(self, batch: List[_Request]) -> None:
+        # Identical calls in the batch share one request
+        groups: Dict[str, List[_Request]] = {}
+        for request in batch:
+            groups.setdefault(self._request_key(request), []).append(request)
+
+        with self._lock:
+            self.batch_sizes[len(batch)] += 1
+            self.queue_depths[self.waiting] += 1
+            self.dispatched += len(groups)
+            self.coalesced += len(batch) - len(groups)
+
+        for requests in groups.values():
+            self._executor.submit(self._run, requests)
+
+    def _run(self, requests: List[_Request]) -> None:
+        first = requests[0]
+        with self._slot_semaphore:
+            with self._lock:
+                self.waiting -= len(requests)
+                self.in_flight += 1
+            try:
+                response = for_purpose(self.model, first.purpose).chat(first.messages, temperature=first.temperature)
+            except Exception as e:
+                for request in requests:
+                    request.future.set_exception(e)
+                return
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+        for request in requests:
+            request.future.set_result(response)
+
+    def _request_key(self, request: _Request) -> str:
+        # The purpose only changes the answer if the wrapped model sends the purposes to different backends
+        purpose = request.purpose if routes_to_different_models(self.model) else None
+        return json.dumps([list(request.messages), request.temperature, purpose], sort_keys=True, ensure_ascii=False)
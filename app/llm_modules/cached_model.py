@@ -0,0 +1,198 @@
+# app/llm_modules/cached_model.py
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.llm_modules.model_router import Purpose_View, for_purpose, routes_to_different_models
+
+
+class Cached_Model():
+    """
+    A wrapper that caches the responses of any model exposing `chat(messages, temperature)`.
+
+    Responses are keyed on a hash of (model name, messages, temperature) and kept in a bounded
+    in-memory LRU. An optional on-disk tier (one JSON file per key) keeps them between runs.
+    Streamed replies are not cached. The call purpose is forwarded, so it can wrap a Routed_Model.
+    Every other attribute (transcribe_audio, text_to_speech, ...) is forwarded to the wrapped model.
+
+    Attributes:
+        model: The wrapped model.
+        max_entries (int): Maximum number of responses kept in memory.
+        ttl (Optional[float]): Seconds a response stays valid, None to never expire.
+        cache_dir (Optional[Path]): Directory of the on-disk tier, None to disable it.
+        hits (int): Responses served from memory.
+        disk_hits (int): Responses served from the disk tier.
+        misses (int): Calls forwarded to the wrapped model.
+    """
+
+    def __init__(self, model, max_entries: int = 1024, ttl: Optional[float] = None, cache_dir: Optional[str] = None) -> None:
+        """
+        Args:
+            model: The model to wrap.
+            max_entries (int): Maximum number of responses kept in memory (LRU eviction).
+            ttl (Optional[float]): Seconds a response stays valid, None to never expire.
+            cache_dir (Optional[str]): Directory used for the on-disk tier, None to keep the cache in memory only.
+        """
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.model = model
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        if self.cache_dir:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict() # key -> (created, response)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def __getattr__(self, name):
+        # Only called for attributes not found in the wrapper
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def route(self, purpose: str) -> Purpose_View:
+        """
+        Returns the cache bound to a call purpose.
+        """
+        return Purpose_View(self, purpose)
+
+    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> str:
+        """
+        Returns the cached response for these messages, calling the wrapped model on a miss.
+
+        Args:
+            messages (List[Dict[str, str]]): A list of message dictionaries, each with 'role' and 'content'.
+            temperature (float): Sampling temperature for generation.
+            purpose (Optional[str]): Purpose of the call, forwarded to the wrapped model.
+
+        Returns:
+            str: The assistant's response text.
+        """
+        key = self.cache_key(messages, temperature, purpose)
+
+        response = self._get(key)
+        if response is not None:
+            return response
+
+        with self._lock:
+            self.misses += 1
+        response = for_purpose(self.model, purpose).chat(messages, temperature=temperature)
+        self._put(key, response, time.time(), write_disk=True)
+        return response
+
+    async def achat(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> str:
+        """
+        Async version of `chat`.
+        """
+        key = self.cache_key(messages, temperature, purpose)
+
+        response = self._get(key)
+        if response is not None:
+            return response
+
+        with self._lock:
+            self.misses += 1
+        response = await for_purpose(self.model, purpose).achat(messages, temperature=temperature)
+        self._put(key, response, time.time(), write_disk=True)
+        return response
+
+    def chat_stream(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> Iterator[str]:
+        """
+        Streams the answer of the wrapped model (not cached).
+        If the wrapped model does not stream, the (cached) `chat` answer is yielded at once.
+        """
+        model = for_purpose(self.model, purpose)
+        if not hasattr(model, "chat_stream"):
+            return iter([self.chat(messages, temperature=temperature, purpose=purpose)])
+        return model.chat_stream(messages, temperature=temperature)
+
+    def cache_key(self, messages: List[Dict[str, str]], temperature: float, purpose: Optional[str] = None) -> str:
+        """
+        Builds the cache key of a request, a SHA-256 of (model name, messages, temperature).
+        The purpose is part of the key only if the wrapped model sends the purposes to different backends.
+        """
+        model_name = self.model.get_model() if hasattr(self.model, "get_model") else type(self.model).__name__
+        if not routes_to_different_models(self.model):
+            purpose = None
+        payload = json.dumps([model_name, list(messages), temperature, purpose], sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns the hit/miss counters and the number of responses held in memory.
+        """
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+            }
+
+    def clear(self) -> None:
+        """
+        Removes every cached response, in memory and on disk, and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.disk_hits = self.misses = 0
+        if self.cache_dir:
+            for path in self.cache_dir.glob("*.json"):
+                path.unlink(missing_ok=True)
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl is not None and time.time() - created > self.ttl
+
+    def _get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created, response = entry
+                if not self._expired(created):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return response
+                del self._entries[key]
+
+        if not self.cache_dir:
+            return None
+
+        path = self.cache_dir / f"{key}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self._expired(entry["created"]):
+            path.unlink(missing_ok=True)
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+        self._put(key, entry["response"], entry["created"], write_disk=False)
+        return entry["response"]
+
+    def _put(self, key: str, response: str, created: float, write_disk: bool) -> None:
+        with self._lock:
+            self._entries[key] = (created, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+        if write_disk and self.cache_dir:
+            # Write to a temp file and rename it, so a concurrent reader never sees a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"created": created, "response": response}, f, ensure_ascii=False)
+            os.replace(tmp_path, self.cache_dir / f"{key}.json")
@@ -0,0 +1,499 @@
+# app/llm_modules/fake_llm_server.py
+#
+# A local stand-in for the model backends, to run the agents under load without a GPU or an API key.
+#
+# Start it from the project root:
+#   python -m app.llm_modules.fake_llm_server --port 11434 --first-token 0.3 --per-token 0.02 --error-rate 0.05
+# and point the models to it:
+#   OllamaMistral7B_Model(base_url="http://127.0.0.1:11434")
+#   OpenAI_Model(client=OpenAI(base_url="http://127.0.0.1:11434/v1", api_key="fake"))
+
+import argparse
+import ast
+import json
+import math
+import os
+import random
+import re
+import string
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Literal, Optional
+
+from app.data_validation.mappings import CATEGORY_MAP, URGENCY_MAP
+from app.utils.prompt_loader import load_prompts
+from app.utils.tokens import CHARS_PER_TOKEN
+
+REQUIRED_KEYS = ["order_number", "category", "description", "urgency"]
+LANGS = ("en", "es")
+PCM_BYTES_PER_SECOND = 24000 * 2 # 24 kHz, 16 bit mono, the format returned by the OpenAI speech endpoint
+
+
+class LatencyProfile():
+    """
+    Timing of the fake answers: a time to the first token, then a time per generated token.
+
+    Attributes:
+        first_token (float): Seconds before the first token (median for "lognormal", mean otherwise).
+        per_token (float): Seconds per generated token (word) after the first one.
+        jitter (float): Spread of the first token time, seconds for "uniform" (+/- jitter), sigma for "lognormal".
+        distribution (str): "fixed", "uniform" or "lognormal" (long tail, like a loaded server).
+    """
+    def __init__(self, first_token: float = 0.0, per_token: float = 0.0, jitter: float = 0.0,
+                 distribution: Literal["fixed", "uniform", "lognormal"] = "fixed", seed: Optional[int] = 0) -> None:
+        """
+        Args:
+            first_token (float): Seconds before the first token.
+            per_token (float): Seconds per generated token after the first one.
+            jitter (float): Spread of the first token time.
+            distribution (str): "fixed", "uniform" or "lognormal".
+            seed (Optional[int]): Seed of the random generator, the same seed gives the same delays.
+        """
+        if distribution not in ("fixed", "uniform", "lognormal"):
+            raise ValueError("distribution must be 'fixed', 'uniform' or 'lognormal'")
+        self.first_token = first_token
+        self.per_token = per_token
+        self.jitter = jitter
+        self.distribution = distribution
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample_first_token(self) -> float:
+        """
+        Returns the seconds to wait before the first token of an answer.
+        """
+        if self.first_token <= 0:
+            return 0.0
+        with self._lock:
+            if self.distribution == "uniform":
+                return max(0.0, self._random.uniform(self.first_token - self.jitter, self.first_token + self.jitter))
+            if self.distribution == "lognormal":
+                return self.first_token * math.exp(self._random.gauss(0.0, self.jitter))
+        return self.first_token
+
+
+class RuleBasedResponder():
+    """
+    Answers the prompts of the agents without a model, recognizing them by their instruction
+    (the customer support and supervisor prompts of every language).
+
+    Extraction prompts are answered from the user messages (order numbers, category and urgency
+    keywords, the longest message as description), the supervisor accepts complete notes, and the
+    replies ask for the first missing field. `script` answers take precedence: the first pattern
+    found in the last message gives the answer.
+    """
+    def __init__(self, script: Optional[Dict[str, str]] = None, frustration_score: int = 3) -> None:
+        """
+        Args:
+            script (Optional[Dict[str, str]]): Fixed answers, {text found in the last message: answer}.
+            frustration_score (int): Score given to every conversation.
+        """
+        self.script = script or {}
+        self.frustration_score = frustration_score
+        self.prompts = {lang: load_prompts("customer_support", lang) for lang in LANGS}
+        self.supervisor_prompts = {lang: load_prompts("supervisor", lang) for lang in LANGS}
+        self._validation_regex = {lang: self._template_regex(self.prompts[lang]["validation_instruction"]) for lang in LANGS}
+        self._notes_regex = {lang: self._template_regex(self.prompts[lang]["partial_notes"]) for lang in LANGS}
+
+    def __call__(self, messages: List[Dict[str, str]]) -> str:
+        last = messages[-1]["content"] if messages else ""
+        for pattern, answer in self.script.items():
+            if pattern in last:
+                return answer
+
+        for lang in LANGS:
+            prompts, supervisor = self.prompts[lang], self.supervisor_prompts[lang]
+            match = self._validation_regex[lang].match(last)
+            if match:
+                value = self._extract(messages, match.group("key"), lang)
+                return value if value else match.group("invalid_response")
+            if self._starts_like(prompts["structured_extraction_instruction"], last):
+                return json.dumps({key: self._extract(messages, key, lang) for key in REQUIRED_KEYS}, ensure_ascii=False)
+            if self._starts_like(prompts["summary_instruction"], last):
+                return f"The customer reports: {self._extract(messages, 'description', lang) or 'an issue with the order'}."
+            if self._starts_like(prompts["customer_frustration"], last):
+                return str(self.frustration_score)
+            if self._starts_like(prompts["compaction_instruction"], last):
+                return "Earlier the customer explained the issue with the order."
+            if self._starts_like(supervisor["verdict"], last):
+                notes = self._literal(last.split("\n")[1], "{", "}") # The line after the intro, the format example has braces too
+                complete = isinstance(notes, dict) and all(notes.get(key) for key in REQUIRED_KEYS)
+                return json.dumps({"correct": complete, "corrections": {}, "drop": []})
+            if self._starts_like(supervisor["notes_check"], last):
+                notes = self._literal(last, "{", "}")
+                complete = isinstance(notes, dict) and all(notes.get(key) for key in REQUIRED_KEYS)
+                return "Yes" if complete else "No"
+            if self._starts_like(supervisor["fix_prompt"], last):
+                return "No"
+            if self._starts_like(supervisor["which_incorrect"], last):
+                return "[]"
+            if self._starts_like(supervisor["fix_notes"], last):
+                return "{}"
+
+        return self._reply(messages)
+
+    def _reply(self, messages: List[Dict[str, str]]) -> str:
+        # Ask for the first field missing in the latest notes
+        for lang in LANGS:
+            for message in reversed(messages):
+                match = self._notes_regex[lang].match(message["content"]) if message["role"] == "developer" else None
+                if match:
+                    notes = self._literal(match.group("extracted"), "{", "}") or {}
+                    for key in REQUIRED_KEYS:
+                        if key not in notes:
+                            return self.prompts[lang]["questions"][key]
+                    return self.prompts[lang]["thanks_message"]
+        return self.prompts["en"]["questions"]["order_number"]
+
+    def _extract(self, messages: List[Dict[str, str]], key: str, lang: str) -> Optional[str]:
+        user_texts = [m["content"] for m in messages if m["role"] == "user"]
+        if key == "order_number":
+            for text in reversed(user_texts):
+                match = re.search(r"\bord\s*-?\s*(\d+)\b", text, re.IGNORECASE)
+                if match:
+                    return f"ORD{match.group(1)}"
+        elif key in ("category", "urgency"):
+            mapping = (CATEGORY_MAP if key == "category" else URGENCY_MAP).get(lang, {})
+            for text in reversed(user_texts):
+                for word in re.findall(r"\w+", text.lower()):
+                    if word in mapping:
+                        return mapping[word]
+        elif key == "description":
+            described = [text.strip() for text in user_texts if len(text.strip()) > 10]
+            if described:
+                return max(described, key=len)
+        return None
+
+    @staticmethod
+    def _starts_like(template: str, text: str) -> bool:
+        # Compares the fixed text before the first placeholder (at most 40 characters)
+        prefix = template.split("{")[0][:40]
+        return bool(prefix) and text.startswith(prefix)
+
+    @staticmethod
+    def _template_regex(template: str) -> "re.Pattern":
+        # Each {placeholder} matches any text, repeated placeholders must match the same text
+        seen = set()
+        pattern = ""
+        for literal, name, _, _ in string.Formatter().parse(template):
+            pattern += re.escape(literal)
+            if name is None:
+                continue
+            pattern += f"(?P={name})" if name in seen else f"(?P<{name}>.+?)"
+            seen.add(name)
+        return re.compile(pattern + "$", re.DOTALL)
+
+    @staticmethod
+    def _literal(text: str, start: str, end: str):
+        first, last = text.find(start), text.rfind(end)
+        if first == -1 or last <= first:
+            return None
+        try:
+            return ast.literal_eval(text[first:last + 1])
+        except (ValueError, SyntaxError):
+            return None
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # Listen backlog, the default (5) resets connections under load
+
+
+class FakeLLMServer():
+    """
+    A local HTTP server that speaks the protocols used by the model classes:
+        - Ollama `POST /api/generate` (streamed or not), for OllamaMistral7B_Model. Like Ollama, the last prompts
+          evaluated are kept (`prompt_cache_slots`) and `prompt_eval_count` only counts the tokens after the
+          longest cached prefix.
+        - OpenAI `POST /v1/responses` (streamed or not), `POST /v1/audio/transcriptions` and
+          `POST /v1/audio/speech`, for OpenAI_Model with `OpenAI(base_url=server.openai_base_url, api_key="fake")`.
+
+    Answers come from a responder (RuleBasedResponder by default), delays from a LatencyProfile,
+    and errors can be injected at random (`error_rate`) or for the next requests (`fail_next`).
+
+    Attributes:
+        base_url (str): Base URL of the Ollama API.
+        openai_base_url (str): Base URL of the OpenAI API.
+        transcripts (List[str]): Texts returned by the next transcriptions, in order ("" once empty).
+    """
+    prompt_cache_slots = 4 # Prompts (with their answer) kept by the emulated Ollama prompt cache
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, responder: Optional[Callable[[List[Dict[str, str]]], str]] = None,
+                 latency: Optional[LatencyProfile] = None, error_rate: float = 0.0, error_status: int = 503,
+                 retry_after: Optional[float] = None, seed: Optional[int] = 0) -> None:
+        """
+        Args:
+            host (str): Interface to listen on.
+            port (int): Port to listen on, 0 to pick a free one.
+            responder (Optional[Callable]): Function answering a list of messages, RuleBasedResponder() if None.
+            latency (Optional[LatencyProfile]): Delays of the answers, no delay if None.
+            error_rate (float): Probability of answering a request with `error_status`.
+            error_status (int): HTTP status of the injected errors (e.g. 503, or 429 to simulate rate limits).
+            retry_after (Optional[float]): Seconds sent in the Retry-After header of the injected errors.
+            seed (Optional[int]): Seed of the error injection.
+        """
+        self.responder = responder if responder else RuleBasedResponder()
+        self.latency = latency if latency else LatencyProfile()
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.transcripts = []
+
+        self._random = random.Random(seed)
+        self._failures = [] # Statuses of the next requests
+        self._prompt_cache = [] # Prompts followed by their answer, least recently used first
+        self._lock = threading.Lock()
+        self.requests = Counter() # path -> requests
+        self.errors = Counter() # status -> injected errors
+
+        self._httpd = _Server((host, port), self._handler_class())
+        self._thread = None
+        self.base_url = f"http://{host}:{self._httpd.server_address[1]}"
+        self.openai_base_url = f"{self.base_url}/v1"
+
+    def __enter__(self) -> "FakeLLMServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> "FakeLLMServer":
+        """
+        Starts serving in a background thread.
+        """
+        self._thread = threading.Thread(target=self._httpd.serve_forever, kwargs={"poll_interval": 0.05}, name="fake-llm-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        """
+        Stops the server and closes its socket.
+        """
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread:
+            self._thread.join()
+
+    def fail_next(self, count: int = 1, status: Optional[int] = None) -> None:
+        """
+        Answers the next `count` requests with an error.
+
+        Args:
+            count (int): Number of requests to fail.
+            status (Optional[int]): HTTP status, `error_status` if None.
+        """
+        with self._lock:
+            self._failures.extend([status or self.error_status] * count)
+
+    def stats(self) -> Dict[str, Dict]:
+        """
+        Returns the requests received per path and the injected errors per status.
+        """
+        with self._lock:
+            return {"requests": dict(self.requests), "errors": dict(self.errors)}
+
+    def _injected_error(self, path: str) -> Optional[int]:
+        with self._lock:
+            self.requests[path] += 1
+            if self._failures:
+                status = self._failures.pop(0)
+            elif self.error_rate and self._random.random() < self.error_rate:
+                status = self.error_status
+            else:
+                return None
+            self.errors[status] += 1
+            return status
+
+    def _ollama_generate(self, payload: dict):
+        """
+        Returns (answer, prompt_eval_count) for an /api/generate payload.
+        """
+        prompt = payload.get("prompt", "")
+        answer = self.responder(self._parse_ollama_prompt(prompt))
+        with self._lock:
+            # The slot sharing the longest prefix with the prompt is reused, otherwise the least recently used one
+            shared, slot = max(((len(os.path.commonprefix([cached, prompt])), i) for i, cached in enumerate(self._prompt_cache)), default=(0, None))
+            if slot is not None and (shared or len(self._prompt_cache) >= self.prompt_cache_slots):
+                self._prompt_cache.pop(slot if shared else 0)
+            self._prompt_cache.append(prompt + answer)
+        return answer, max(1, math.ceil((len(prompt) - shared) / CHARS_PER_TOKEN))
+
+    @staticmethod
+    def _parse_ollama_prompt(prompt: str) -> List[Dict[str, str]]:
+        # Inverse of OllamaMistral7B_Model._format_prompt
+        parts = re.split(r"^\[(System|User|Assistant|Developer)\]\n", prompt, flags=re.MULTILINE)
+        messages = []
+        for role, content in zip(parts[1::2], parts[2::2]):
+            messages.append({"role": role.lower(), "content": content.rstrip("\n")})
+        if messages and messages[-1]["role"] == "assistant" and not messages[-1]["content"]:
+            messages.pop() # Generation tag
+        return messages
+
+    @staticmethod
+    def _tokens(text: str) -> List[str]:
+        # Words with their leading space, so the deltas join back into the answer
+        return re.findall(r"\s*\S+", text) or [text]
+
+    def _handler_class(self):
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1" # keep-alive, like the real servers
+
+            def do_GET(self):
+                if self.path in ("/", "/api/version"):
+                    self._send_json(200, {"version": "fake"})
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                status = server._injected_error(self.path)
+                if status is not None:
+                    headers = {"Retry-After": str(server.retry_after)} if server.retry_after is not None else {}
+                    self._send_json(status, {"error": {"message": "injected error", "type": "server_error", "code": status}}, headers)
+                    return
+
+                if self.path == "/api/generate":
+                    self._ollama(json.loads(body))
+                elif self.path == "/v1/responses":
+                    self._responses(json.loads(body))
+                elif self.path == "/v1/audio/transcriptions":
+                    with server._lock:
+                        text = server.transcripts.pop(0) if server.transcripts else ""
+                    self._sleep_answer(text)
+                    self._send(200, text.encode("utf-8"), "text/plain; charset=utf-8")
+                elif self.path == "/v1/audio/speech":
+                    text = json.loads(body).get("input", "")
+                    seconds = max(0.1, 0.06 * len(server._tokens(text)))
+                    self._send(200, bytes(int(seconds * PCM_BYTES_PER_SECOND) & ~1), "audio/pcm")
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def _ollama(self, payload: dict):
+                answer, prompt_eval_count = server._ollama_generate(payload)
+                done = {"model": payload.get("model"), "response": "", "done": True, "prompt_eval_count": prompt_eval_count}
+                if not payload.get("stream", True):
+                    self._sleep_answer(answer)
+                    self._send_json(200, dict(done, response=answer))
+                    return
+                self._start_chunked("application/x-ndjson")
+                for i, token in enumerate(server._tokens(answer)):
+                    self._sleep_token(i)
+                    self._write_chunk(json.dumps({"model": payload.get("model"), "response": token, "done": False}).encode() + b"\n")
+                self._write_chunk(json.dumps(done).encode() + b"\n")
+                self._end_chunked()
+
+            def _responses(self, payload: dict):
+                messages = payload.get("input", [])
+                if isinstance(messages, str):
+                    messages = [{"role": "user", "content": messages}]
+                answer = server.responder(messages)
+                response = self._response_object(payload, answer)
+                if not payload.get("stream"):
+                    self._sleep_answer(answer)
+                    self._send_json(200, response)
+                    return
+                self._start_chunked("text/event-stream")
+                sequence = 0
+                self._write_event("response.created", {"response": dict(response, status="in_progress", output=[])}, sequence)
+                for i, token in enumerate(server._tokens(answer)):
+                    self._sleep_token(i)
+                    sequence += 1
+                    self._write_event("response.output_text.delta", {"item_id": response["output"][0]["id"], "output_index": 0, "content_index": 0, "delta": token}, sequence)
+                self._write_event("response.completed", {"response": response}, sequence + 1)
+                self._end_chunked()
+
+            @staticmethod
+            def _response_object(payload: dict, answer: str) -> dict:
+                return {
+                    "id": f"resp_{uuid.uuid4().hex}",
+                    "object": "response",
+                    "created_at": int(time.time()),
+                    "model": payload.get("model"),
+                    "status": "completed",
+                    "output": [{
+                        "type": "message",
+                        "id": f"msg_{uuid.uuid4().hex}",
+                        "status": "completed",
+                        "role": "assistant",
+                        "content": [{"type": "output_text", "text": answer, "annotations": []}],
+                    }],
+                    "parallel_tool_calls": False,
+                    "tool_choice": "auto",
+                    "tools": [],
+                    "temperature": payload.get("temperature"),
+                }
+
+            def _sleep_answer(self, answer: str):
+                time.sleep(server.latency.sample_first_token() + server.latency.per_token * (len(server._tokens(answer)) - 1))
+
+            def _sleep_token(self, index: int):
+                time.sleep(server.latency.sample_first_token() if index == 0 else server.latency.per_token)
+
+            def _send_json(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None):
+                self._send(status, json.dumps(payload).encode(), "application/json", headers)
+
+            def _send(self, status: int, data: bytes, content_type: str, headers: Optional[Dict[str, str]] = None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _start_chunked(self, content_type: str):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+                self.wfile.flush()
+
+            def _write_event(self, event_type: str, data: dict, sequence: int):
+                data = dict(data, type=event_type, sequence_number=sequence)
+                self._write_chunk(f"event: {event_type}\ndata: {json.dumps(data)}\n\n".encode())
+
+            def _end_chunked(self):
+                self.wfile.write(b"0\r\n\r\n")
+                self.wfile.flush()
+
+            def log_message(self, *args):
+                pass
+
+        return _Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Ollama/OpenAI server for offline load and latency tests.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11434)
+    parser.add_argument("--first-token", type=float, default=0.0, help="Seconds before the first token")
+    parser.add_argument("--per-token", type=float, default=0.0, help="Seconds per generated token")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Spread of the first token time")
+    parser.add_argument("--distribution", default="fixed", choices=["fixed", "uniform", "lognormal"])
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Probability of an injected error")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", type=float, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    latency = LatencyProfile(args.first_token, args.per_token, args.jitter, args.distribution, args.seed)
+    server = FakeLLMServer(args.host, args.port, latency=latency, error_rate=args.error_rate,
+                           error_status=args.error_status, retry_after=args.retry_after, seed=args.seed)
+    print(f"Ollama API: {server.base_url}  OpenAI API: {server.openai_base_url}")
+    server.start()
+    try:
+        server._thread.join()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
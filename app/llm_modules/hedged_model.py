@@ -0,0 +1,244 @@
+# app/llm_modules/hedged_model.py
+
+import asyncio
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.llm_modules.model_router import Purpose_View, for_purpose
+
+
+class DeadlineExceeded(TimeoutError):
+    """
+    Raised when no answer arrives before the deadline of the call purpose.
+    """
+
+
+class Hedged_Model():
+    """
+    A wrapper that cuts the tail latency of any model exposing `chat(messages, temperature)`.
+
+    If a call has not answered after the hedge delay (a percentile of the recent latencies of its
+    purpose), a duplicate request is sent and the first answer wins. The other request is cancelled
+    (async calls) or its answer ignored (sync calls can not be interrupted, the thread finishes in the
+    background). Each purpose can have a deadline, after which DeadlineExceeded is raised, so a
+    Routed_Model on top can use its fallback.
+
+    Streamed replies are forwarded without hedging. Every other attribute is forwarded to the wrapped model.
+
+    Attributes:
+        model: The wrapped model.
+        hedge_percentile (float): Percentile of the recent latencies used as hedge delay, e.g. 0.95.
+        initial_hedge_delay (float): Hedge delay while a purpose has less than `min_samples` latencies.
+        max_hedges (int): Maximum number of duplicate requests per call.
+        deadlines (Dict[str, float]): Seconds allowed per purpose (None key for calls without purpose).
+    """
+    max_workers = 64 # Threads of the sync calls (slow duplicates keep theirs until they answer)
+
+    def __init__(self, model, hedge_percentile: float = 0.95, initial_hedge_delay: float = 2.0, min_hedge_delay: float = 0.05,
+                 max_hedges: int = 1, deadlines: Optional[Dict[Optional[str], float]] = None,
+                 min_samples: int = 20, window: int = 500) -> None:
+        """
+        Args:
+            model: The model to wrap.
+            hedge_percentile (float): Percentile (0-1) of the recent latencies of the purpose used as hedge delay.
+            initial_hedge_delay (float): Hedge delay used until the purpose has `min_samples` latencies.
+            min_hedge_delay (float): Lower bound of the hedge delay, avoids duplicating every fast call.
+            max_hedges (int): Maximum number of duplicate requests per call (0 to only apply the deadlines).
+            deadlines (Optional[Dict[Optional[str], float]]): Seconds allowed per purpose, e.g. {"reply": 20.0, "extraction": 8.0}.
+            min_samples (int): Latencies needed before using the percentile.
+            window (int): Number of recent latencies kept per purpose.
+        """
+        if not 0 < hedge_percentile < 1:
+            raise ValueError("hedge_percentile must be between 0 and 1")
+        self.model = model
+        self.hedge_percentile = hedge_percentile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.max_hedges = max_hedges
+        self.deadlines = deadlines or {}
+        self.min_samples = min_samples
+        self.window = window
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._lock = threading.Lock()
+        self._latencies: Dict[Optional[str], deque] = {} # purpose -> latencies of the answered calls
+        self.calls = Counter() # purpose -> calls
+        self.hedged = Counter() # purpose -> calls that sent a duplicate
+        self.hedge_wins = Counter() # purpose -> calls answered by a duplicate
+        self.deadline_exceeded = Counter() # purpose -> calls without answer before the deadline
+
+    def __getattr__(self, name):
+        # Only called for attributes not found in the wrapper
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def route(self, purpose: str) -> Purpose_View:
+        """
+        Returns the wrapper bound to a call purpose.
+        """
+        return Purpose_View(self, purpose)
+
+    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> str:
+        """
+        Sends the messages, with a duplicate request if the first one is slower than the hedge delay.
+
+        Args:
+            messages (List[Dict[str, str]]): A list of message dictionaries, each with 'role' and 'content'.
+            temperature (float): Sampling temperature for generation.
+            purpose (Optional[str]): Purpose of the call (hedge delay, deadline and statistics are per purpose).
+
+        Returns:
+            str: The first answer.
+
+        Raises:
+            DeadlineExceeded: If no answer arrives before the deadline of the purpose.
+        """
+        model = for_purpose(self.model, purpose)
+        start = time.perf_counter()
+        deadline = self.deadlines.get(purpose)
+        hedge_delay = self.hedge_delay(purpose)
+        self._count(self.calls, purpose)
+
+        requests = [self._executor.submit(model.chat, messages, temperature=temperature)]
+        while True:
+            answer = self._first_answer(requests)
+            if answer is not None:
+                for other in requests:
+                    other.cancel() # Only cancels the duplicates that did not start
+                self._answered(purpose, start, hedge=answer is not requests[0])
+                return answer.result()
+
+            send_duplicate, timeout = self._next_step(requests, purpose, start, deadline, hedge_delay)
+            if send_duplicate:
+                requests.append(self._executor.submit(model.chat, messages, temperature=temperature))
+                continue
+            wait([r for r in requests if not r.done()], timeout=timeout, return_when=FIRST_COMPLETED)
+
+    async def achat(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> str:
+        """
+        Async version of `chat`, the slower requests are cancelled.
+        """
+        model = for_purpose(self.model, purpose)
+        start = time.perf_counter()
+        deadline = self.deadlines.get(purpose)
+        hedge_delay = self.hedge_delay(purpose)
+        self._count(self.calls, purpose)
+
+        requests = [asyncio.ensure_future(model.achat(messages, temperature=temperature))]
+        try:
+            while True:
+                answer = self._first_answer(requests)
+                if answer is not None:
+                    self._answered(purpose, start, hedge=answer is not requests[0])
+                    return answer.result()
+
+                send_duplicate, timeout = self._next_step(requests, purpose, start, deadline, hedge_delay)
+                if send_duplicate:
+                    requests.append(asyncio.ensure_future(model.achat(messages, temperature=temperature)))
+                    continue
+                await asyncio.wait([r for r in requests if not r.done()], timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for request in requests:
+                request.cancel()
+
+    def chat_stream(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> Iterator[str]:
+        """
+        Streams the answer of the wrapped model (not hedged).
+        If the wrapped model does not stream, the (hedged) `chat` answer is yielded at once.
+        """
+        model = for_purpose(self.model, purpose)
+        if not hasattr(model, "chat_stream"):
+            return iter([self.chat(messages, temperature=temperature, purpose=purpose)])
+        return model.chat_stream(messages, temperature=temperature)
+
+    def hedge_delay(self, purpose: Optional[str]) -> float:
+        """
+        Returns the seconds to wait before sending a duplicate request for a purpose.
+        """
+        with self._lock:
+            latencies = sorted(self._latencies.get(purpose, ()))
+        if len(latencies) < self.min_samples:
+            return self.initial_hedge_delay
+        return max(self.min_hedge_delay, latencies[int(self.hedge_percentile * (len(latencies) - 1))])
+
+    def stats(self) -> Dict[Optional[str], Dict[str, Optional[float]]]:
+        """
+        Returns per purpose the number of calls, hedged calls, duplicates that won, deadlines exceeded,
+        and the p50/p95/p99 latencies of the answered calls (seconds).
+        """
+        with self._lock:
+            purposes = set(self.calls) | set(self._latencies)
+            stats = {}
+            for purpose in purposes:
+                latencies = sorted(self._latencies.get(purpose, ()))
+                stats[purpose] = {
+                    "calls": self.calls[purpose],
+                    "hedged": self.hedged[purpose],
+                    "hedge_wins": self.hedge_wins[purpose],
+                    "deadline_exceeded": self.deadline_exceeded[purpose],
+                    "p50": latencies[int(0.50 * (len(latencies) - 1))] if latencies else None,
+                    "p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+                    "p99": latencies[int(0.99 * (len(latencies) - 1))] if latencies else None,
+                }
+            return stats
+
+    @staticmethod
+    def _first_answer(requests):
+        """
+        Returns the first request that answered without error, None if there is none yet.
+        """
+        for request in requests:
+            if request.done() and not request.cancelled() and request.exception() is None:
+                return request
+        return None
+
+    def _next_step(self, requests, purpose: Optional[str], start: float, deadline: Optional[float], hedge_delay: float) -> Tuple[bool, Optional[float]]:
+        """
+        Decides what a call without answer does next.
+
+        Returns:
+            Tuple[bool, Optional[float]]: Whether to send a duplicate now, and otherwise the seconds to wait
+            for an answer (None to wait without limit).
+
+        Raises:
+            DeadlineExceeded: If the deadline of the purpose passed.
+            Exception: The error of the first request, if every request failed and no duplicate is left.
+        """
+        elapsed = time.perf_counter() - start
+        can_hedge = len(requests) <= self.max_hedges
+        if all(r.done() for r in requests):
+            if not can_hedge:
+                raise requests[0].exception()
+            # Every request failed, the duplicate is sent right away
+            if len(requests) == 1:
+                self._count(self.hedged, purpose)
+            return True, None
+
+        if deadline is not None and elapsed >= deadline:
+            self._count(self.deadline_exceeded, purpose)
+            raise DeadlineExceeded(f"No answer for purpose {purpose!r} after {deadline}s")
+
+        timeout = None if deadline is None else deadline - elapsed
+        if can_hedge:
+            # The n-th duplicate is sent n hedge delays after the call started
+            until_hedge = hedge_delay * len(requests) - elapsed
+            if until_hedge <= 0:
+                if len(requests) == 1:
+                    self._count(self.hedged, purpose)
+                return True, None
+            timeout = until_hedge if timeout is None else min(timeout, until_hedge)
+        return False, timeout
+
+    def _answered(self, purpose: Optional[str], start: float, hedge: bool) -> None:
+        with self._lock:
+            self._latencies.setdefault(purpose, deque(maxlen=self.window)).append(time.perf_counter() - start)
+            if hedge:
+                self.hedge_wins[purpose] += 1
+
+    def _count(self, counter: Counter, purpose: Optional[str]) -> None:
+        with self._lock:
+            counter[purpose] += 1
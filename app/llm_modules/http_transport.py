@@ -0,0 +1,121 @@
+# app/llm_modules/http_transport.py
+
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+class HTTPTransport():
+    """
+    A reusable HTTP transport for the local model servers (e.g. Ollama).
+
+    It keeps a `requests.Session` with a keep-alive connection pool, so consecutive and concurrent
+    requests reuse the open TCP connections instead of opening a new one each time. Requests use
+    separate connect/read timeouts, are retried with exponential backoff on 5xx answers and
+    connection errors, and their timing is recorded.
+
+    Attributes:
+        session (requests.Session): The pooled session used for every request.
+        connect_timeout (float): Seconds to wait for the connection to be established.
+        read_timeout (float): Seconds to wait between bytes of the answer.
+    """
+    retry_statuses = (500, 502, 503, 504)
+
+    def __init__(self, pool_size: int = 16, connect_timeout: float = 3.05, read_timeout: float = 60.0,
+                 max_retries: int = 3, backoff_factor: float = 0.5, metrics_size: int = 1000) -> None:
+        """
+        Args:
+            pool_size (int): Maximum number of keep-alive connections per host, size it for the number of concurrent sessions.
+            connect_timeout (float): Seconds to wait for the connection to be established.
+            read_timeout (float): Seconds to wait between bytes of the answer (generation time of non streamed calls).
+            max_retries (int): Maximum number of retries on connection errors and 5xx answers.
+            backoff_factor (float): Backoff between retries, backoff_factor * 2 ** (retry - 1) seconds.
+            metrics_size (int): Number of requests kept in the timing metrics.
+        """
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0, # A read error means the server got the request, do not generate twice
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=self.retry_statuses,
+            allowed_methods=frozenset(["GET", "POST"]),
+            raise_on_status=False,
+            respect_retry_after_header=False, # Else 429 answers are retried here, they are left to the caller (RateGovernor)
+        )
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, pool_block=True, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._metrics = deque(maxlen=metrics_size)
+        self._lock = threading.Lock()
+
+    def post(self, url: str, json: dict, stream: bool = False) -> requests.Response:
+        """
+        Sends a POST request with a JSON body through the pooled session.
+
+        Args:
+            url (str): Target URL.
+            json (dict): JSON payload.
+            stream (bool): If True the body is not downloaded upfront (for streamed answers).
+
+        Returns:
+            requests.Response: The response, already checked with `raise_for_status`.
+        """
+        start = time.perf_counter()
+        status = None
+        try:
+            response = self.session.post(url, json=json, timeout=(self.connect_timeout, self.read_timeout), stream=stream)
+            status = response.status_code
+            response.raise_for_status()
+            return response
+        finally:
+            self.record(url, status, time.perf_counter() - start)
+
+    def get_metrics(self) -> Dict[str, Optional[float]]:
+        """
+        Returns the timing metrics of the recorded requests (seconds).
+
+        Returns:
+            Dict[str, Optional[float]]: count, errors, mean, p50, p95, max and last request time.
+        """
+        with self._lock:
+            records = list(self._metrics)
+        if not records:
+            return {"count": 0, "errors": 0, "mean": None, "p50": None, "p95": None, "max": None, "last": None}
+
+        elapsed = sorted(r["elapsed"] for r in records)
+        return {
+            "count": len(records),
+            "errors": sum(1 for r in records if r["status"] is None or r["status"] >= 400),
+            "mean": sum(elapsed) / len(elapsed),
+            "p50": elapsed[int(0.50 * (len(elapsed) - 1))],
+            "p95": elapsed[int(0.95 * (len(elapsed) - 1))],
+            "max": elapsed[-1],
+            "last": records[-1]["elapsed"],
+        }
+
+    def close(self) -> None:
+        """
+        Closes the pooled connections.
+        """
+        self.session.close()
+
+    def record(self, url: str, status: Optional[int], elapsed: float) -> None:
+        """
+        Adds a request to the timing metrics (also used by the async client of the model classes).
+        """
+        with self._lock:
+            self._metrics.append({"url": url, "status": status, "elapsed": elapsed})
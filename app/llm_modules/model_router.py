@@ -0,0 +1,223 @@
+# app/llm_modules/model_router.py
+
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterator, List, Optional
+
+# Call purposes used by the agents
+PURPOSES = ("reply", "extraction", "supervisor", "summary", "frustration")
+
+
+def routes_by_purpose(model) -> bool:
+    """
+    Returns True if the model is a wrapper that routes by purpose (its class defines a `route` method).
+    """
+    return callable(getattr(type(model), "route", None))
+
+
+def routes_to_different_models(model) -> bool:
+    """
+    Returns True if calls of different purposes can be answered by different backends, i.e. a Routed_Model
+    with routes, directly or behind wrappers that forward its attributes. The backends that only use the
+    purpose as a priority (OpenAI_Model, OllamaMistral7B_Model) route by purpose but answer with one model.
+    """
+    backend = getattr(model, "backend", None)
+    return callable(backend) and len({id(backend(purpose)) for purpose in PURPOSES}) > 1
+
+
+def for_purpose(model, purpose: str):
+    """
+    Returns the model to use for a call purpose.
+    Wrappers that route by purpose return a model bound to that purpose, any other model is returned as it is.
+
+    Args:
+        model: The model given to the agent.
+        purpose (str): One of PURPOSES.
+    """
+    if routes_by_purpose(model):
+        return model.route(purpose)
+    return model
+
+
+class Purpose_View():
+    """
+    A model bound to a call purpose, it forwards `chat`, `achat` and `chat_stream` with `purpose=`
+    to a wrapper that supports routing, and every other attribute as it is.
+    `chat_stream` is only exposed if the wrapped model has it (the agents check it with `hasattr`).
+    """
+    def __init__(self, model, purpose: str) -> None:
+        self.model = model
+        self.purpose = purpose
+
+    def __getattr__(self, name):
+        if name == "model":
+            raise AttributeError(name)
+        if name == "chat_stream":
+            chat_stream = self.model.chat_stream # AttributeError if the model does not stream
+
+            def stream(messages: List[Dict[str, str]], temperature: float = 0.3) -> Iterator[str]:
+                return chat_stream(messages, temperature=temperature, purpose=self.purpose)
+            return stream
+        return getattr(self.model, name)
+
+    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.3) -> str:
+        return self.model.chat(messages, temperature=temperature, purpose=self.purpose)
+
+    async def achat(self, messages: List[Dict[str, str]], temperature: float = 0.3) -> str:
+        return await self.model.achat(messages, temperature=temperature, purpose=self.purpose)
+
+
+class Routed_Model():
+    """
+    A model that sends each call to a backend chosen by the purpose of the call.
+
+    For example the short classification prompts (extraction, frustration) can go to a local
+    OllamaMistral7B_Model and the customer facing replies to OpenAI_Model. If the backend of a
+    purpose errors or exceeds the latency budget of that purpose, the call is sent to the fallback.
+
+    Audio (transcribe_audio, text_to_speech) and any other attribute go to the default backend.
+
+    Attributes:
+        routes (Dict[str, object]): Backend per purpose.
+        default: Backend of the purposes without route.
+        fallback: Backend used when the routed one fails or is too slow (None to raise the error).
+        latency_budgets (Dict[str, float]): Seconds allowed per purpose before using the fallback.
+    """
+    max_workers = 32 # Threads used to enforce the latency budgets
+
+    def __init__(self, routes: Dict[str, object], default, fallback=None, latency_budgets: Optional[Dict[str, float]] = None) -> None:
+        """
+        Args:
+            routes (Dict[str, object]): Backend per purpose, e.g. {"extraction": local_model, "reply": cloud_model}.
+            default: Backend of the purposes without route.
+            fallback: Backend used when the routed one errors or exceeds its latency budget.
+            latency_budgets (Optional[Dict[str, float]]): Seconds allowed per purpose, e.g. {"extraction": 2.0}.
+        """
+        unknown = set(routes) | set(latency_budgets or {})
+        unknown -= set(PURPOSES)
+        if unknown:
+            raise ValueError(f"Unknown purposes {sorted(unknown)}, supported: {PURPOSES}")
+        self.routes = routes
+        self.default = default
+        self.fallback = fallback
+        self.latency_budgets = latency_budgets or {}
+
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        self._lock = threading.Lock()
+        self.calls = Counter() # purpose -> calls
+        self.fallbacks = Counter() # purpose -> calls answered by the fallback
+
+    def __getattr__(self, name):
+        if name == "default":
+            raise AttributeError(name)
+        return getattr(self.default, name)
+
+    def route(self, purpose: str) -> Purpose_View:
+        """
+        Returns the router bound to a call purpose.
+        """
+        return Purpose_View(self, purpose)
+
+    def backend(self, purpose: Optional[str]):
+        """
+        Returns the backend that serves a purpose.
+        """
+        return self.routes.get(purpose, self.default)
+
+    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> str:
+        """
+        Sends the messages to the backend of the purpose, falling back on error or when the latency budget is exceeded.
+
+        Args:
+            messages (List[Dict[str, str]]): A list of message dictionaries, each with 'role' and 'content'.
+            temperature (float): Sampling temperature for generation.
+            purpose (Optional[str]): Purpose of the call, None for the default backend.
+
+        Returns:
+            str: The assistant's response text.
+        """
+        primary = for_purpose(self.backend(purpose), purpose)
+        budget = self.latency_budgets.get(purpose)
+        self._count(self.calls, purpose)
+        try:
+            if budget is None:
+                return primary.chat(messages, temperature=temperature)
+            # The slow call can not be interrupted, it finishes in the background and its answer is ignored
+            return self._executor.submit(primary.chat, messages, temperature=temperature).result(timeout=budget)
+        except Exception: # Includes the timeout of the latency budget
+            if not self._use_fallback(purpose):
+                raise
+            return for_purpose(self.fallback, purpose).chat(messages, temperature=temperature)
+
+    async def achat(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> str:
+        """
+        Async version of `chat`.
+        """
+        primary = for_purpose(self.backend(purpose), purpose)
+        budget = self.latency_budgets.get(purpose)
+        self._count(self.calls, purpose)
+        try:
+            return await asyncio.wait_for(primary.achat(messages, temperature=temperature), timeout=budget)
+        except Exception: # Includes the timeout of the latency budget
+            if not self._use_fallback(purpose):
+                raise
+            return await for_purpose(self.fallback, purpose).achat(messages, temperature=temperature)
+
+    def chat_stream(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> Iterator[str]:
+        """
+        Streams the answer of the backend of the purpose. The fallback is only used if the backend
+        fails before the first delta (the latency budget is not applied to streams).
+        A backend that does not stream answers with `chat`, yielded at once.
+        """
+        self._count(self.calls, purpose)
+        primary = for_purpose(self.backend(purpose), purpose)
+        started = False
+        try:
+            if not hasattr(primary, "chat_stream"):
+                answer = primary.chat(messages, temperature=temperature)
+                started = True
+                yield answer
+                return
+            for delta in primary.chat_stream(messages, temperature=temperature):
+                started = True
+                yield delta
+        except Exception:
+            if started or not self._use_fallback(purpose):
+                raise
+            fallback = for_purpose(self.fallback, purpose)
+            if hasattr(fallback, "chat_stream"):
+                yield from fallback.chat_stream(messages, temperature=temperature)
+            else:
+                yield fallback.chat(messages, temperature=temperature)
+
+    async def aclose(self) -> None:
+        """
+        Closes the async clients of every backend (each one once).
+        """
+        backends = []
+        for backend in [self.default, self.fallback, *self.routes.values()]:
+            if backend is not None and all(backend is not seen for seen in backends):
+                backends.append(backend)
+        for backend in backends:
+            aclose = getattr(backend, "aclose", None)
+            if aclose is not None:
+                await aclose()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns the number of calls and fallbacks per purpose.
+        """
+        with self._lock:
+            return {"calls": dict(self.calls), "fallbacks": dict(self.fallbacks)}
+
+    def _use_fallback(self, purpose: Optional[str]) -> bool:
+        if self.fallback is None or self.fallback is self.backend(purpose):
+            return False
+        self._count(self.fallbacks, purpose)
+        return True
+
+    def _count(self, counter: Counter, purpose: Optional[str]) -> None:
+        with self._lock:
+            counter[purpose] += 1
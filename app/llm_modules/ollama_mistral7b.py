@@ -1,53 +1,204 @@
 # app/llm_modules/ollama_mistral7b.py
 
-import requests
-from typing import List, Dict, Optional
+import asyncio
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterator, List, Dict, Optional, Tuple
+
+import httpx
+
+from app.llm_modules.http_transport import HTTPTransport
+from app.llm_modules.model_router import Purpose_View
+from app.llm_modules.rate_governor import RateGovernor
+from app.utils.tokens import estimate_tokens
 
 class OllamaMistral7B_Model():
     """
     A wrapper class to interact with an Ollama-based language model endpoint,
     specifically using the Mistral 7B variant by default.
+
+    The full prompt is always sent, with `keep_alive` so the model stays loaded, and Ollama reuses its
+    cache of the longest prompt prefix it already evaluated. Prompts keep their stable part first (system
+    prompt and dialog) and the parts that change every call (the notes of the turn, the extraction or
+    supervisor instruction) last, so consecutive calls share that prefix.
+    The stable prefixes sent (and the same prefixes followed by their answer) are tracked to count the
+    prompts the server could serve from its cache (`prefix_hits`). That is only the client's estimate:
+    the `prompt_eval_count` reported by Ollama (the prompt tokens it actually evaluated) is added up in
+    `prompt_eval_tokens`, to compare with the estimated size of the prompts sent (`prompt_tokens`).
+
+    An optional RateGovernor, shared by the instances that reach the same server, caps the concurrent
+    requests and serves the waiting calls by priority of their purpose.
     """
     base_url: str = "http://localhost:11434"
     model: str = "mistral:7b-text-fp16" #"mistral-small:22b-instruct-2409-fp16"#"llama3.2:3b-text-fp16 "#"mistral:7b-text-fp16"
+    keep_alive: str = "10m" # How long Ollama keeps the model loaded after a request
+    max_prefixes: int = 32 # Number of stable prefixes tracked
 
-    def __init__(self, model: Optional[str] = None, base_url: Optional[str] = None) -> None:
+    def __init__(self, model: Optional[str] = None, base_url: Optional[str] = None, transport: Optional[HTTPTransport] = None,
+                 governor: Optional[RateGovernor] = None) -> None:
         """
         Initializes the model with optional overrides for the model name and base URL.
         
         Args:
             model (Optional[str]): A custom model name to override the default.
             base_url (Optional[str]): A custom base URL for the Ollama API.
+            transport (Optional[HTTPTransport]): Pooled HTTP transport, can be shared by several instances. If None, a new one is created.
+            governor (Optional[RateGovernor]): Rate limits and priorities of the calls, can be shared by several instances.
         """
+        self.transport = transport if transport else HTTPTransport()
+        self.governor = governor
+        self.async_client = None # httpx.AsyncClient, created on the first async call (bound to that event loop)
+
+        self._prefixes = OrderedDict() # Stable prefixes recently sent, with and without their answer (LRU)
+        self._state_lock = threading.Lock()
+        self.prefix_hits = 0
+        self.prefix_misses = 0
+        self.prompt_tokens = 0 # Estimated size of the prompts answered
+        self.prompt_eval_tokens = 0 # Prompt tokens evaluated by the server (`prompt_eval_count`)
         if model:
             self.set_model(model)
         if base_url:
             self.set_base_url(base_url)
 
-    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.3) -> str:
+    def route(self, purpose: str) -> Purpose_View:
+        """
+        Returns the model bound to a call purpose (the purpose gives the priority of the call in the governor).
+        """
+        return Purpose_View(self, purpose)
+
+    def chat(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> str:
         """
         Sends a formatted chat prompt to the Ollama API and retrieves a response.
 
         Args:
             messages (List[Dict[str, str]]): A list of message dictionaries, each with 'role' and 'content'.
             temperature (float): Sampling temperature for generation (controls randomness).
+            purpose (Optional[str]): Purpose of the call, its priority when a governor is set.
 
         Returns:
             str: The assistant's response text.
         """
-        prompt = self._format_prompt(messages)
-        response = requests.post(
-            f"{self.base_url}/api/generate",
-            json={
-                "model": self.model,
-                "prompt": prompt,
-                "temperature": temperature,
-                "stream": False,
-            },
-            timeout=60,
-        )
-        response.raise_for_status()
-        return response.json()["response"].strip()
+        if self.governor:
+            return self.governor.call(purpose, messages, self._chat, messages, temperature)
+        return self._chat(messages, temperature)
+
+    def _chat(self, messages: List[Dict[str, str]], temperature: float) -> str:
+        payload, stable = self._generate_payload(messages, temperature, stream=False)
+        response = self.transport.post(f"{self.base_url}/api/generate", json=payload)
+        data = response.json()
+        text = data["response"].strip()
+        self._remember_prefix(stable, text)
+        self._record_eval(messages, data)
+        return text
+
+    def chat_stream(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> Iterator[str]:
+        """
+        Sends a formatted chat prompt to the Ollama API and yields the response text as it is generated.
+
+        Args:
+            messages (List[Dict[str, str]]): A list of message dictionaries, each with 'role' and 'content'.
+            temperature (float): Sampling temperature for generation (controls randomness).
+            purpose (Optional[str]): Purpose of the call, its priority when a governor is set.
+
+        Yields:
+            str: Text deltas of the assistant's response (leading whitespace removed, like `chat`).
+        """
+        if self.governor:
+            return self.governor.stream(purpose, messages, self._chat_stream, messages, temperature)
+        return self._chat_stream(messages, temperature)
+
+    def _chat_stream(self, messages: List[Dict[str, str]], temperature: float) -> Iterator[str]:
+        payload, stable = self._generate_payload(messages, temperature, stream=True)
+        response = self.transport.post(f"{self.base_url}/api/generate", json=payload, stream=True)
+        parts = []
+        started = False
+        with response:
+            # Ollama streams one JSON object per line
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                delta = chunk.get("response", "")
+                if not started:
+                    delta = delta.lstrip()
+                    started = bool(delta)
+                if delta:
+                    parts.append(delta)
+                    yield delta
+                if chunk.get("done"):
+                    self._remember_prefix(stable, "".join(parts).strip())
+                    self._record_eval(messages, chunk)
+                    break
+
+    async def achat(self, messages: List[Dict[str, str]], temperature: float = 0.3, purpose: Optional[str] = None) -> str:
+        """
+        Async version of `chat`, using a pooled `httpx.AsyncClient` so many conversations can share one event loop.
+        Uses the timeouts and retry policy of the transport (retries on connection errors and 5xx answers).
+
+        Args:
+            messages (List[Dict[str, str]]): A list of message dictionaries, each with 'role' and 'content'.
+            temperature (float): Sampling temperature for generation (controls randomness).
+            purpose (Optional[str]): Purpose of the call, its priority when a governor is set.
+
+        Returns:
+            str: The assistant's response text.
+        """
+        if self.governor:
+            return await self.governor.acall(purpose, messages, self._achat, messages, temperature)
+        return await self._achat(messages, temperature)
+
+    async def _achat(self, messages: List[Dict[str, str]], temperature: float) -> str:
+        payload, stable = self._generate_payload(messages, temperature, stream=False)
+        url = f"{self.base_url}/api/generate"
+        client = self._get_async_client()
+        for attempt in range(self.transport.max_retries + 1):
+            start = time.perf_counter()
+            status = None
+            try:
+                response = await client.post(url, json=payload)
+                status = response.status_code
+            finally:
+                self.transport.record(url, status, time.perf_counter() - start)
+            if status in HTTPTransport.retry_statuses and attempt < self.transport.max_retries:
+                await asyncio.sleep(self.transport.backoff_factor * 2 ** attempt)
+                continue
+            response.raise_for_status()
+            data = response.json()
+            text = data["response"].strip()
+            self._remember_prefix(stable, text)
+            self._record_eval(messages, data)
+            return text
+
+    async def atranscribe_audio(self, audio_path: str, model: str = "") -> str:
+        """
+        Async version of `transcribe_audio` (not implemented for the local model).
+        """
+        return self.transcribe_audio(audio_path, model)
+
+    async def atext_to_speech(self, text: str, voice: str = "coral", instructions: str = "Speak in a cheerful and positive tone.", model: str = ""):
+        """
+        Async version of `text_to_speech` (not implemented for the local model).
+        """
+        return self.text_to_speech(text, voice, instructions, model)
+
+    def _get_async_client(self) -> httpx.AsyncClient:
+        if self.async_client is None:
+            self.async_client = httpx.AsyncClient(
+                timeout=httpx.Timeout(self.transport.read_timeout, connect=self.transport.connect_timeout),
+                limits=httpx.Limits(max_connections=self.transport.pool_size, max_keepalive_connections=self.transport.pool_size),
+                transport=httpx.AsyncHTTPTransport(retries=self.transport.max_retries), # Connection errors
+            )
+        return self.async_client
+
+    async def aclose(self) -> None:
+        """
+        Closes the async client, from the event loop that used it. The next async call creates a new one.
+        """
+        client, self.async_client = self.async_client, None
+        if client is not None:
+            await client.aclose()
 
     def transcribe_audio(self, audio_path: str, model: str = "") -> str:
         """
@@ -105,6 +256,51 @@ class OllamaMistral7B_Model():
         """
         return self.model
 
+    def set_transport(self, transport: HTTPTransport) -> None:
+        """
+        Sets the HTTP transport used to reach the Ollama API.
+
+        Args:
+            transport (HTTPTransport): The pooled transport to use.
+        """
+        self.transport = transport
+
+    def set_governor(self, governor: Optional[RateGovernor]) -> None:
+        """
+        Sets the rate limits applied to the chat calls (can be shared by several instances).
+
+        Args:
+            governor (Optional[RateGovernor]): The governor to use, None to send the calls freely.
+        """
+        self.governor = governor
+
+    def get_metrics(self) -> dict:
+        """
+        Retrieves the per-request timing metrics of the transport.
+
+        Returns:
+            dict: Timing metrics, see `HTTPTransport.get_metrics`.
+        """
+        return self.transport.get_metrics()
+
+    def get_prompt_stats(self) -> dict:
+        """
+        Retrieves the prompt cache counters: the prefix hits estimated by the client and the prompt tokens
+        the server reported as evaluated, against the estimated size of the prompts.
+
+        Returns:
+            dict: prefix_hits, prefix_misses, prompt_tokens, prompt_eval_tokens and eval_ratio
+                  (evaluated / estimated prompt tokens, None before the first answer).
+        """
+        with self._state_lock:
+            return {
+                "prefix_hits": self.prefix_hits,
+                "prefix_misses": self.prefix_misses,
+                "prompt_tokens": self.prompt_tokens,
+                "prompt_eval_tokens": self.prompt_eval_tokens,
+                "eval_ratio": self.prompt_eval_tokens / self.prompt_tokens if self.prompt_tokens else None,
+            }
+
     def set_base_url(self, base_url: str) -> None:
         """
         Sets the base URL of the Ollama API endpoint.
@@ -125,17 +321,74 @@ class OllamaMistral7B_Model():
         Returns:
             str: A formatted prompt string for the LLM.
         """
-        prompt = ""
-        for msg in messages:
-            role = msg["role"]
-            content = msg["content"]
-            if role == "system":
-                prompt += f"[System]\n{content}\n"
-            elif role == "user":
-                prompt += f"[User]\n{content}\n"
-            elif role == "assistant":
-                prompt += f"[Assistant]\n{content}\n"
-            elif role == "developer":
-                prompt += f"[Developer]\n{content}\n"
-        prompt += "[Assistant]\n"
-        return prompt
+        return "".join(self._format_message(msg) for msg in messages) + "[Assistant]\n"
+
+    @staticmethod
+    def _format_message(msg: Dict[str, str]) -> str:
+        role = msg["role"]
+        content = msg["content"]
+        if role == "system":
+            return f"[System]\n{content}\n"
+        elif role == "user":
+            return f"[User]\n{content}\n"
+        elif role == "assistant":
+            return f"[Assistant]\n{content}\n"
+        elif role == "developer":
+            return f"[Developer]\n{content}\n"
+        return ""
+
+    def _generate_payload(self, messages: List[Dict[str, str]], temperature: float, stream: bool) -> Tuple[dict, str]:
+        """
+        Builds the /api/generate payload and counts a prefix hit when the stable prefix of the prompt
+        (the messages up to the last user or assistant message) starts with a stable prefix already sent.
+
+        Returns:
+            Tuple[dict, str]: The payload and the formatted stable prefix of the prompt.
+        """
+        parts = [self._format_message(msg) for msg in messages]
+        prompt = "".join(parts) + "[Assistant]\n"
+        dialog = [i for i, msg in enumerate(messages) if msg["role"] in ("user", "assistant")]
+        stable = "".join(parts[:dialog[-1] + 1]) if dialog else ""
+        payload = {
+            "model": self.model,
+            "prompt": prompt,
+            "temperature": temperature,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+        with self._state_lock:
+            prefix = max((text for text in self._prefixes if stable.startswith(text)), key=len, default=None)
+            if prefix is None:
+                self.prefix_misses += 1
+            else:
+                self.prefix_hits += 1
+                self._prefixes.move_to_end(prefix)
+            self._remember(stable) # Evaluated by the server with this call, the next calls can share it
+        return payload, stable
+
+    def _remember_prefix(self, stable: str, response: str) -> None:
+        """
+        Tracks the stable prefix followed by the answer, the start of the next turn of the conversation.
+        """
+        if not stable:
+            return
+        with self._state_lock:
+            self._remember(stable + self._format_message({"role": "assistant", "content": response}))
+
+    def _record_eval(self, messages: List[Dict[str, str]], data: dict) -> None:
+        """
+        Adds the prompt tokens the server evaluated for an answer, when it reports them.
+        """
+        if "prompt_eval_count" not in data:
+            return
+        with self._state_lock:
+            self.prompt_tokens += estimate_tokens(messages)
+            self.prompt_eval_tokens += data["prompt_eval_count"]
+
+    def _remember(self, text: str) -> None:
+        if not text:
+            return
+        self._prefixes[text] = True
+        self._prefixes.move_to_end(text)
+        while len(self._prefixes) > self.max_prefixes:
+            self._prefixes.popitem(last=False)
@@ -1,9 +1,12 @@
 # app/llm_modules/open_ai.py
 
-from openai import OpenAI
-from typing import List, Dict
+from openai import AsyncOpenAI, OpenAI
+from typing import Iterator, List, Dict, Optional
 import os
 
+from app.llm_modules.model_router import Purpose_View
+from app.llm_modules.rate_governor import RateGovernor
+
 class OpenAI_Model():
     """
     A class to interact with OpenAI's GPT model and Text-to-Speech (TTS) API through the OpenAI API client.
@@ -11,14 +14,19 @@ class OpenAI_Model():
     Attributes:
         client (OpenAI): An instance of the OpenAI client to interact with the API.
         model (str): The model name to be used for generating responses (default is "gpt-4.1-nano").
+        governor (RateGovernor): Optional rate limits shared with the other instances, the chat calls wait for a slot
+            by priority of their purpose and are sent again after a 429 answer.
 
     Methods:
-        __init__(self, model: str = None, client: OpenAI = None) -> None:
+        __init__(self, model: str = None, client: OpenAI = None, async_client: AsyncOpenAI = None, governor: RateGovernor = None) -> None:
             Initializes the OpenAI_Model with the given model and OpenAI client.
         
         chat(self, messages: List[Dict], temperature: float = 0.3) -> str:
             Sends the messages to the OpenAI API and returns the generated response.
 
+        chat_stream(self, messages: List[Dict], temperature: float = 0.3) -> Iterator[str]:
+            Sends the messages to the OpenAI API and yields the response text as it is generated.
+
         set_client(self, client: OpenAI) -> None:
             Sets the OpenAI client instance.
 
@@ -28,6 +36,9 @@ class OpenAI_Model():
         get_model(self) -> str:
             Retrieves the current model name.
 
+        achat / atranscribe_audio / atext_to_speech:
+            Async versions using the AsyncOpenAI client, so many conversations can share one event loop.
+
         transcribe_audio(self, audio_path: str, model: str = "whisper-1") -> str:
             Transcribes an audio file using OpenAI's Whisper model.
         
@@ -35,15 +46,19 @@ class OpenAI_Model():
             Converts text to speech using OpenAI's TTS API and saves the result to the specified file.
     """
     client = None
+    async_client = None
     model = "gpt-4.1-nano"
+    governor = None
 
-    def __init__(self, model:str = None, client:OpenAI = None) -> None:
+    def __init__(self, model:str = None, client:OpenAI = None, async_client:AsyncOpenAI = None, governor:RateGovernor = None) -> None:
         """
         Initializes the OpenAI_Model with the specified model and OpenAI client.
 
         Args:
             model (str, optional): The model to be used for generating responses. Defaults to "gpt-4.1-nano".
             client (OpenAI, optional): The OpenAI client instance. If None, a new OpenAI client is created.
+            async_client (AsyncOpenAI, optional): The async OpenAI client instance. If None, it is created on the first async call.
+            governor (RateGovernor, optional): Rate limits shared by the instances that use the same account.
         """
         # Set the model name
         if model:
@@ -54,26 +69,141 @@ class OpenAI_Model():
             self.set_client(client)
         else:
             self.set_client(OpenAI())
+
+        if async_client:
+            self.set_async_client(async_client)
+
+        if governor:
+            self.set_governor(governor)
     
 
-    def chat(self, messages: List[Dict], temperature: float = 0.3) -> str:
+    @staticmethod
+    def _input(messages: List[Dict]) -> List[Dict]:
+        # The API rejects unknown message fields, e.g. the `summary` tag of the context budget
+        return [{"role": m["role"], "content": m["content"]} for m in messages]
+
+    def route(self, purpose: str) -> Purpose_View:
+        """
+        Returns the model bound to a call purpose (the purpose gives the priority of the call in the governor).
+        """
+        return Purpose_View(self, purpose)
+
+    def chat(self, messages: List[Dict], temperature: float = 0.3, purpose: Optional[str] = None) -> str:
         """
         Sends the provided messages to the OpenAI API and returns the generated response.
 
         Args:
             messages (List[Dict]): A list of message dictionaries where each dictionary contains 'role' and 'content'.
             temperature (float, optional): A value that controls the randomness of the model's output. Defaults to 0.3.
+            purpose (Optional[str]): Purpose of the call, its priority when a governor is set.
 
         Returns:
             str: The generated response text from the model.
         """
+        if self.governor:
+            return self.governor.call(purpose, messages, self._chat, messages, temperature)
+        return self._chat(messages, temperature)
+
+    def _chat(self, messages: List[Dict], temperature: float) -> str:
         response = self.client.responses.create(
                         model=      self.model,
-                        input=      messages,
+                        input=      self._input(messages),
                         temperature=temperature,
         )
         return response.output_text
     
+    def chat_stream(self, messages: List[Dict], temperature: float = 0.3, purpose: Optional[str] = None) -> Iterator[str]:
+        """
+        Sends the provided messages to the OpenAI API and yields the generated text as it arrives.
+
+        Args:
+            messages (List[Dict]): A list of message dictionaries where each dictionary contains 'role' and 'content'.
+            temperature (float, optional): A value that controls the randomness of the model's output. Defaults to 0.3.
+            purpose (Optional[str]): Purpose of the call, its priority when a governor is set.
+
+        Yields:
+            str: Text deltas of the generated response.
+        """
+        if self.governor:
+            return self.governor.stream(purpose, messages, self._chat_stream, messages, temperature)
+        return self._chat_stream(messages, temperature)
+
+    def _chat_stream(self, messages: List[Dict], temperature: float) -> Iterator[str]:
+        stream = self.client.responses.create(
+                        model=      self.model,
+                        input=      self._input(messages),
+                        temperature=temperature,
+                        stream=     True,
+        )
+        for event in stream:
+            if event.type == "response.output_text.delta":
+                yield event.delta
+
+    async def achat(self, messages: List[Dict], temperature: float = 0.3, purpose: Optional[str] = None) -> str:
+        """
+        Async version of `chat`.
+
+        Args:
+            messages (List[Dict]): A list of message dictionaries where each dictionary contains 'role' and 'content'.
+            temperature (float, optional): A value that controls the randomness of the model's output. Defaults to 0.3.
+            purpose (Optional[str]): Purpose of the call, its priority when a governor is set.
+
+        Returns:
+            str: The generated response text from the model.
+        """
+        if self.governor:
+            return await self.governor.acall(purpose, messages, self._achat, messages, temperature)
+        return await self._achat(messages, temperature)
+
+    async def _achat(self, messages: List[Dict], temperature: float) -> str:
+        response = await self._get_async_client().responses.create(
+                        model=      self.model,
+                        input=      self._input(messages),
+                        temperature=temperature,
+        )
+        return response.output_text
+
+    async def atranscribe_audio(self, audio_path: str, model: str = "whisper-1") -> str:
+        """
+        Async version of `transcribe_audio`.
+
+        Args:
+            audio_path (str): Path to the local audio file.
+            model (str): Whisper model to use (default: "whisper-1").
+
+        Returns:
+            str: The transcribed text.
+        """
+        if not os.path.exists(audio_path):
+            raise FileNotFoundError(f"Audio file not found: {audio_path}")
+
+        with open(audio_path, "rb") as audio_file:
+            transcript = await self._get_async_client().audio.transcriptions.create(
+                model=model,
+                file=audio_file,
+                response_format="text"
+            )
+            return transcript
+
+    async def atext_to_speech(self, text: str, voice: str = "coral", instructions: str = "Speak in a cheerful and positive tone.", model: str = "gpt-4o-mini-tts"):
+        """
+        Async version of `text_to_speech`, returns the audio chunks.
+
+        Args:
+            text (str): The text to convert to speech.
+            voice (str): The voice to use for speech (default is "coral").
+            instructions (str): Instructions on how the speech should sound (default is "Speak in a cheerful and positive tone.").
+            model (str): Selected model, default gpt-4o-mini-tts
+        """
+        audio_response = await self._get_async_client().audio.speech.create(
+            model=model,
+            voice=voice,
+            input=text,
+            instructions=instructions,
+            response_format="pcm"
+        )
+        return audio_response.iter_bytes(chunk_size=1024)
+
     def transcribe_audio(self, audio_path: str, model: str = "whisper-1") -> str:
         """
         Transcribes an audio file using OpenAI's Whisper model.
@@ -124,6 +254,38 @@ class OpenAI_Model():
         """
         self.client = client
     
+    def set_async_client(self, async_client:AsyncOpenAI) -> None:
+        """
+        Sets the async OpenAI client instance used by the async methods.
+
+        Args:
+            async_client (AsyncOpenAI): The async OpenAI client instance.
+        """
+        self.async_client = async_client
+
+    def set_governor(self, governor:RateGovernor) -> None:
+        """
+        Sets the rate limits applied to the chat calls (can be shared by several instances).
+
+        Args:
+            governor (RateGovernor): The governor to use, None to send the calls freely.
+        """
+        self.governor = governor
+
+    def _get_async_client(self) -> AsyncOpenAI:
+        if self.async_client is None:
+            # Same endpoint and key as the sync client
+            self.set_async_client(AsyncOpenAI(base_url=self.client.base_url, api_key=self.client.api_key))
+        return self.async_client
+
+    async def aclose(self) -> None:
+        """
+        Closes the async client, from the event loop that used it. The next async call creates a new one.
+        """
+        client, self.async_client = self.async_client, None
+        if client is not None:
+            await client.close()
+
     def set_model(self, model:str) -> None:
         """
         Sets the model name to be used for generating responses.
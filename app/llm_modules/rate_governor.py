@@ -0,0 +1,333 @@
+# app/llm_modules/rate_governor.py
+
+import asyncio
+import email.utils
+import heapq
+import itertools
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional
+
+from app.utils.tokens import estimate_tokens
+
+# Priority class per call purpose, lower classes are served first (the customer is waiting for the reply)
+PRIORITIES = {"reply": 0, "extraction": 1, "supervisor": 1, None: 1, "summary": 2, "frustration": 2}
+
+
+class _TokenBucket():
+    """
+    Holds up to `per_minute` units, refilled continuously at `per_minute / 60` units per second.
+    """
+    __slots__ = ("capacity", "rate", "level", "updated")
+
+    def __init__(self, per_minute: float) -> None:
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """
+        Returns the seconds until `amount` units are available (a call bigger than the bucket waits for a full bucket).
+        """
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        return max(0.0, (min(amount, self.capacity) - self.level) / self.rate)
+
+    def take(self, amount: float) -> None:
+        self.level -= min(amount, self.capacity)
+
+    def drain(self) -> None:
+        self.level = min(self.level, 0.0)
+
+
+class _Waiter():
+    """
+    A call waiting for a slot, woken by the thread that grants it (sync calls) or through its event loop (async calls).
+    """
+    __slots__ = ("purpose", "tokens", "enqueued", "granted", "cancelled", "event", "loop")
+
+    def __init__(self, purpose: Optional[str], tokens: int, loop: Optional[asyncio.AbstractEventLoop] = None) -> None:
+        self.purpose = purpose
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.granted = False
+        self.cancelled = False
+        self.loop = loop
+        self.event = asyncio.Event() if loop else threading.Event()
+
+    def wake(self) -> None:
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self.event.set)
+
+
+class RateGovernor():
+    """
+    Client-side rate limiting shared by the model instances that reach the same backend.
+
+    Every call waits for a slot before its request is sent: token buckets limit the requests and
+    the estimated tokens per minute, and `max_in_flight` caps the concurrent requests. Waiting calls
+    are served by priority class of their purpose (see PRIORITIES), so the customer facing replies go
+    ahead of the background summaries and frustration scores, and in arrival order within a class.
+
+    A 429 answer pauses every call for the Retry-After time of the answer (exponential backoff if it
+    has none), empties the buckets so the calls restart at the sustained rate, and the call is sent
+    again instead of failing the conversation.
+
+    Sync and async calls can share a governor, e.g. `OpenAI_Model(governor=governor)`.
+
+    Attributes:
+        max_in_flight (Optional[int]): Maximum number of concurrent requests, None for no limit.
+        priorities (Dict[Optional[str], int]): Priority class per purpose.
+        max_retries (int): Maximum number of times a call is sent again after a 429 answer.
+        completion_tokens (int): Tokens counted for the answer of each call (its size is not known upfront).
+    """
+
+    def __init__(self, requests_per_minute: Optional[float] = None, tokens_per_minute: Optional[float] = None,
+                 max_in_flight: Optional[int] = None, priorities: Optional[Dict[Optional[str], int]] = None,
+                 max_retries: int = 5, retry_after: float = 1.0, max_retry_after: float = 60.0, completion_tokens: int = 256) -> None:
+        """
+        Args:
+            requests_per_minute (Optional[float]): Requests allowed per minute, None for no limit.
+            tokens_per_minute (Optional[float]): Estimated tokens (prompt + `completion_tokens`) allowed per minute, None for no limit.
+            max_in_flight (Optional[int]): Maximum number of concurrent requests, None for no limit.
+            priorities (Optional[Dict[Optional[str], int]]): Priority class per purpose (lower first), defaults to PRIORITIES.
+            max_retries (int): Maximum number of times a call is sent again after a 429 answer.
+            retry_after (float): Backoff after a 429 answer without Retry-After header, doubled on each retry.
+            max_retry_after (float): Maximum pause after a 429 answer.
+            completion_tokens (int): Tokens counted for the answer of each call.
+        """
+        if max_in_flight is not None and max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.priorities = dict(PRIORITIES, **(priorities or {}))
+        self.max_retries = max_retries
+        self.retry_after = retry_after
+        self.max_retry_after = max_retry_after
+        self.completion_tokens = completion_tokens
+
+        self._requests = _TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self._queue = [] # Heap of (priority class, arrival, waiter)
+        self._arrivals = itertools.count()
+        self._paused_until = 0.0 # Monotonic time until which no call is sent (429 answer)
+        self._lock = threading.Lock()
+
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.waiting = 0
+        self.granted = Counter() # purpose -> calls sent
+        self.wait_time = Counter() # purpose -> seconds waited for a slot
+        self.rate_limited = 0 # 429 answers
+
+    def call(self, purpose: Optional[str], messages: List[Dict[str, str]], fn: Callable, *args, **kwargs):
+        """
+        Calls `fn(*args, **kwargs)` once a slot is granted, sending it again after a 429 answer.
+
+        Args:
+            purpose (Optional[str]): Purpose of the call, gives its priority class.
+            messages (List[Dict[str, str]]): Prompt of the call, used to estimate its tokens.
+            fn (Callable): The request.
+
+        Returns:
+            The result of `fn`.
+        """
+        tokens = self._cost(messages)
+        for attempt in itertools.count():
+            self._acquire(purpose, tokens)
+            try:
+                return fn(*args, **kwargs)
+            except Exception as e:
+                if self._backoff(e, attempt) is None:
+                    raise
+            finally:
+                self._release()
+
+    async def acall(self, purpose: Optional[str], messages: List[Dict[str, str]], fn: Callable, *args, **kwargs):
+        """
+        Async version of `call`, `fn` returns a coroutine. A call cancelled while it waits gives its place up.
+        """
+        tokens = self._cost(messages)
+        for attempt in itertools.count():
+            await self._aacquire(purpose, tokens)
+            try:
+                return await fn(*args, **kwargs)
+            except Exception as e:
+                if self._backoff(e, attempt) is None:
+                    raise
+            finally:
+                self._release()
+
+    def stream(self, purpose: Optional[str], messages: List[Dict[str, str]], fn: Callable, *args, **kwargs) -> Iterator[str]:
+        """
+        Streaming version of `call`, the slot is held until the stream ends or is closed.
+        The call is only sent again if the 429 answer arrives before the first delta.
+        """
+        tokens = self._cost(messages)
+        for attempt in itertools.count():
+            self._acquire(purpose, tokens)
+            started = False
+            try:
+                for delta in fn(*args, **kwargs):
+                    started = True
+                    yield delta
+                return
+            except Exception as e:
+                if started or self._backoff(e, attempt) is None:
+                    raise
+            finally:
+                self._release()
+
+    def stats(self) -> Dict[str, object]:
+        """
+        Returns the requests in flight (current and peak), the calls waiting, the 429 answers,
+        and per purpose the calls sent and their mean wait for a slot (seconds).
+        """
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "peak_in_flight": self.peak_in_flight,
+                "waiting": self.waiting,
+                "rate_limited": self.rate_limited,
+                "granted": dict(self.granted),
+                "mean_wait": {purpose: self.wait_time[purpose] / count for purpose, count in self.granted.items()},
+            }
+
+    def _cost(self, messages: List[Dict[str, str]]) -> int:
+        return estimate_tokens(messages) + self.completion_tokens if self._tokens else 0
+
+    def _acquire(self, purpose: Optional[str], tokens: int) -> None:
+        waiter = _Waiter(purpose, tokens)
+        with self._lock:
+            timeout = self._enqueue(waiter)
+        while True:
+            waiter.event.wait(timeout)
+            with self._lock:
+                if waiter.granted:
+                    return
+                waiter.event.clear()
+                timeout = self._grant(waiter)
+
+    async def _aacquire(self, purpose: Optional[str], tokens: int) -> None:
+        waiter = _Waiter(purpose, tokens, asyncio.get_running_loop())
+        with self._lock:
+            timeout = self._enqueue(waiter)
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(waiter.event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                with self._lock:
+                    if waiter.granted:
+                        return
+                    waiter.event.clear()
+                    timeout = self._grant(waiter)
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter.granted:
+                    self.in_flight -= 1
+                else:
+                    waiter.cancelled = True # Dropped when it reaches the head of the queue
+                    self.waiting -= 1
+                self._grant()
+            raise
+
+    def _enqueue(self, waiter: _Waiter) -> Optional[float]:
+        priority = self.priorities.get(waiter.purpose, self.priorities[None])
+        heapq.heappush(self._queue, (priority, next(self._arrivals), waiter))
+        self.waiting += 1
+        return self._grant(waiter)
+
+    def _release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+            self._grant()
+
+    def _grant(self, caller: Optional[_Waiter] = None) -> Optional[float]:
+        """
+        Grants slots to the queued calls in priority order (called with the lock held).
+        Only the head of the queue waits with a timeout (for the buckets to refill or the pause to end),
+        the other calls wait to be woken.
+
+        Returns:
+            Optional[float]: Seconds the caller waits before checking again, None to wait until it is woken.
+        """
+        now = time.monotonic()
+        while self._queue:
+            waiter = self._queue[0][2]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            if self.max_in_flight is not None and self.in_flight >= self.max_in_flight:
+                return None # Woken by the release of a slot
+
+            wait = max(
+                self._paused_until - now,
+                self._requests.wait_time(1, now) if self._requests else 0.0,
+                self._tokens.wait_time(waiter.tokens, now) if self._tokens else 0.0,
+            )
+            if wait > 0:
+                if waiter is caller:
+                    return wait
+                waiter.wake() # The head checks again and waits with the timeout
+                return None
+
+            heapq.heappop(self._queue)
+            if self._requests:
+                self._requests.take(1)
+            if self._tokens:
+                self._tokens.take(waiter.tokens)
+            self.waiting -= 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.granted[waiter.purpose] += 1
+            self.wait_time[waiter.purpose] += now - waiter.enqueued
+            waiter.granted = True
+            waiter.wake()
+        return None
+
+    def _backoff(self, error: Exception, attempt: int) -> Optional[float]:
+        """
+        Pauses every call after a 429 answer.
+
+        Returns:
+            Optional[float]: Seconds of the pause, None if the error is not a 429 answer or no retry is left.
+        """
+        response = getattr(error, "response", None) # requests.HTTPError, httpx.HTTPStatusError and openai.APIStatusError
+        if getattr(response, "status_code", None) != 429 or attempt >= self.max_retries:
+            return None
+        delay = self._retry_after(getattr(response, "headers", None) or {})
+        if delay is None:
+            delay = self.retry_after * 2 ** attempt
+        delay = min(max(delay, 0.0), self.max_retry_after)
+
+        with self._lock:
+            self.rate_limited += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            for bucket in (self._requests, self._tokens):
+                if bucket:
+                    bucket.drain()
+        return delay
+
+    @staticmethod
+    def _retry_after(headers) -> Optional[float]:
+        """
+        Reads the pause asked by the server, Retry-After in seconds or as an HTTP date (or retry-after-ms, sent by OpenAI).
+        """
+        headers = {name.lower(): value for name, value in headers.items()}
+        try:
+            if headers.get("retry-after-ms"):
+                return float(headers["retry-after-ms"]) / 1000
+            value = headers.get("retry-after")
+            if not value:
+                return None
+            try:
+                return float(value)
+            except ValueError:
+                return email.utils.parsedate_to_datetime(value).timestamp() - time.time()
+        except (TypeError, ValueError):
+            return None
@@ -0,0 +1,512 @@
+# app/server/session_server.py
+
+import argparse
+import asyncio
+import json
+import time
+import traceback
+import uuid
+from collections import deque
+from typing import Deque, Dict, Optional
+
+from app.agent.async_customer_support_agent import AsyncCustomerSupportAgent
+
+# Protocol: one JSON object per line, over a plain TCP connection.
+#   client -> server  {"type": "start", "mode": "natural", "lang": "en"}    new session (or "session_id" to resume one)
+#                     {"type": "message", "text": "..."}                    a user turn
+#   server -> client  {"type": "session", "session_id": "..."}              the session is open
+#                     {"type": "message", "text": "..."}                    a message of the agent
+#                     {"type": "input", "prefix": "> "}                     the agent waits for the user
+#                     {"type": "end", "reason": "completed|idle|error|shutdown"}  the session is over
+#                     {"type": "error", "error": "..."}                     the last line was refused, or the session failed (before its end)
+
+
+class SessionError(Exception):
+    """
+    Raised when a connection can not open or resume a session (the error is sent to the client).
+    """
+
+
+class SessionIdle(Exception):
+    """
+    Raised in the agent of a session when the user does not answer before the idle timeout.
+    """
+
+
+class NetworkUserIO:
+    """
+    Async input/output of a session, compatible with the UserIO of the async agent.
+
+    The user turns arrive from the connection of the session and `read` waits for the next one
+    (at most `idle_timeout` seconds). The messages of the agent are sent to the connection, or kept
+    until the client reconnects if it is not connected.
+    """
+    def __init__(self, idle_timeout: float, turn_latencies: Optional[Deque[float]] = None) -> None:
+        """
+        Args:
+            idle_timeout (float): Seconds the agent waits for a user turn before ending the session.
+            turn_latencies (Optional[Deque[float]]): Where the seconds between each user turn and the next agent message are added.
+        """
+        self.idle_timeout = idle_timeout
+        self.turn_latencies = turn_latencies if turn_latencies is not None else deque(maxlen=1000)
+        self.writer: Optional[asyncio.StreamWriter] = None
+        self._inbox = asyncio.Queue()
+        self._pending = [] # Lines written while the client is not connected
+        self._prefix = None # Prefix of the input the agent is waiting for
+        self._read_at = None
+
+    @property
+    def connected(self) -> bool:
+        return self.writer is not None
+
+    async def attach(self, writer: asyncio.StreamWriter) -> None:
+        """
+        Binds the session to a connection and sends the messages written while it was not connected
+        (and the input request again if the agent is waiting for the user, the previous connection may have lost it).
+        """
+        self.writer = writer
+        pending, self._pending = self._pending, []
+        for line in pending:
+            await self._send_line(line)
+        if self._prefix is not None and not pending:
+            await self.send({"type": "input", "prefix": self._prefix})
+
+    def detach(self, writer: asyncio.StreamWriter) -> None:
+        if self.writer is writer:
+            self.writer = None
+
+    def feed(self, text: str) -> None:
+        """
+        Queues a user turn received from the connection.
+        """
+        self._inbox.put_nowait(text)
+
+    async def read(self, prefix: str, audio: bool = False) -> str:
+        """
+        Waits for the next user turn.
+
+        Raises:
+            SessionIdle: If no turn arrives before the idle timeout.
+        """
+        self._prefix = prefix
+        await self.send({"type": "input", "prefix": prefix})
+        try:
+            text = await asyncio.wait_for(self._inbox.get(), self.idle_timeout)
+        except asyncio.TimeoutError:
+            raise SessionIdle(f"No user message in {self.idle_timeout}s") from None
+        finally:
+            self._prefix = None
+        self._read_at = time.perf_counter()
+        return text
+
+    async def write(self, msg: str, audio: bool = False) -> None:
+        """
+        Sends a message of the agent (audio is not supported over the network, the text is sent).
+        """
+        if self._read_at is not None:
+            self.turn_latencies.append(time.perf_counter() - self._read_at)
+            self._read_at = None
+        await self.send({"type": "message", "text": msg})
+
+    async def send(self, event: dict) -> None:
+        await self._send_line(json.dumps(event, ensure_ascii=False) + "\n")
+
+    async def close(self, reason: str) -> None:
+        """
+        Sends the end of the session and closes its connection.
+        """
+        await self.send({"type": "end", "reason": reason})
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    async def _send_line(self, line: str) -> None:
+        if self.writer is None:
+            self._pending.append(line)
+            return
+        try:
+            self.writer.write(line.encode("utf-8"))
+            await self.writer.drain()
+        except ConnectionError:
+            self.writer = None # The client left, the session keeps running until the idle timeout
+
+
+class Session:
+    """
+    The agent of a session and its input/output.
+    """
+    def __init__(self, session_id: str, agent: AsyncCustomerSupportAgent, io: NetworkUserIO) -> None:
+        self.session_id = session_id
+        self.agent = agent
+        self.io = io
+        self.task: Optional[asyncio.Task] = None
+
+
+class SessionServer:
+    """
+    Hosts many concurrent AsyncCustomerSupportAgent sessions on one event loop.
+
+    Clients connect over TCP and exchange JSON lines (see the protocol above). Each session has its
+    own agent state, identified by a session id, and every session shares the same model, so the
+    connection pool (and the RateGovernor, if the model has one) of the model client is shared too.
+    A client that loses its connection can resume its session with the session id until the idle timeout.
+    With a checkpoint store shared by several server processes, a session can also be resumed on another
+    process (e.g. after a restart, or behind a load balancer), from the state of its last turn.
+
+    Attributes:
+        sessions (Dict[str, Session]): Open sessions by session id.
+        max_sessions (int): Maximum number of open sessions, new ones are refused above it.
+        idle_timeout (float): Seconds a session waits for a user turn before it is closed.
+    """
+    modes = ("natural", "rigid")
+    langs = ("en", "es")
+
+    def __init__(self, model, host: str = "127.0.0.1", port: int = 8765, max_sessions: int = 200,
+                 idle_timeout: float = 300.0, max_message_chars: int = 2000, company: str = "ExampleCorp",
+                 agent_options: Optional[dict] = None, checkpoint_store=None, verbose: bool = False) -> None:
+        """
+        Args:
+            model: Model shared by every session (needs `achat`).
+            host (str): Interface to listen on, localhost by default.
+            port (int): TCP port, 0 to pick a free one.
+            max_sessions (int): Maximum number of open sessions.
+            idle_timeout (float): Seconds a session waits for a user turn before it is closed.
+            max_message_chars (int): User turns are cut to this length.
+            company (str): Company name used in the prompts.
+            agent_options (Optional[dict]): Other arguments of the agents, e.g. {"speculative_reply": True}.
+            checkpoint_store: Store where the sessions are written after each turn (FileCheckpointStore or SQLiteCheckpointStore), None to disable.
+            verbose (bool): If True, the traceback of the failed sessions is written to stderr (the client always gets the error).
+        """
+        self.model = model
+        self.host = host
+        self.port = port
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_message_chars = max_message_chars
+        self.company = company
+        self.agent_options = agent_options or {}
+        self.checkpoint_store = checkpoint_store
+        self.verbose = verbose
+
+        self.sessions: Dict[str, Session] = {}
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {} # Handler task -> its connection
+        self.turn_latencies: Deque[float] = deque(maxlen=10000)
+        self.started = 0
+        self.completed = 0
+        self.idle = 0
+        self.errors = 0
+        self.rejected = 0
+
+    async def start(self) -> "SessionServer":
+        """
+        Starts listening (the port is updated if it was 0).
+        """
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port, limit=4 * self.max_message_chars + 1024)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def serve_forever(self) -> None:
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self) -> None:
+        """
+        Stops listening, ends the open sessions and closes the connections and the async client of the model.
+        """
+        if self._server is not None:
+            self._server.close()
+        tasks = [session.task for session in self.sessions.values() if session.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for writer in self._connections.values():
+            writer.close()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+        if self._server is not None:
+            await self._server.wait_closed()
+        aclose = getattr(self.model, "aclose", None)
+        if aclose is not None:
+            await aclose() # Its connections are bound to this event loop
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """
+        Returns the open sessions, the session counters and the p50/p95/p99 turn latency (seconds
+        between a user turn and the next message of the agent).
+        """
+        latencies = sorted(self.turn_latencies)
+        return {
+            "active": len(self.sessions),
+            "started": self.started,
+            "completed": self.completed,
+            "idle": self.idle,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "turns": len(latencies),
+            "p50": latencies[int(0.50 * (len(latencies) - 1))] if latencies else None,
+            "p95": latencies[int(0.95 * (len(latencies) - 1))] if latencies else None,
+            "p99": latencies[int(0.99 * (len(latencies) - 1))] if latencies else None,
+        }
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        session = None
+        self._connections[asyncio.current_task()] = writer
+        try:
+            hello = await asyncio.wait_for(self._read_event(reader, writer), self.idle_timeout)
+            if hello is None:
+                return
+            session = self._open_session(hello)
+            await self._send(writer, {"type": "session", "session_id": session.session_id})
+            await session.io.attach(writer)
+
+            while True:
+                event = await self._read_event(reader, writer)
+                if event is None:
+                    return # The client closed the connection, or the session ended
+                if event.get("type") != "message" or not isinstance(event.get("text"), str):
+                    await self._send(writer, {"type": "error", "error": "Expected {\"type\": \"message\", \"text\": ...}"})
+                    continue
+                session.io.feed(event["text"][:self.max_message_chars])
+        except SessionError as e:
+            await self._send(writer, {"type": "error", "error": str(e)})
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        finally:
+            if session is not None:
+                session.io.detach(writer)
+            writer.close()
+            del self._connections[asyncio.current_task()]
+
+    async def _read_event(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[dict]:
+        """
+        Reads the next JSON line, None at the end of the connection. Invalid lines are answered with an error.
+        """
+        while True:
+            try:
+                line = await reader.readline()
+            except ValueError: # Line longer than the limit of the reader
+                await self._send(writer, {"type": "error", "error": "Line too long"})
+                return None
+            if not line:
+                return None
+            try:
+                event = json.loads(line)
+            except ValueError:
+                await self._send(writer, {"type": "error", "error": "Invalid JSON"})
+                continue
+            if isinstance(event, dict):
+                return event
+            await self._send(writer, {"type": "error", "error": "Expected a JSON object"})
+
+    def _open_session(self, hello: dict) -> Session:
+        """
+        Opens a new session, or returns the one to resume.
+
+        Raises:
+            SessionError: If the first line is not a start, the session to resume is not open or
+            already connected, the options are not supported or the server is full.
+        """
+        if hello.get("type") != "start":
+            raise SessionError("The first line must be {\"type\": \"start\", ...}")
+
+        session_id = hello.get("session_id")
+        if session_id is not None:
+            session = self.sessions.get(session_id)
+            if session is None:
+                return self._resume_checkpoint(str(session_id))
+            if session.io.connected:
+                raise SessionError(f"Session {session_id} is already connected")
+            return session
+
+        mode = hello.get("mode", "natural")
+        lang = hello.get("lang", "en")
+        if mode not in self.modes or lang not in self.langs:
+            raise SessionError(f"Supported modes {self.modes} and langs {self.langs}")
+        self._check_capacity()
+
+        session_id = uuid.uuid4().hex
+        io = NetworkUserIO(self.idle_timeout, self.turn_latencies)
+        agent = AsyncCustomerSupportAgent(self.model, mode=mode, company=self.company, audio_mode=False, lang=lang, userIO=io,
+                                          checkpoint_store=self.checkpoint_store, session_id=session_id, **self.agent_options)
+        return self._start_session(Session(session_id, agent, io))
+
+    def _resume_checkpoint(self, session_id: str) -> Session:
+        """
+        Rebuilds a session that is not open in this process from its checkpoint.
+        """
+        try:
+            found = self.checkpoint_store is not None and self.checkpoint_store.exists(session_id)
+        except ValueError: # Not a valid session id
+            found = False
+        if not found:
+            raise SessionError(f"Unknown session {session_id}")
+        self._check_capacity()
+
+        io = NetworkUserIO(self.idle_timeout, self.turn_latencies)
+        agent = AsyncCustomerSupportAgent.from_checkpoint(self.model, self.checkpoint_store, session_id, userIO=io, **self.agent_options)
+        agent.audio_mode = False
+        return self._start_session(Session(session_id, agent, io))
+
+    def _check_capacity(self) -> None:
+        if len(self.sessions) >= self.max_sessions:
+            self.rejected += 1
+            raise SessionError("Server busy, try again later")
+
+    def _start_session(self, session: Session) -> Session:
+        self.sessions[session.session_id] = session
+        self.started += 1
+        session.task = asyncio.create_task(self._run_session(session))
+        return session
+
+    async def _run_session(self, session: Session) -> None:
+        reason = "error"
+        try:
+            await session.agent.start()
+            reason = "completed"
+            self.completed += 1
+        except SessionIdle:
+            reason = "idle"
+            self.idle += 1
+        except asyncio.CancelledError:
+            reason = "shutdown"
+            raise
+        except Exception as e:
+            self.errors += 1
+            if self.verbose:
+                traceback.print_exc()
+            await session.io.send({"type": "error", "error": f"Session failed: {type(e).__name__}: {e}"})
+        finally:
+            del self.sessions[session.session_id]
+            await session.io.close(reason)
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, event: dict) -> None:
+        try:
+            writer.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+class SessionClient:
+    """
+    Minimal client of the SessionServer (benchmarks, tests and manual use).
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, session_id: str) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.session_id = session_id
+
+    @classmethod
+    async def connect(cls, host: str, port: int, session_id: Optional[str] = None, **options) -> "SessionClient":
+        """
+        Opens a new session (or resumes `session_id`), options are the start fields e.g. mode="natural", lang="en".
+
+        Raises:
+            SessionError: If the server refuses the session.
+        """
+        reader, writer = await asyncio.open_connection(host, port)
+        start = {"type": "start", **options}
+        if session_id:
+            start["session_id"] = session_id
+        writer.write((json.dumps(start) + "\n").encode("utf-8"))
+        await writer.drain()
+
+        client = cls(reader, writer, session_id)
+        event = await client.receive()
+        if event is None or event.get("type") != "session":
+            writer.close()
+            raise SessionError(event.get("error") if event else "Connection closed")
+        client.session_id = event["session_id"]
+        return client
+
+    async def receive(self) -> Optional[dict]:
+        """
+        Returns the next event of the server, None when the connection is closed.
+        """
+        line = await self.reader.readline()
+        return json.loads(line) if line else None
+
+    async def send(self, text: str) -> None:
+        """
+        Sends a user turn.
+        """
+        self.writer.write((json.dumps({"type": "message", "text": text}, ensure_ascii=False) + "\n").encode("utf-8"))
+        await self.writer.drain()
+
+    async def close(self) -> None:
+        self.writer.close()
+        try:
+            await self.writer.wait_closed()
+        except ConnectionError:
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-session customer support server (JSON lines over TCP).")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--backend", default="openai", choices=["openai", "ollama"])
+    parser.add_argument("--base-url", default=None, help="Ollama API (or OpenAI compatible API) to use")
+    parser.add_argument("--pool-size", type=int, default=64, help="Connections of the shared Ollama client")
+    parser.add_argument("--max-sessions", type=int, default=200)
+    parser.add_argument("--idle-timeout", type=float, default=300.0)
+    parser.add_argument("--max-in-flight", type=int, default=None, help="Cap of concurrent model requests (RateGovernor)")
+    parser.add_argument("--requests-per-minute", type=float, default=None)
+    parser.add_argument("--tokens-per-minute", type=float, default=None)
+    parser.add_argument("--company", default="ExampleCorp")
+    parser.add_argument("--checkpoints", default=None, help="Directory (or .sqlite3 file) shared by the servers to resume sessions")
+    parser.add_argument("--post-call", default=None, help="Queue directory, the summaries and the storage run in background workers")
+    parser.add_argument("--post-call-workers", type=int, default=2)
+    parser.add_argument("--verbose", action="store_true", help="Write the traceback of the failed sessions to stderr")
+    args = parser.parse_args()
+
+    checkpoint_store = None
+    if args.checkpoints:
+        from app.utils.checkpoint_store import FileCheckpointStore, SQLiteCheckpointStore
+        checkpoint_store = SQLiteCheckpointStore(args.checkpoints) if args.checkpoints.endswith(".sqlite3") else FileCheckpointStore(args.checkpoints)
+
+    governor = None
+    if args.max_in_flight or args.requests_per_minute or args.tokens_per_minute:
+        from app.llm_modules.rate_governor import RateGovernor
+        governor = RateGovernor(args.requests_per_minute, args.tokens_per_minute, args.max_in_flight)
+
+    if args.backend == "ollama":
+        from app.llm_modules.http_transport import HTTPTransport
+        from app.llm_modules.ollama_mistral7b import OllamaMistral7B_Model
+        model = OllamaMistral7B_Model(base_url=args.base_url, transport=HTTPTransport(pool_size=args.pool_size), governor=governor)
+    else:
+        from openai import AsyncOpenAI, OpenAI
+        from app.llm_modules.open_ai import OpenAI_Model
+        model = OpenAI_Model(client=OpenAI(base_url=args.base_url), async_client=AsyncOpenAI(base_url=args.base_url), governor=governor)
+
+    agent_options = {}
+    post_call_worker = None
+    if args.post_call:
+        from app.agent.post_call_worker import PostCallWorker
+        from app.utils.post_call_queue import PostCallQueue
+        agent_options["post_call_queue"] = PostCallQueue(args.post_call)
+        post_call_worker = PostCallWorker(model, agent_options["post_call_queue"], workers=args.post_call_workers).start()
+
+    server = SessionServer(model, args.host, args.port, max_sessions=args.max_sessions, idle_timeout=args.idle_timeout, company=args.company,
+                           agent_options=agent_options, checkpoint_store=checkpoint_store, verbose=args.verbose)
+    print(f"Serving sessions on {args.host}:{args.port} (JSON lines, start with {{\"type\": \"start\"}})")
+    async def serve():
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if post_call_worker:
+            post_call_worker.stop() # The jobs not done yet stay in the queue for the next start
+
+
+if __name__ == "__main__":
+    main()
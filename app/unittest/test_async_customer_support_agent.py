@@ -0,0 +1,155 @@
+# app/unittest/test_async_customer_support_agent.py
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+import time
+from pathlib import Path
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.agent.async_customer_support_agent import AsyncCustomerSupportAgent
+from app.utils.storage import save_conversation, load_conversations
+
+
+class FakeAsyncModel:
+    """Answers every prompt after a fixed delay, without blocking the event loop."""
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.calls = 0
+
+    async def achat(self, messages, temperature=0.3):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        instruction = messages[-1]["content"]
+        user_text = " ".join(m["content"] for m in messages if m["role"] == "user")
+        order = user_text.split()[0]
+        if "valid '" in instruction:
+            key = instruction.split("valid '")[1].split("'")[0]
+            return {"order_number": order, "category": "shipping", "description": "the package never arrived", "urgency": "high"}[key]
+        if "frustration" in instruction:
+            return "4"
+        if messages[0]["role"] == "system" and "Supervisor" in messages[0]["content"]:
+            return "Yes"
+        return "Thanks, anything else?"
+
+
+class ScriptedIO:
+    """Async input/output answering with a fixed user message."""
+    def __init__(self, user_message):
+        self.user_message = user_message
+        self.written = []
+
+    async def read(self, prefix, audio=False):
+        return self.user_message
+
+    async def write(self, msg, audio=False):
+        self.written.append(msg)
+
+
+class TurnByTurnModel:
+    """Extracts only the values present in the user messages, the other prompts get a fixed answer."""
+    def __init__(self, delay=0.05):
+        self.delay = delay
+        self.replies = 0
+
+    async def achat(self, messages, temperature=0.3):
+        await asyncio.sleep(self.delay)
+        instruction = messages[-1]["content"]
+        user_text = " ".join(m["content"] for m in messages if m["role"] == "user")
+        if "valid '" in instruction:
+            key = instruction.split("valid '")[1].split("'")[0]
+            values = {"order_number": "ORD5", "category": "shipping", "description": "package lost", "urgency": "high"}
+            return values[key] if values[key] in user_text else "NONE"
+        if "frustration" in instruction:
+            return "2"
+        if messages[0]["role"] == "system" and "Supervisor" in messages[0]["content"]:
+            return "Yes"
+        self.replies += 1
+        return "Could you tell me more?"
+
+
+class TurnsIO(ScriptedIO):
+    """Async input/output answering with a list of user messages."""
+    def __init__(self, user_messages):
+        super().__init__(None)
+        self.user_messages = list(user_messages)
+
+    async def read(self, prefix, audio=False):
+        return self.user_messages.pop(0)
+
+
+class TestAsyncCustomerSupportAgent(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_data_dir = save_conversation.__globals__["DATA_DIR"]
+        save_conversation.__globals__["DATA_DIR"] = Path(self.test_dir)
+
+    def tearDown(self):
+        save_conversation.__globals__["DATA_DIR"] = self.original_data_dir
+        shutil.rmtree(self.test_dir)
+
+    def test_many_sessions_share_one_event_loop(self):
+        model = FakeAsyncModel(delay=0.05)
+        sessions = 200
+
+        async def run_all():
+            agents = [
+                AsyncCustomerSupportAgent(model, mode="natural", audio_mode=False,
+                                          userIO=ScriptedIO(f"ORD{i} my package never arrived, urgent"))
+                for i in range(sessions)
+            ]
+            await asyncio.gather(*(agent.start() for agent in agents))
+            return agents
+
+        start = time.time()
+        agents = asyncio.run(run_all())
+        elapsed = time.time() - start
+
+        # Each session makes 4 sequential steps (extraction, supervisor, summary/frustration), if the
+        # sessions ran one after the other this would take sessions * 0.15s
+        self.assertLess(elapsed, 5)
+        for i, agent in enumerate(agents):
+            self.assertEqual(agent.extracted["order_number"], f"ORD{i}")
+        self.assertEqual(len(load_conversations("ORD7")), 1)
+        self.assertEqual(load_conversations("ORD7")[0]["frustration_score"], 4)
+
+    def test_rigid_mode(self):
+        model = FakeAsyncModel(delay=0)
+        io = ScriptedIO("ORD42 my package never arrived, urgent")
+        agent = AsyncCustomerSupportAgent(model, mode="rigid", audio_mode=False, userIO=io)
+
+        asyncio.run(agent.start())
+        self.assertEqual(agent.extracted["order_number"], "ORD42")
+        self.assertEqual(model.calls, 6) # 4 fields + summary + frustration
+
+    def test_supervisor_modes(self):
+        self.assertEqual(AsyncCustomerSupportAgent(FakeAsyncModel(), audio_mode=False, userIO=ScriptedIO("")).supervisor.mode, "dialogue")
+        agent = AsyncCustomerSupportAgent(FakeAsyncModel(), audio_mode=False, supervisor_mode="verdict", userIO=ScriptedIO(""))
+        self.assertEqual(agent.supervisor.mode, "verdict")
+
+    def test_rigid_mode_fast_extraction(self):
+        model = FakeAsyncModel(delay=0)
+        io = ScriptedIO("ORD42 my package never arrived, urgent")
+        agent = AsyncCustomerSupportAgent(model, mode="rigid", audio_mode=False, fast_extraction=True, userIO=io)
+
+        asyncio.run(agent.start())
+        self.assertEqual(agent.extracted["order_number"], "ORD42")
+        self.assertEqual(model.calls, 5) # The order number is settled by the fast path
+
+    def test_speculative_reply(self):
+        model = TurnByTurnModel(delay=0.05)
+        io = TurnsIO(["ORD5", "a shipping problem, package lost", "high"])
+        agent = AsyncCustomerSupportAgent(model, mode="natural", audio_mode=False, speculative_reply=True, userIO=io)
+
+        asyncio.run(agent.start())
+        self.assertEqual(agent.extracted, {"order_number": "ORD5", "category": "shipping", "description": "package lost", "urgency": "high"})
+        # The notes of the first two turns do not change the reply prompt, the last turn ends the call
+        self.assertEqual((agent.speculative_hits, agent.speculative_misses), (2, 0))
+        self.assertEqual(io.written.count("🤖 Could you tell me more?"), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+# app/unittest/test_batched_model.py
+
+import unittest
+import asyncio
+import threading
+import time
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.llm_modules.batched_model import Batched_Model
+
+
+class EchoModel:
+    """Echoes the last message after a delay, tracking the calls running at the same time."""
+    def __init__(self, delay=0.05, error=None):
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def chat(self, messages, temperature=0.3):
+        with self.lock:
+            self.calls += 1
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        if self.error:
+            raise self.error
+        return messages[-1]["content"].upper()
+
+    def chat_stream(self, messages, temperature=0.3):
+        yield messages[-1]["content"]
+
+    def get_model(self):
+        return "echo"
+
+
+def prompt(text):
+    return [{"role": "user", "content": text}]
+
+
+class TestBatchedModel(unittest.TestCase):
+
+    def test_answers_go_back_to_each_caller(self):
+        model = EchoModel()
+        batched = Batched_Model(model, window=0.02, slots=2)
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda i: batched.chat(prompt(f"question {i}")), range(8)))
+        batched.close()
+
+        self.assertEqual(results, [f"QUESTION {i}" for i in range(8)])
+        self.assertLessEqual(model.max_running, 2)
+        stats = batched.stats()
+        self.assertEqual(stats["requests"], 8)
+        self.assertEqual(sum(size * count for size, count in stats["batch_sizes"].items()), 8)
+        self.assertEqual(stats["queue_depth"], 0)
+        self.assertGreater(stats["max_queue_depth"], 1)
+
+    def test_identical_calls_share_one_request(self):
+        model = EchoModel()
+        batched = Batched_Model(model, window=0.05)
+
+        with ThreadPoolExecutor(max_workers=6) as pool:
+            results = list(pool.map(lambda i: batched.chat(prompt("was this a valid 'urgency'?")), range(6)))
+        batched.close()
+
+        self.assertEqual(set(results), {"WAS THIS A VALID 'URGENCY'?"})
+        self.assertLess(model.calls, 6)
+        self.assertEqual(batched.stats()["coalesced"], 6 - model.calls)
+
+    def test_errors_reach_every_caller(self):
+        batched = Batched_Model(EchoModel(delay=0.0, error=ConnectionError("down")), window=0.0)
+        with self.assertRaises(ConnectionError):
+            batched.chat(prompt("hello"))
+        batched.close()
+
+    def test_achat(self):
+        model = EchoModel()
+        batched = Batched_Model(model, window=0.02, slots=4)
+
+        async def run():
+            return await asyncio.gather(*(batched.achat(prompt(f"q{i}")) for i in range(4)))
+
+        self.assertEqual(asyncio.run(run()), ["Q0", "Q1", "Q2", "Q3"])
+        batched.close()
+        self.assertEqual(batched.stats()["batch_sizes"], {4: 1})
+
+    def test_stream_and_forwarded_attributes(self):
+        batched = Batched_Model(EchoModel())
+        self.assertEqual("".join(batched.chat_stream(prompt("hi"))), "hi")
+        self.assertEqual(batched.get_model(), "echo")
+        self.assertEqual(batched.stats()["in_flight"], 0)
+
+    def test_stream_falls_back_to_chat(self):
+        class ChatOnlyModel:
+            def chat(self, messages, temperature=0.3):
+                return "HI"
+
+        batched = Batched_Model(ChatOnlyModel())
+        self.assertEqual(list(batched.chat_stream(prompt("hi"))), ["HI"])
+
+    def test_invalid_slots(self):
+        with self.assertRaises(ValueError):
+            Batched_Model(EchoModel(), slots=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,130 @@
+# app/unittest/test_bulk_rescorer.py
+
+import unittest
+import tempfile
+import threading
+import json
+import shutil
+from pathlib import Path
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.agent.bulk_rescorer import BulkRescorer
+from app.utils.storage import save_conversation, load_conversations, update_sessions
+from app.utils.prompt_loader import load_prompts
+
+
+class RescoreModel:
+    """Answers the summary and frustration prompts, fails for the conversations that mention `fail_on`."""
+    def __init__(self, fail_on=None):
+        self.fail_on = fail_on
+        self.calls = 0
+        self.instructions = []
+        self.lock = threading.Lock()
+
+    def chat(self, messages, temperature=0.3):
+        with self.lock:
+            self.calls += 1
+            self.instructions.append(messages[-1]["content"])
+        if self.fail_on and any(self.fail_on in m["content"] for m in messages):
+            raise ConnectionError("backend down")
+        if messages[-1]["content"] in (load_prompts("customer_support", "en")["customer_frustration"], load_prompts("customer_support", "es")["customer_frustration"]):
+            return "9"
+        return "New summary of " + messages[1]["content"]
+
+
+class TestBulkRescorer(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_data_dir = save_conversation.__globals__["DATA_DIR"]
+        save_conversation.__globals__["DATA_DIR"] = Path(self.test_dir)
+        self.checkpoint = os.path.join(self.test_dir, "checkpoint", "rescore.json")
+        for i in range(5):
+            self.save("ORD%d" % i, "issue %d" % i, "natural")
+        self.save("ORD0", "second call", "rigid", lang="es")
+
+    def tearDown(self):
+        save_conversation.__globals__["DATA_DIR"] = self.original_data_dir
+        shutil.rmtree(self.test_dir)
+
+    def save(self, order, text, mode, lang="en"):
+        conversation = [{"role": "developer", "content": "System"}, {"role": "user", "content": text}, {"role": "assistant", "content": "Ok"}]
+        save_conversation({"order_number": order}, conversation, "Old summary", mode, 2, lang)
+
+    def test_rescores_every_session(self):
+        model = RescoreModel()
+        stats = BulkRescorer(model, self.checkpoint, workers=3).run(report_every=None)
+
+        self.assertEqual((stats["orders"], stats["sessions"], stats["calls"], stats["failed"]), (5, 6, 12, 0))
+        self.assertGreater(stats["sessions_per_sec"], 0)
+        self.assertEqual(stats["calls_per_sec"], 2 * stats["sessions_per_sec"])
+        first, second = load_conversations("ORD0")
+        self.assertEqual((first["summary"], first["frustration_score"]), ("New summary of issue 0", 9))
+        self.assertEqual(second["summary"], "New summary of second call")
+        self.assertIn(load_prompts("customer_support", "es")["summary_instruction"], model.instructions) # Prompts of the session language
+
+    def test_only_one_field(self):
+        BulkRescorer(RescoreModel(), None, fields=["frustration"]).run(report_every=None)
+        session = load_conversations("ORD3")[0]
+        self.assertEqual((session["summary"], session["frustration_score"]), ("Old summary", 9))
+
+    def test_resumes_from_the_checkpoint(self):
+        BulkRescorer(RescoreModel(fail_on="issue 2"), self.checkpoint, workers=2).run(report_every=None)
+        with open(self.checkpoint) as f:
+            checkpoint = json.load(f)
+        self.assertEqual((checkpoint["last_order"], checkpoint["failed_orders"]), ("ORD4", ["ORD2"]))
+        self.assertEqual(load_conversations("ORD2")[0]["summary"], "Old summary")
+
+        # Only the failed order and the new ones are rescored by the next run
+        self.save("ORD5", "issue 5", "natural")
+        model = RescoreModel()
+        stats = BulkRescorer(model, self.checkpoint, workers=2).run(report_every=None)
+        self.assertEqual((stats["orders"], stats["sessions"], model.calls), (2, 2, 4))
+        self.assertEqual(load_conversations("ORD2")[0]["summary"], "New summary of issue 2")
+
+        # Other fields (or prompts) do not use the checkpoint
+        stats = BulkRescorer(RescoreModel(), self.checkpoint, fields=["summary"]).run(report_every=None)
+        self.assertEqual(stats["orders"], 6)
+
+    def test_update_keeps_sessions_saved_since_the_load(self):
+        loaded = load_conversations("ORD1")
+        self.save("ORD1", "new call", "natural")
+
+        def update(session):
+            if session["timestamp"] != loaded[0]["timestamp"]:
+                return False
+            session["summary"] = "Rescored"
+            return True
+
+        self.assertEqual(update_sessions("ORD1", update), 1)
+        self.assertEqual([s["summary"] for s in load_conversations("ORD1")], ["Rescored", "Old summary"])
+        self.assertEqual([name for name in os.listdir(self.test_dir) if name.endswith(".tmp")], []) # No temporary files left
+
+    def test_save_during_an_update_is_kept(self):
+        started, release = threading.Event(), threading.Event()
+
+        def update(session):
+            started.set()
+            release.wait(5) # The session is saved while the update holds the loaded sessions
+            session["summary"] = "Rescored"
+            return True
+
+        updater = threading.Thread(target=update_sessions, args=("ORD2", update))
+        updater.start()
+        self.assertTrue(started.wait(5))
+        saver = threading.Thread(target=self.save, args=("ORD2", "new call", "natural"))
+        saver.start()
+        saver.join(0.2)
+        self.assertTrue(saver.is_alive()) # Waits for the lock of the order file
+        release.set()
+        updater.join(5)
+        saver.join(5)
+
+        sessions = load_conversations("ORD2")
+        self.assertEqual([s["summary"] for s in sessions], ["Rescored", "Old summary"])
+        self.assertEqual(sessions[1]["conversation"][1]["content"], "new call")
+
+
+if __name__ == "__main__":
+    unittest.main()
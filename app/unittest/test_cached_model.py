@@ -0,0 +1,105 @@
+# app/unittest/test_cached_model.py
+
+import unittest
+from unittest.mock import Mock, patch
+import tempfile
+import shutil
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.llm_modules.cached_model import Cached_Model
+
+
+class TestCachedModel(unittest.TestCase):
+
+    def setUp(self):
+        self.inner = Mock()
+        self.inner.get_model.return_value = "test-model"
+        self.inner.chat.side_effect = lambda messages, temperature=0.3: f"reply {len(messages)} {temperature}"
+        self.messages = [{"role": "user", "content": "Say hello!"}]
+
+    def test_repeated_call_is_served_from_cache(self):
+        model = Cached_Model(self.inner)
+
+        first = model.chat(self.messages)
+        second = model.chat([dict(m) for m in self.messages])
+
+        self.assertEqual(first, second)
+        self.inner.chat.assert_called_once()
+        self.assertEqual(model.stats(), {"hits": 1, "disk_hits": 0, "misses": 1, "size": 1})
+
+    def test_key_depends_on_temperature_and_model(self):
+        model = Cached_Model(self.inner)
+        key = model.cache_key(self.messages, 0.3)
+
+        self.assertNotEqual(key, model.cache_key(self.messages, 0.7))
+        self.inner.get_model.return_value = "other-model"
+        self.assertNotEqual(key, model.cache_key(self.messages, 0.3))
+
+    def test_stream_falls_back_to_chat(self):
+        inner = Mock(spec=["chat", "get_model"])
+        inner.get_model.return_value = "test-model"
+        inner.chat.return_value = "Hello"
+        model = Cached_Model(inner)
+
+        self.assertEqual(list(model.chat_stream(self.messages)), ["Hello"])
+        self.assertEqual(list(model.chat_stream(self.messages)), ["Hello"])
+        inner.chat.assert_called_once()
+
+    def test_lru_eviction(self):
+        model = Cached_Model(self.inner, max_entries=2)
+        a = [{"role": "user", "content": "a"}]
+        b = [{"role": "user", "content": "b"}]
+        c = [{"role": "user", "content": "c"}]
+
+        model.chat(a)
+        model.chat(b)
+        model.chat(a) # a becomes the most recently used
+        model.chat(c) # evicts b
+
+        self.assertEqual(self.inner.chat.call_count, 3)
+        model.chat(a)
+        self.assertEqual(self.inner.chat.call_count, 3)
+        model.chat(b)
+        self.assertEqual(self.inner.chat.call_count, 4)
+
+    @patch("app.llm_modules.cached_model.time.time")
+    def test_ttl_expiration(self, mock_time):
+        mock_time.return_value = 1000.0
+        model = Cached_Model(self.inner, ttl=10)
+        model.chat(self.messages)
+
+        mock_time.return_value = 1005.0
+        model.chat(self.messages)
+        self.assertEqual(self.inner.chat.call_count, 1)
+
+        mock_time.return_value = 1011.0
+        model.chat(self.messages)
+        self.assertEqual(self.inner.chat.call_count, 2)
+
+    def test_disk_tier_survives_new_instance(self):
+        cache_dir = tempfile.mkdtemp()
+        try:
+            Cached_Model(self.inner, cache_dir=cache_dir).chat(self.messages)
+
+            model = Cached_Model(self.inner, cache_dir=cache_dir)
+            response = model.chat(self.messages)
+
+            self.assertEqual(response, "reply 1 0.3")
+            self.inner.chat.assert_called_once()
+            self.assertEqual(model.stats()["disk_hits"], 1)
+
+            model.clear()
+            self.assertEqual(os.listdir(cache_dir), [])
+        finally:
+            shutil.rmtree(cache_dir)
+
+    def test_other_methods_are_forwarded(self):
+        self.inner.transcribe_audio.return_value = "transcription"
+        model = Cached_Model(self.inner)
+        self.assertEqual(model.transcribe_audio("audio.wav"), "transcription")
+        self.assertEqual(model.get_model(), "test-model")
+
+
+if __name__ == "__main__":
+    unittest.main()
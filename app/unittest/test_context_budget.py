@@ -0,0 +1,120 @@
+# app/unittest/test_context_budget.py
+
+import unittest
+import asyncio
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.agent.context_budget import ContextBudget
+from app.utils.tokens import estimate_tokens
+
+
+PROMPTS = {
+    "compaction_instruction": "Update the summary.\nCurrent summary:\n{summary}\nNew messages:\n{messages}",
+    "compacted_history": "Earlier: {summary}",
+}
+
+
+class SummaryModel:
+    """Returns a short summary counting the compaction calls."""
+    def __init__(self):
+        self.prompts = []
+
+    def chat(self, messages, temperature=0.3):
+        self.prompts.append(messages[-1]["content"])
+        return f"summary {len(self.prompts)}"
+
+    async def achat(self, messages, temperature=0.3):
+        return self.chat(messages, temperature)
+
+
+def turns(n, size=200):
+    conversation = [{"role": "system", "content": "You are SupportBot."}]
+    for i in range(n):
+        conversation.append({"role": "user", "content": f"user {i} " + "x" * size})
+        conversation.append({"role": "assistant", "content": f"assistant {i} " + "y" * size})
+    return conversation
+
+
+class TestContextBudget(unittest.TestCase):
+
+    def test_small_conversation_is_unchanged(self):
+        model = SummaryModel()
+        budget = ContextBudget(model, PROMPTS, max_tokens=3000)
+        conversation = turns(2)
+
+        self.assertIs(budget.fit(conversation), conversation)
+        self.assertEqual(model.prompts, [])
+
+    def test_compacts_older_turns(self):
+        model = SummaryModel()
+        budget = ContextBudget(model, PROMPTS, max_tokens=400, keep_recent=4)
+        conversation = turns(10) + [{"role": "developer", "content": "notes: {}"}]
+
+        fitted = budget.fit(conversation)
+        self.assertLessEqual(estimate_tokens(fitted), 400)
+        self.assertEqual(fitted[0], conversation[0]) # System prompt
+        self.assertEqual(fitted[1], {"role": "developer", "content": "Earlier: summary 1", "summary": True})
+        self.assertEqual(fitted[2:], conversation[-4:]) # Recent turns and latest notes
+        self.assertIn("user 0", model.prompts[0])
+        self.assertEqual(len(conversation), 22) # Not modified
+
+    def test_summary_is_rolling(self):
+        model = SummaryModel()
+        budget = ContextBudget(model, PROMPTS, max_tokens=400, keep_recent=4)
+        conversation = turns(10)
+        budget.fit(conversation)
+
+        # One more turn still fits with the previous summary, no new compaction
+        conversation += turns(11)[-2:]
+        fitted = budget.fit(conversation)
+        self.assertEqual(len(model.prompts), 1)
+        self.assertIn({"role": "user", "content": conversation[-6]["content"]}, fitted)
+
+        # Once it does not fit, only the new messages are summarized, with the previous summary
+        conversation += turns(13)[-4:]
+        budget.fit(conversation)
+        self.assertEqual(len(model.prompts), 2)
+        self.assertIn("summary 1", model.prompts[1])
+        self.assertNotIn("user 0", model.prompts[1])
+
+    def test_history_is_compacted_once(self):
+        model = SummaryModel()
+        budget = ContextBudget(model, PROMPTS, max_tokens=400, keep_recent=4)
+        history = {"role": "developer", "content": "Previous sessions: " + "z" * 2000}
+        conversation = turns(3)
+
+        fitted = budget.fit(conversation[:1] + [history] + conversation[1:])
+        self.assertNotIn(history, fitted)
+        self.assertIn("Previous sessions", model.prompts[0])
+
+        # The compacted conversation with the history inserted again does not summarize it again
+        budget.fit(fitted[:1] + [history] + fitted[1:])
+        self.assertEqual(len(model.prompts), 1)
+
+    def test_restore(self):
+        budget = ContextBudget(SummaryModel(), PROMPTS, max_tokens=400, keep_recent=4)
+        conversation = turns(10)
+        budget.fit(conversation)
+
+        restored = ContextBudget(SummaryModel(), PROMPTS, max_tokens=400, keep_recent=4)
+        restored.restore(budget.summary, budget.summarized_messages(), budget.compactions)
+
+        # The restored budget does not summarize the same messages again
+        self.assertEqual(restored.fit(conversation), budget.fit(conversation))
+        self.assertEqual(len(restored.model.prompts), 0)
+
+    def test_disabled(self):
+        budget = ContextBudget(SummaryModel(), PROMPTS, max_tokens=None)
+        conversation = turns(50)
+        self.assertIs(budget.fit(conversation), conversation)
+
+    def test_afit(self):
+        model = SummaryModel()
+        budget = ContextBudget(model, PROMPTS, max_tokens=400, keep_recent=4)
+        fitted = asyncio.run(budget.afit(turns(10)))
+        self.assertEqual(fitted[1]["content"], "Earlier: summary 1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+# app/unittest/test_conversation_store.py
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.agent.conversation_store import ConversationStore
+
+
+def contents(messages):
+    return [m["content"] for m in messages]
+
+
+class TestConversationStore(unittest.TestCase):
+
+    def setUp(self):
+        self.store = ConversationStore()
+        self.store.append("system", "system")
+        self.store.append("assistant", "welcome")
+
+    def play_turn(self, n, correction=False):
+        self.store.new_turn()
+        self.store.append("user", f"user {n}")
+        self.store.append("developer", f"notes {n}")
+        if correction:
+            self.store.append("developer", f"correction {n}")
+        self.store.append("assistant", f"reply {n}")
+
+    def test_views(self):
+        self.play_turn(1, correction=True)
+        self.play_turn(2)
+
+        self.assertEqual(len(self.store.messages), 9)
+        self.assertEqual(contents(self.store.dialog), ["system", "welcome", "user 1", "reply 1", "user 2", "reply 2"])
+        self.assertEqual(contents(self.store.turn), ["system", "welcome", "user 1", "reply 1", "user 2", "notes 2", "reply 2"])
+        # The views hold the messages of the log, not copies
+        self.assertIs(self.store.turn[-1], self.store.messages[-1])
+        self.assertIs(self.store.dialog[2], self.store.messages[2])
+
+    def test_new_turn_keeps_the_views(self):
+        self.play_turn(1)
+        turn = self.store.turn
+        self.store.new_turn()
+        self.assertIs(self.store.turn, turn) # Updated in place, the list is not rebuilt
+        self.assertEqual(contents(turn), ["system", "welcome", "user 1", "reply 1"])
+
+    def test_pinned_context(self):
+        self.assertIs(self.store.reply(), self.store.turn)
+        self.play_turn(1)
+        self.store.pin("history")
+        self.play_turn(2, correction=True)
+        self.assertEqual(contents(self.store.reply()),
+                         ["system", "history", "welcome", "user 1", "reply 1", "user 2", "notes 2", "correction 2", "reply 2"])
+        self.store.new_turn()
+        self.assertEqual(contents(self.store.reply())[-2:], ["user 2", "reply 2"])
+
+        self.store.pin("new history")
+        self.assertEqual(self.store.reply()[1]["content"], "new history")
+        self.assertNotIn("history", contents(self.store.messages)) # The context is not part of the log
+
+    def test_rebuilt_from_a_log(self):
+        self.play_turn(1)
+        self.store.new_turn()
+        self.store.append("user", "user 2")
+        self.store.append("developer", "notes 2")
+
+        restored = ConversationStore(self.store.messages)
+        self.assertEqual(restored.turn, self.store.turn)
+        self.assertEqual(restored.dialog, self.store.dialog)
+        restored.new_turn()
+        self.assertEqual(contents(restored.turn)[-1], "user 2")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+# app/unittest/test_fake_llm_server.py
+
+import unittest
+import asyncio
+import tempfile
+import time
+import os
+import sys
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+os.chdir(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../"))) # The prompts are loaded from the project root
+
+import requests
+from openai import AsyncOpenAI, OpenAI
+from app.agent.customer_support_agent import CustomerSupportAgent
+from app.llm_modules.fake_llm_server import FakeLLMServer, LatencyProfile, RuleBasedResponder
+from app.llm_modules.http_transport import HTTPTransport
+from app.llm_modules.ollama_mistral7b import OllamaMistral7B_Model
+from app.llm_modules.open_ai import OpenAI_Model
+from app.utils.prompt_loader import load_prompts
+from app.utils.storage import save_conversation
+
+
+PROMPTS = load_prompts("customer_support", "en")
+
+
+def extraction_prompt(user_text, key):
+    return [
+        {"role": "system", "content": PROMPTS["system_prompt"]},
+        {"role": "user", "content": user_text},
+        {"role": "developer", "content": PROMPTS["validation_instruction"].format(key=key, invalid_response="NONE")},
+    ]
+
+
+class ScriptedIO:
+    """Answers the agent with the next scripted line."""
+    def __init__(self, lines):
+        self.lines = list(lines)
+        self.written = []
+
+    def read(self, prefix, audio=False):
+        return self.lines.pop(0) if self.lines else "That is all"
+
+    def write(self, msg, audio=False):
+        self.written.append(msg)
+
+    def write_stream(self, deltas, prefix="", audio=False):
+        text = "".join(deltas)
+        self.written.append(text)
+        return text
+
+
+class TestFakeLLMServer(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeLLMServer().start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_ollama_chat_and_stream(self):
+        model = OllamaMistral7B_Model(base_url=self.server.base_url)
+        self.assertEqual(model.chat(extraction_prompt("my order is ORD12345", "order_number")), "ORD12345")
+        self.assertEqual(model.chat(extraction_prompt("hello", "urgency")), "NONE")
+        self.assertEqual("".join(model.chat_stream(extraction_prompt("it is a billing problem", "category"))), "billing")
+
+    def test_agent_turns_share_the_prompt_prefix(self):
+        data_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(data_dir.cleanup)
+        self.addCleanup(save_conversation.__globals__.__setitem__, "DATA_DIR", save_conversation.__globals__["DATA_DIR"])
+        save_conversation.__globals__["DATA_DIR"] = Path(data_dir.name)
+        model = OllamaMistral7B_Model(base_url=self.server.base_url)
+        agent = CustomerSupportAgent(model, mode="natural", audio_mode=False)
+        agent.userIO = ScriptedIO(["Hi, I need help", "My order is ORD12345", "The package never arrived, it is a shipping problem", "It is urgent, high"])
+        agent.start()
+
+        self.assertEqual(agent.extracted["order_number"], "ORD12345")
+        # Only the first prompt of the agent and of each supervisor review (a new transcript) are not served from the cache
+        self.assertEqual(model.prefix_misses, 1 + agent.supervisor.stats()["reviews"])
+        self.assertGreaterEqual(model.prefix_hits, 10)
+        # The server only evaluates the tokens after the cached prefix
+        self.assertLess(model.get_prompt_stats()["eval_ratio"], 0.6)
+
+    def test_openai_chat_stream_and_async(self):
+        model = OpenAI_Model(client=OpenAI(base_url=self.server.openai_base_url, api_key="fake", max_retries=0),
+                             async_client=AsyncOpenAI(base_url=self.server.openai_base_url, api_key="fake", max_retries=0))
+        self.assertEqual(model.chat(extraction_prompt("urgent, high priority", "urgency")), "high")
+        self.assertEqual("".join(model.chat_stream(extraction_prompt("ORD42", "order_number"))), "ORD42")
+        self.assertEqual(asyncio.run(model.achat(extraction_prompt("a product issue", "category"))), "product")
+
+    def test_openai_audio(self):
+        model = OpenAI_Model(client=OpenAI(base_url=self.server.openai_base_url, api_key="fake", max_retries=0))
+        self.server.transcripts = ["my order is ORD12345"]
+        with tempfile.NamedTemporaryFile(suffix=".wav") as audio:
+            audio.write(b"RIFF")
+            audio.flush()
+            self.assertEqual(model.transcribe_audio(audio.name).strip(), "my order is ORD12345")
+        self.assertGreater(len(b"".join(model.text_to_speech("Hello there"))), 0)
+
+    def test_error_injection_and_retries(self):
+        model = OllamaMistral7B_Model(base_url=self.server.base_url, transport=HTTPTransport(max_retries=2, backoff_factor=0.0))
+        self.server.fail_next(2)
+        self.assertEqual(model.chat(extraction_prompt("ORD1", "order_number")), "ORD1")
+        self.assertEqual(self.server.stats()["errors"], {503: 2})
+
+        self.server.fail_next(1, status=429)
+        with self.assertRaises(requests.HTTPError):
+            model.chat(extraction_prompt("ORD1", "order_number")) # 429 is not retried by the transport
+
+    def test_latency(self):
+        self.server.latency = LatencyProfile(first_token=0.1, per_token=0.05)
+        model = OllamaMistral7B_Model(base_url=self.server.base_url)
+        responder = RuleBasedResponder(script={"Hi": "one two three"})
+        self.server.responder = responder
+
+        start = time.time()
+        self.assertEqual(model.chat([{"role": "user", "content": "Hi"}]), "one two three")
+        self.assertGreaterEqual(time.time() - start, 0.2)
+
+
+class TestLatencyProfile(unittest.TestCase):
+
+    def test_same_seed_same_delays(self):
+        first = LatencyProfile(0.2, jitter=0.5, distribution="lognormal", seed=7)
+        second = LatencyProfile(0.2, jitter=0.5, distribution="lognormal", seed=7)
+        self.assertEqual([first.sample_first_token() for _ in range(5)], [second.sample_first_token() for _ in range(5)])
+
+    def test_invalid_distribution(self):
+        with self.assertRaises(ValueError):
+            LatencyProfile(distribution="normal")
+
+
+if __name__ == "__main__":
+    unittest.main()
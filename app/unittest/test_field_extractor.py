@@ -0,0 +1,201 @@
+# app/unittest/test_field_extractor.py
+
+import unittest
+import asyncio
+import threading
+import time
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.agent.field_extractor import FieldExtractor
+
+
+PROMPTS = {
+    "validation_instruction": "Was the user's last response a valid '{key}'? If not, respond with '{invalid_response}'.",
+    "structured_extraction_instruction": "Extract the fields {keys} as a JSON object.",
+}
+
+
+class SlowModel:
+    """Answers after a delay, tracking how many calls are running at the same time."""
+    def __init__(self, answers, delay=0.1):
+        self.answers = answers
+        self.delay = delay
+        self.running = 0
+        self.max_running = 0
+        self.lock = threading.Lock()
+
+    def chat(self, messages, temperature=0.3):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        key = messages[-1]["content"].split("valid '")[1].split("'")[0]
+        return self.answers[key]
+
+
+class TestFieldExtractor(unittest.TestCase):
+
+    def setUp(self):
+        self.conversation = [{"role": "user", "content": "My order ORD12345 has not arrived"}]
+
+    def test_extract_runs_concurrently(self):
+        model = SlowModel({"order_number": "ORD12345", "category": "shipping", "description": "NONE", "urgency": "NONE"})
+        extractor = FieldExtractor(model, PROMPTS)
+
+        start = time.time()
+        result = extractor.extract(self.conversation, ["order_number", "category", "description", "urgency"])
+        elapsed = time.time() - start
+
+        self.assertEqual(model.max_running, 4)
+        self.assertLess(elapsed, 0.3)
+        self.assertEqual(result, {"order_number": "ORD12345", "category": "shipping", "description": None, "urgency": None})
+
+    def test_extract_keeps_key_order(self):
+        model = SlowModel({"urgency": "high", "order_number": "ORD1"}, delay=0.0)
+        extractor = FieldExtractor(model, PROMPTS)
+
+        result = extractor.extract(self.conversation, ["urgency", "order_number"])
+        self.assertEqual(list(result.keys()), ["urgency", "order_number"])
+
+    def test_threads_are_reused_between_turns(self):
+        model = SlowModel({"order_number": "ORD1", "category": "shipping"}, delay=0.0)
+        extractor = FieldExtractor(model, PROMPTS)
+
+        threads = set()
+        for _ in range(3):
+            extractor.extract(self.conversation, ["order_number", "category"])
+            threads |= set(extractor._executor._threads)
+        self.assertLessEqual(len(threads), 2)
+
+    def test_invalid_response_is_case_insensitive(self):
+        model = SlowModel({"order_number": "invalid"}, delay=0.0)
+        extractor = FieldExtractor(model, PROMPTS)
+
+        result = extractor.extract(self.conversation, ["order_number"], invalid_response="INVALID")
+        self.assertEqual(result, {"order_number": None})
+
+    def test_no_keys(self):
+        model = SlowModel({}, delay=0.0)
+        extractor = FieldExtractor(model, PROMPTS)
+        self.assertEqual(extractor.extract(self.conversation, []), {})
+
+
+class ScriptedModel:
+    """Returns a fixed answer for the structured prompt and per-key answers otherwise."""
+    def __init__(self, structured_answer, answers=None):
+        self.structured_answer = structured_answer
+        self.answers = answers or {}
+        self.prompts = []
+
+    def chat(self, messages, temperature=0.3):
+        content = messages[-1]["content"]
+        self.prompts.append(content)
+        if content.startswith("Extract the fields"):
+            return self.structured_answer
+        key = content.split("valid '")[1].split("'")[0]
+        return self.answers.get(key, "NONE")
+
+
+class TestStructuredExtraction(unittest.TestCase):
+
+    def setUp(self):
+        self.conversation = [{"role": "user", "content": "ORD12345, the package never arrived, it is urgent"}]
+        self.keys = ["order_number", "category", "description", "urgency"]
+
+    def test_single_call_when_all_values_valid(self):
+        model = ScriptedModel('{"order_number": "ord12345", "category": "Shipping", "description": "the package never arrived", "urgency": "high"}')
+        extractor = FieldExtractor(model, PROMPTS, mode="structured")
+
+        result = extractor.extract(self.conversation, self.keys)
+        self.assertEqual(len(model.prompts), 1)
+        self.assertEqual(result, {
+            "order_number": "ORD12345",
+            "category": "shipping",
+            "description": "the package never arrived",
+            "urgency": "high",
+        })
+
+    def test_null_values_are_not_retried(self):
+        model = ScriptedModel('```json\n{"order_number": "ORD12345", "category": null, "description": null, "urgency": null}\n```')
+        extractor = FieldExtractor(model, PROMPTS, mode="structured")
+
+        result = extractor.extract(self.conversation, self.keys)
+        self.assertEqual(len(model.prompts), 1)
+        self.assertEqual(result["order_number"], "ORD12345")
+        self.assertIsNone(result["category"])
+
+    def test_invalid_values_fall_back_per_field(self):
+        model = ScriptedModel('{"order_number": "12345", "category": "shipping", "description": null, "urgency": "very"}',
+                              answers={"order_number": "ORD12345", "urgency": "high"})
+        extractor = FieldExtractor(model, PROMPTS, mode="structured")
+
+        result = extractor.extract(self.conversation, self.keys)
+        self.assertEqual(len(model.prompts), 3) # structured + order_number + urgency
+        self.assertEqual(result, {"order_number": "ORD12345", "category": "shipping", "description": None, "urgency": "high"})
+        self.assertEqual(list(result.keys()), self.keys)
+
+    def test_malformed_answer_falls_back_for_all_keys(self):
+        model = ScriptedModel("Sorry, I can not do that", answers={"order_number": "ORD12345"})
+        extractor = FieldExtractor(model, PROMPTS, mode="structured")
+
+        result = extractor.extract(self.conversation, self.keys)
+        self.assertEqual(len(model.prompts), 5)
+        self.assertEqual(result["order_number"], "ORD12345")
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            FieldExtractor(ScriptedModel(""), PROMPTS, mode="unknown")
+
+
+class AsyncScriptedModel(ScriptedModel):
+    async def achat(self, messages, temperature=0.3):
+        return self.chat(messages, temperature)
+
+
+class TestFastPath(unittest.TestCase):
+
+    def setUp(self):
+        self.conversation = [
+            {"role": "user", "content": "Hi, my order ORD1 never arrived"},
+            {"role": "assistant", "content": "What is the problem?"},
+            {"role": "user", "content": "It is a billing problem, order ORD12345"},
+            {"role": "developer", "content": "Notes"},
+        ]
+        self.keys = ["order_number", "category", "description", "urgency"]
+
+    def test_settled_keys_skip_the_model(self):
+        model = ScriptedModel("", answers={"category": "billing", "description": "charged twice"})
+        extractor = FieldExtractor(model, PROMPTS, fast_path=True)
+
+        result = extractor.extract(self.conversation, self.keys)
+        self.assertEqual(result, {"order_number": "ORD12345", "category": "billing", "description": "charged twice", "urgency": None})
+        self.assertEqual(len(model.prompts), 3) # The category is in a sentence, only the order number is settled
+        self.assertEqual(extractor.stats(), {"rule_hits": 1, "model_keys": 3})
+
+        self.conversation[-2] = {"role": "user", "content": "Billing"}
+        model = ScriptedModel("", answers={"description": "charged twice"})
+        result = FieldExtractor(model, PROMPTS, fast_path=True).extract(self.conversation, ["category", "description"])
+        self.assertEqual(result, {"category": "billing", "description": "charged twice"})
+        self.assertEqual(len(model.prompts), 1)
+
+    def test_structured_asks_only_the_remaining_keys(self):
+        model = AsyncScriptedModel('{"category": "billing", "description": "charged twice", "urgency": null}')
+        extractor = FieldExtractor(model, PROMPTS, mode="structured", fast_path=True)
+
+        result = asyncio.run(extractor.aextract(self.conversation, self.keys))
+        self.assertEqual(model.prompts, ["Extract the fields ['category', 'description', 'urgency'] as a JSON object."])
+        self.assertEqual(list(result.keys()), self.keys)
+        self.assertEqual(result["category"], "billing")
+
+    def test_disabled_by_default(self):
+        model = ScriptedModel("", answers={"order_number": "ORD12345"})
+        extractor = FieldExtractor(model, PROMPTS)
+        extractor.extract(self.conversation, self.keys)
+        self.assertEqual(len(model.prompts), 4)
+
+
+if __name__ == "__main__":
+    unittest.main()
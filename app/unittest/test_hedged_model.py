@@ -0,0 +1,136 @@
+# app/unittest/test_hedged_model.py
+
+import unittest
+import asyncio
+import threading
+import time
+from collections import deque
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.llm_modules.hedged_model import DeadlineExceeded, Hedged_Model
+from app.llm_modules.model_router import Routed_Model, for_purpose
+
+
+class ScriptedDelayModel:
+    """The n-th call answers f"answer {n}" after delays[n] seconds (the last delay repeats)."""
+    def __init__(self, delays, errors=None):
+        self.delays = delays
+        self.errors = errors or {}
+        self.calls = 0
+        self.cancelled = 0
+        self.lock = threading.Lock()
+
+    def _next(self):
+        with self.lock:
+            n = self.calls
+            self.calls += 1
+        return n, self.delays[min(n, len(self.delays) - 1)]
+
+    def chat(self, messages, temperature=0.3):
+        n, delay = self._next()
+        time.sleep(delay)
+        if n in self.errors:
+            raise self.errors[n]
+        return f"answer {n}"
+
+    async def achat(self, messages, temperature=0.3):
+        n, delay = self._next()
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        if n in self.errors:
+            raise self.errors[n]
+        return f"answer {n}"
+
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+class TestHedgedModel(unittest.TestCase):
+
+    def test_fast_call_is_not_hedged(self):
+        model = ScriptedDelayModel([0.0])
+        hedged = Hedged_Model(model, initial_hedge_delay=0.1)
+
+        self.assertEqual(hedged.chat(MESSAGES), "answer 0")
+        self.assertEqual(model.calls, 1)
+        self.assertEqual(hedged.stats()[None]["hedged"], 0)
+
+    def test_straggler_is_hedged(self):
+        model = ScriptedDelayModel([1.0, 0.0])
+        hedged = Hedged_Model(model, initial_hedge_delay=0.05)
+
+        start = time.time()
+        self.assertEqual(hedged.chat(MESSAGES, purpose="reply"), "answer 1")
+        self.assertLess(time.time() - start, 0.5)
+        stats = hedged.stats()["reply"]
+        self.assertEqual((stats["calls"], stats["hedged"], stats["hedge_wins"]), (1, 1, 1))
+
+    def test_hedge_delay_follows_the_percentile(self):
+        model = ScriptedDelayModel([0.0])
+        hedged = Hedged_Model(model, hedge_percentile=0.9, initial_hedge_delay=5.0, min_hedge_delay=0.0, min_samples=10)
+        self.assertEqual(hedged.hedge_delay("extraction"), 5.0)
+        for latency in [0.01 * i for i in range(1, 11)]:
+            hedged._latencies.setdefault("extraction", deque()).append(latency)
+        self.assertAlmostEqual(hedged.hedge_delay("extraction"), 0.09)
+        self.assertEqual(hedged.hedge_delay("reply"), 5.0) # Per purpose
+
+    def test_failed_call_sends_the_duplicate_right_away(self):
+        model = ScriptedDelayModel([0.0], errors={0: ConnectionError("reset")})
+        hedged = Hedged_Model(model, initial_hedge_delay=10.0)
+        self.assertEqual(hedged.chat(MESSAGES), "answer 1")
+
+    def test_error_when_every_request_fails(self):
+        model = ScriptedDelayModel([0.0], errors={0: ConnectionError("reset"), 1: ConnectionError("reset")})
+        hedged = Hedged_Model(model, initial_hedge_delay=10.0)
+        with self.assertRaises(ConnectionError):
+            hedged.chat(MESSAGES)
+
+    def test_deadline(self):
+        model = ScriptedDelayModel([1.0])
+        hedged = Hedged_Model(model, initial_hedge_delay=0.05, deadlines={"summary": 0.2})
+
+        start = time.time()
+        with self.assertRaises(DeadlineExceeded):
+            for_purpose(hedged, "summary").chat(MESSAGES)
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(hedged.stats()["summary"]["deadline_exceeded"], 1)
+
+    def test_deadline_uses_the_router_fallback(self):
+        fallback = ScriptedDelayModel([0.0])
+        router = Routed_Model({}, default=Hedged_Model(ScriptedDelayModel([1.0]), max_hedges=0, deadlines={"reply": 0.1}), fallback=fallback)
+        self.assertEqual(for_purpose(router, "reply").chat(MESSAGES), "answer 0")
+
+    def test_achat_cancels_the_slower_request(self):
+        model = ScriptedDelayModel([1.0, 0.0])
+        hedged = Hedged_Model(model, initial_hedge_delay=0.05)
+
+        self.assertEqual(asyncio.run(hedged.achat(MESSAGES, purpose="extraction")), "answer 1")
+        self.assertEqual(model.cancelled, 1)
+        self.assertEqual(hedged.stats()["extraction"]["hedge_wins"], 1)
+
+    def test_achat_deadline(self):
+        model = ScriptedDelayModel([1.0])
+        hedged = Hedged_Model(model, initial_hedge_delay=0.05, deadlines={"extraction": 0.2})
+        with self.assertRaises(DeadlineExceeded):
+            asyncio.run(hedged.achat(MESSAGES, purpose="extraction"))
+        self.assertEqual(model.cancelled, 2)
+
+    def test_stream_falls_back_to_chat(self):
+        hedged = Hedged_Model(ScriptedDelayModel([0.0]))
+        self.assertEqual(list(hedged.chat_stream(MESSAGES)), ["answer 0"])
+
+    def test_percentiles(self):
+        hedged = Hedged_Model(ScriptedDelayModel([0.0]))
+        for _ in range(5):
+            hedged.chat(MESSAGES, purpose="frustration")
+        stats = hedged.stats()["frustration"]
+        self.assertLessEqual(stats["p50"], stats["p95"])
+        self.assertLessEqual(stats["p95"], stats["p99"])
+
+
+if __name__ == "__main__":
+    unittest.main()
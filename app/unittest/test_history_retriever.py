@@ -0,0 +1,63 @@
+# app/unittest/test_history_retriever.py
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.utils.tokens import estimate_tokens
+from app.agent.history_retriever import HistoryRetriever
+
+
+def session(n, user, reply, summary):
+    return {
+        "timestamp": f"2025-01-{n:02d}",
+        "conversation": [
+            {"role": "system", "content": "System prompt"},
+            {"role": "user", "content": user},
+            {"role": "developer", "content": "Notes"},
+            {"role": "assistant", "content": reply},
+        ],
+        "summary": summary,
+    }
+
+
+SESSIONS = [
+    session(1, "I was charged twice for my order", "I will ask for a refund of the second charge", "Double charge, refund requested."),
+    session(2, "The lamp arrived with a broken bulb", "We will send you a new bulb", "Broken bulb, replacement sent."),
+    session(3, "The package is late, the tracking has not moved", "The carrier is checking the tracking", "Late package, carrier contacted."),
+]
+
+
+class TestHistoryRetriever(unittest.TestCase):
+
+    def test_relevant_session_first(self):
+        retriever = HistoryRetriever(SESSIONS, top_k=1, max_tokens=40)
+        selected = retriever.retrieve("The new bulb is broken too")
+        self.assertEqual(selected[0][0]["timestamp"], "2025-01-02")
+        self.assertIn({"role": "assistant", "content": "We will send you a new bulb"}, selected[0][1])
+        self.assertNotIn("Notes", [m["content"] for _, messages in selected for m in messages])
+
+    def test_summaries_fill_the_budget(self):
+        retriever = HistoryRetriever(SESSIONS, top_k=4, max_tokens=1000)
+        selected = retriever.retrieve("")
+        self.assertEqual([messages for _, messages in selected],
+                         [[{"role": "summary", "content": s["summary"]}] for s in SESSIONS])
+
+    def test_size_does_not_grow_with_the_sessions(self):
+        many = [session(n % 28 + 1, f"Question {n} about the invoice", f"Answer {n}", f"Call {n} about the invoice.") for n in range(200)]
+        retriever = HistoryRetriever(many, top_k=4, max_tokens=120)
+        selected = retriever.retrieve("Wrong invoice again")
+        self.assertLessEqual(sum(estimate_tokens(messages) for _, messages in selected), 120)
+        self.assertEqual(selected[-1][0], many[-1]) # The latest summaries come first in the fill
+
+    def test_scores(self):
+        retriever = HistoryRetriever(SESSIONS)
+        scores = retriever.scores("tracking")
+        self.assertEqual(int(scores.argmax()), 5) # Exchange of the third session, after its summary (snippet 4)
+        self.assertEqual(int((scores > 0).sum()), 1)
+        self.assertEqual(retriever.scores("unknown words").sum(), 0)
+        self.assertEqual(HistoryRetriever([]).retrieve("anything"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+# app/unittest/test_http_transport.py
+
+import unittest
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+import requests
+from app.llm_modules.http_transport import HTTPTransport
+from app.llm_modules.ollama_mistral7b import OllamaMistral7B_Model
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # keep-alive
+    failures_left = 0
+    client_ports = set()
+
+    def do_POST(self):
+        type(self).client_ports.add(self.client_address[1])
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if type(self).failures_left > 0:
+            type(self).failures_left -= 1
+            status, payload = 503, {"error": "busy"}
+        else:
+            status, payload = 200, {"response": f" echo {body['model']} "}
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestHTTPTransport(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_address[1]}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        _Handler.failures_left = 0
+        _Handler.client_ports = set()
+
+    def test_connections_are_reused(self):
+        transport = HTTPTransport()
+        model = OllamaMistral7B_Model(base_url=self.base_url, transport=transport)
+        for _ in range(5):
+            self.assertEqual(model.chat([{"role": "user", "content": "hi"}]), f"echo {model.get_model()}")
+
+        self.assertEqual(len(_Handler.client_ports), 1)
+        self.assertEqual(model.get_metrics()["count"], 5)
+        transport.close()
+
+    def test_retries_on_5xx(self):
+        _Handler.failures_left = 2
+        transport = HTTPTransport(backoff_factor=0)
+        response = transport.post(f"{self.base_url}/api/generate", json={"model": "m"})
+        self.assertEqual(response.json()["response"], " echo m ")
+        transport.close()
+
+    def test_gives_up_after_max_retries(self):
+        _Handler.failures_left = 5
+        transport = HTTPTransport(max_retries=1, backoff_factor=0)
+        with self.assertRaises(requests.HTTPError):
+            transport.post(f"{self.base_url}/api/generate", json={"model": "m"})
+
+        metrics = transport.get_metrics()
+        self.assertEqual(metrics["count"], 1)
+        self.assertEqual(metrics["errors"], 1)
+        transport.close()
+
+    def test_empty_metrics(self):
+        self.assertEqual(HTTPTransport().get_metrics()["count"], 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
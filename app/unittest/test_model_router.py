@@ -0,0 +1,161 @@
+# app/unittest/test_model_router.py
+
+import unittest
+import asyncio
+import time
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.llm_modules.model_router import Purpose_View, Routed_Model, for_purpose
+from app.llm_modules.cached_model import Cached_Model
+
+
+class NamedModel:
+    """Answers with its name after a delay, optionally raising."""
+    def __init__(self, name, delay=0.0, error=None):
+        self.name = name
+        self.delay = delay
+        self.error = error
+        self.calls = 0
+
+    def chat(self, messages, temperature=0.3):
+        self.calls += 1
+        time.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.name
+
+    async def achat(self, messages, temperature=0.3):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.error:
+            raise self.error
+        return self.name
+
+    def chat_stream(self, messages, temperature=0.3):
+        self.calls += 1
+        if self.error:
+            raise self.error
+        yield self.name
+        yield "!"
+
+    def get_model(self):
+        return self.name
+
+
+class GovernedModel:
+    """Backend routing only the priority of its calls, without streaming."""
+    def route(self, purpose):
+        return Purpose_View(self, purpose)
+
+    def chat(self, messages, temperature=0.3, purpose=None):
+        return purpose
+
+
+class TestPurposeView(unittest.TestCase):
+
+    def test_chat_stream_only_if_the_model_streams(self):
+        view = for_purpose(GovernedModel(), "reply")
+        self.assertFalse(hasattr(view, "chat_stream"))
+        self.assertEqual(view.chat([]), "reply")
+
+    def test_chat_stream_with_purpose(self):
+        router = Routed_Model({"reply": NamedModel("local")}, default=NamedModel("cloud"))
+        self.assertEqual("".join(for_purpose(router, "reply").chat_stream([])), "local!")
+
+
+class TestRoutedModel(unittest.TestCase):
+
+    def setUp(self):
+        self.messages = [{"role": "user", "content": "Hello"}]
+
+    def test_routes_by_purpose(self):
+        local, cloud = NamedModel("local"), NamedModel("cloud")
+        router = Routed_Model({"extraction": local, "frustration": local}, default=cloud)
+
+        self.assertEqual(for_purpose(router, "extraction").chat(self.messages), "local")
+        self.assertEqual(for_purpose(router, "reply").chat(self.messages), "cloud")
+        self.assertEqual(router.chat(self.messages), "cloud")
+        self.assertEqual(router.get_model(), "cloud")
+
+    def test_fallback_on_error(self):
+        broken, cloud = NamedModel("local", error=ConnectionError("down")), NamedModel("cloud")
+        router = Routed_Model({"extraction": broken}, default=cloud, fallback=cloud)
+
+        self.assertEqual(for_purpose(router, "extraction").chat(self.messages), "cloud")
+        self.assertEqual(router.stats()["fallbacks"], {"extraction": 1})
+
+    def test_error_raised_without_fallback(self):
+        router = Routed_Model({"extraction": NamedModel("local", error=ConnectionError("down"))}, default=NamedModel("cloud"))
+        with self.assertRaises(ConnectionError):
+            for_purpose(router, "extraction").chat(self.messages)
+
+    def test_fallback_on_latency_budget(self):
+        slow, fast = NamedModel("slow", delay=0.5), NamedModel("fast")
+        router = Routed_Model({"summary": slow}, default=slow, fallback=fast, latency_budgets={"summary": 0.05})
+
+        start = time.time()
+        self.assertEqual(for_purpose(router, "summary").chat(self.messages), "fast")
+        self.assertLess(time.time() - start, 0.3)
+
+    def test_async_fallback_on_latency_budget(self):
+        slow, fast = NamedModel("slow", delay=0.5), NamedModel("fast")
+        router = Routed_Model({"reply": slow}, default=slow, fallback=fast, latency_budgets={"reply": 0.05})
+
+        self.assertEqual(asyncio.run(for_purpose(router, "reply").achat(self.messages)), "fast")
+
+    def test_stream_fallback_before_first_delta(self):
+        broken, cloud = NamedModel("local", error=ConnectionError("down")), NamedModel("cloud")
+        router = Routed_Model({"reply": broken}, default=cloud, fallback=cloud)
+
+        self.assertEqual("".join(for_purpose(router, "reply").chat_stream(self.messages)), "cloud!")
+
+    def test_stream_from_a_chat_only_backend(self):
+        class ChatOnlyModel:
+            def chat(self, messages, temperature=0.3):
+                return "local"
+
+        fallback = NamedModel("cloud")
+        router = Routed_Model({"reply": ChatOnlyModel()}, default=fallback, fallback=fallback)
+
+        self.assertEqual(list(for_purpose(router, "reply").chat_stream(self.messages)), ["local"])
+        self.assertEqual(router.stats()["fallbacks"], {})
+        self.assertEqual(fallback.calls, 0)
+
+    def test_aclose_closes_each_backend_once(self):
+        closed = []
+
+        class ClosingModel(NamedModel):
+            async def aclose(self):
+                closed.append(self.name)
+
+        local, cloud = ClosingModel("local"), ClosingModel("cloud")
+        router = Routed_Model({"extraction": local, "summary": local}, default=cloud, fallback=cloud)
+
+        asyncio.run(router.aclose())
+
+        self.assertEqual(sorted(closed), ["cloud", "local"])
+
+    def test_unknown_purpose(self):
+        with self.assertRaises(ValueError):
+            Routed_Model({"greeting": NamedModel("local")}, default=NamedModel("cloud"))
+
+    def test_cache_keys_by_purpose(self):
+        local, cloud = NamedModel("local"), NamedModel("cloud")
+        cached = Cached_Model(Routed_Model({"extraction": local}, default=cloud))
+
+        self.assertEqual(for_purpose(cached, "extraction").chat(self.messages), "local")
+        self.assertEqual(for_purpose(cached, "reply").chat(self.messages), "cloud")
+        self.assertEqual(for_purpose(cached, "extraction").chat(self.messages), "local")
+        self.assertEqual(cached.stats()["hits"], 1)
+
+    def test_cache_is_shared_by_purposes_of_one_backend(self):
+        cached = Cached_Model(GovernedModel())
+
+        self.assertEqual(for_purpose(cached, "extraction").chat(self.messages), "extraction")
+        self.assertEqual(for_purpose(cached, "supervisor").chat(self.messages), "extraction") # Same model and prompt
+        self.assertEqual(cached.stats()["hits"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
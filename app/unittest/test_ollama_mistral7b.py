@@ -1,7 +1,8 @@
 # app/unittest/test_ollama_mistral7b.py
 
 import unittest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, MagicMock, AsyncMock
+import asyncio
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
@@ -37,7 +38,7 @@ class TestOllamaMistral7BModel(unittest.TestCase):
         )
         self.assertEqual(formatted, expected)
 
-    @patch("app.llm_modules.ollama_mistral7b.requests.post")
+    @patch("app.llm_modules.http_transport.requests.Session.post")
     def test_chat_response(self, mock_post):
         # Arrange
         messages = [
@@ -58,6 +59,123 @@ class TestOllamaMistral7BModel(unittest.TestCase):
         self.assertTrue(called_url.endswith("/api/generate"))
         self.assertIn("model", mock_post.call_args[1]["json"])
 
+    @patch("app.llm_modules.http_transport.requests.Session.post")
+    def test_chat_stream(self, mock_post):
+        # Arrange
+        messages = [{"role": "user", "content": "Say hello!"}]
+        mock_response = MagicMock()
+        mock_response.iter_lines.return_value = [
+            b'{"response": " Hello", "done": false}',
+            b'',
+            b'{"response": " there!", "done": false}',
+            b'{"response": "", "done": true}',
+        ]
+        mock_post.return_value = mock_response
+
+        # Act
+        chunks = list(self.model.chat_stream(messages))
+
+        # Assert
+        self.assertEqual(chunks, ["Hello", " there!"])
+        self.assertTrue(mock_post.call_args[1]["json"]["stream"])
+        self.assertTrue(mock_post.call_args[1]["stream"])
+
+    def test_achat(self):
+        # Arrange
+        messages = [{"role": "user", "content": "Say hello!"}]
+        mock_response = Mock(status_code=200)
+        mock_response.json.return_value = {"response": " Hello there! "}
+        self.model.async_client = Mock()
+        self.model.async_client.post = AsyncMock(return_value=mock_response)
+
+        # Act
+        response = asyncio.run(self.model.achat(messages))
+
+        # Assert
+        self.assertEqual(response, "Hello there!")
+        self.assertTrue(self.model.async_client.post.call_args[0][0].endswith("/api/generate"))
+
+    def test_aclose(self):
+        client = Mock()
+        client.aclose = AsyncMock()
+        self.model.async_client = client
+
+        asyncio.run(self.model.aclose())
+        asyncio.run(self.model.aclose())
+
+        client.aclose.assert_awaited_once()
+        self.assertIsNone(self.model.async_client)
+
+    @patch("app.llm_modules.http_transport.requests.Session.post")
+    def test_stable_prefix_is_shared_by_the_next_turn(self, mock_post):
+        # Arrange
+        first_response = Mock()
+        first_response.json.return_value = {"response": " Hi! What is your order number?"}
+        second_response = Mock()
+        second_response.json.return_value = {"response": "Thanks"}
+        mock_post.side_effect = [first_response, second_response]
+        conversation = [{"role": "system", "content": "Be nice."}, {"role": "user", "content": "Hello"}]
+
+        # Act, the notes of the first turn are replaced in the second one
+        reply = self.model.chat(conversation + [{"role": "developer", "content": "Notes: {}"}])
+        conversation += [{"role": "assistant", "content": reply}, {"role": "user", "content": "ORD12345"}]
+        self.model.chat(conversation + [{"role": "developer", "content": "Notes: {'order_number': 'ORD12345'}"}])
+
+        # Assert, the full prompt is sent and the server cache serves the shared prefix
+        second_payload = mock_post.call_args_list[1][1]["json"]
+        self.assertNotIn("context", second_payload)
+        self.assertTrue(second_payload["prompt"].startswith("[System]\nBe nice.\n[User]\nHello\n[Assistant]\nHi! What is your order number?\n[User]\nORD12345\n"))
+        self.assertEqual(second_payload["keep_alive"], self.model.keep_alive)
+        self.assertEqual((self.model.prefix_hits, self.model.prefix_misses), (1, 1))
+
+    @patch("app.llm_modules.http_transport.requests.Session.post")
+    def test_prefix_is_not_shared_by_different_prompt(self, mock_post):
+        mock_response = Mock()
+        mock_response.json.return_value = {"response": "Yes"}
+        mock_post.return_value = mock_response
+
+        self.model.chat([{"role": "user", "content": "Is this valid?"}])
+        self.model.chat([{"role": "user", "content": "Is this other one valid?"}])
+
+        self.assertEqual(self.model.prefix_misses, 2)
+
+    def test_format_prompt_does_not_depend_on_previous_prompt(self):
+        messages = [{"role": "user", "content": "Hi"}, {"role": "developer", "content": "notes"}]
+        self.model._format_prompt(messages)
+        formatted = self.model._format_prompt(messages[:1] + [{"role": "assistant", "content": "Hello"}])
+        self.assertEqual(formatted, "[User]\nHi\n[Assistant]\nHello\n[Assistant]\n")
+
+    @patch("app.llm_modules.http_transport.requests.Session.post")
+    def test_records_prompt_eval_count(self, mock_post):
+        # Arrange, the server evaluates the whole first prompt and only the new tokens of the second one
+        first_response = Mock()
+        first_response.json.return_value = {"response": "Hi", "prompt_eval_count": 40}
+        second_response = Mock()
+        second_response.json.return_value = {"response": "Thanks", "prompt_eval_count": 6}
+        mock_post.side_effect = [first_response, second_response]
+        conversation = [{"role": "system", "content": "Be nice. " * 20}, {"role": "user", "content": "Hello"}]
+
+        # Act
+        self.model.chat(conversation)
+        self.model.chat(conversation + [{"role": "assistant", "content": "Hi"}, {"role": "user", "content": "ORD12345"}])
+
+        # Assert
+        stats = self.model.get_prompt_stats()
+        self.assertEqual(stats["prompt_eval_tokens"], 46)
+        self.assertGreater(stats["prompt_tokens"], stats["prompt_eval_tokens"])
+        self.assertLess(stats["eval_ratio"], 1)
+        self.assertEqual((stats["prefix_hits"], stats["prefix_misses"]), (1, 1))
+
+    @patch("app.llm_modules.http_transport.requests.Session.post")
+    def test_answers_without_prompt_eval_count_are_not_counted(self, mock_post):
+        mock_response = Mock()
+        mock_response.json.return_value = {"response": "Yes"}
+        mock_post.return_value = mock_response
+
+        self.model.chat([{"role": "user", "content": "Is this valid?"}])
+
+        self.assertIsNone(self.model.get_prompt_stats()["eval_ratio"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -2,7 +2,8 @@
 
 
 import unittest
-from unittest.mock import patch, Mock
+from unittest.mock import patch, Mock, AsyncMock
+import asyncio
 import os
 import sys
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
@@ -80,6 +81,60 @@ class TestOpenAIModel(unittest.TestCase):
         
         # Assert
         self.assertEqual(openai_model.client, mock_client)
+    @patch("app.llm_modules.open_ai.OpenAI")
+    def test_chat_stream(self, MockOpenAI):
+        # Arrange
+        mock_client = MockOpenAI.return_value
+        events = [
+            Mock(type="response.created"),
+            Mock(type="response.output_text.delta", delta="Hello"),
+            Mock(type="response.output_text.delta", delta=" there!"),
+            Mock(type="response.completed"),
+        ]
+        mock_client.responses.create.return_value = iter(events)
+        openai_model = OpenAI_Model(client=mock_client)
+
+        # Act
+        chunks = list(openai_model.chat_stream([{"role": "user", "content": "Say hello!"}]))
+
+        # Assert
+        self.assertEqual(chunks, ["Hello", " there!"])
+        self.assertTrue(mock_client.responses.create.call_args[1]["stream"])
+
+    @patch("app.llm_modules.open_ai.OpenAI")
+    def test_only_role_and_content_are_sent(self, MockOpenAI):
+        mock_client = MockOpenAI.return_value
+        mock_client.responses.create.return_value = Mock(output_text="Ok")
+        openai_model = OpenAI_Model(client=mock_client)
+
+        openai_model.chat([{"role": "developer", "content": "Earlier: lost package", "summary": True}])
+
+        self.assertEqual(mock_client.responses.create.call_args[1]["input"], [{"role": "developer", "content": "Earlier: lost package"}])
+
+    @patch("app.llm_modules.open_ai.OpenAI")
+    def test_achat(self, MockOpenAI):
+        # Arrange
+        mock_async_client = Mock()
+        mock_async_client.responses.create = AsyncMock(return_value=Mock(output_text="Hello there!"))
+        openai_model = OpenAI_Model(client=MockOpenAI.return_value, async_client=mock_async_client)
+
+        # Act
+        response = asyncio.run(openai_model.achat([{"role": "user", "content": "Say hello!"}]))
+
+        # Assert
+        self.assertEqual(response, "Hello there!")
+        mock_async_client.responses.create.assert_awaited_once()
+
+    def test_async_client_uses_the_endpoint_of_the_client(self):
+        openai_model = OpenAI_Model(client=OpenAI(base_url="http://127.0.0.1:11434/v1", api_key="fake"))
+
+        async_client = openai_model._get_async_client()
+
+        self.assertEqual(str(async_client.base_url), "http://127.0.0.1:11434/v1/")
+        self.assertEqual(async_client.api_key, "fake")
+        asyncio.run(openai_model.aclose())
+        self.assertIsNone(openai_model.async_client)
+
 
 if __name__ == "__main__":
     unittest.main()
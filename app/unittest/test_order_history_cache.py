@@ -0,0 +1,150 @@
+# app/unittest/test_order_history_cache.py
+
+import unittest
+import json
+import tempfile
+import threading
+import shutil
+from pathlib import Path
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.agent.customer_support_agent import CustomerSupportAgent
+from app.utils.order_history_cache import OrderHistoryCache
+from app.utils.storage import save_conversation, load_order_history, order_history
+
+
+EXTRACTED = {"order_number": "ORD1", "category": "shipping", "description": "package lost", "urgency": "high"}
+
+
+def save_session(order_number, text):
+    save_conversation(dict(EXTRACTED, order_number=order_number), [{"role": "user", "content": text}], text, "natural", 3, "en")
+
+
+class CountingLoader:
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, path):
+        self.calls += 1
+        return json.loads(path.read_text()) if path.exists() else []
+
+
+class TestOrderHistoryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = Path(tempfile.mkdtemp())
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def write(self, name, sessions):
+        path = self.test_dir / name
+        path.write_text(json.dumps(sessions))
+        return path
+
+    def test_hits_and_missing_files(self):
+        cache, loader = OrderHistoryCache(), CountingLoader()
+        path = self.write("ORD1.json", [{"summary": "first"}])
+        self.assertIs(cache.get(path, loader), cache.get(path, loader))
+        self.assertEqual(cache.get(self.test_dir / "ORD2.json", loader), [])
+        self.assertEqual(cache.get(self.test_dir / "ORD2.json", loader), [])
+        self.assertEqual(loader.calls, 2) # The missing order is cached too
+        self.assertEqual(cache.stats(), {"orders": 2, "hits": 2, "misses": 2, "evictions": 0, "invalidations": 0})
+
+    def test_lru_eviction(self):
+        cache, loader = OrderHistoryCache(max_orders=2), CountingLoader()
+        paths = [self.write(f"ORD{i}.json", [{"summary": str(i)}]) for i in range(3)]
+        cache.get(paths[0], loader)
+        cache.get(paths[1], loader)
+        cache.get(paths[0], loader) # ORD1 is now the least recently used
+        cache.get(paths[2], loader)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        cache.get(paths[0], loader)
+        self.assertEqual(loader.calls, 3)
+        cache.get(paths[1], loader)
+        self.assertEqual(loader.calls, 4)
+
+    def test_file_changed_by_another_process(self):
+        cache, loader = OrderHistoryCache(), CountingLoader()
+        path = self.write("ORD1.json", [{"summary": "first"}])
+        cache.get(path, loader)
+        self.write("ORD1.json", [{"summary": "first"}, {"summary": "second"}])
+        self.assertEqual(len(cache.get(path, loader)), 2)
+
+    def test_load_overlapping_an_invalidation_is_not_stored(self):
+        cache = OrderHistoryCache()
+        path = self.write("ORD1.json", [])
+        loading, saved = threading.Event(), threading.Event()
+
+        def slow_loader(path):
+            loading.set()
+            saved.wait(5)
+            return ["old"]
+
+        thread = threading.Thread(target=cache.get, args=(path, slow_loader))
+        thread.start()
+        loading.wait(5)
+        cache.invalidate(path) # A session is saved while the old content is loaded
+        saved.set()
+        thread.join()
+        self.assertEqual(cache.get(path, lambda path: ["new"]), ["new"])
+
+
+class TestOrderHistoryLookup(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_data_dir = save_conversation.__globals__["DATA_DIR"]
+        save_conversation.__globals__["DATA_DIR"] = Path(self.test_dir)
+
+    def tearDown(self):
+        save_conversation.__globals__["DATA_DIR"] = self.original_data_dir
+        shutil.rmtree(self.test_dir)
+
+    def test_save_invalidates_the_order(self):
+        save_session("ORD1", "first")
+        self.assertEqual(len(load_order_history("ORD1")), 1)
+        hits = order_history.stats()["hits"]
+        load_order_history("ORD1")
+        self.assertEqual(order_history.stats()["hits"], hits + 1)
+
+        save_session("ORD1", "second")
+        self.assertEqual(len(load_order_history("ORD1")), 2)
+
+    def test_agents_only_see_their_order(self):
+        save_session("ORD1", "my lamp never arrived")
+        save_session("ORD2", "the chair is broken")
+        first = CustomerSupportAgent(None, mode="natural", audio_mode=False)
+        second = CustomerSupportAgent(None, mode="natural", audio_mode=False)
+        first.extracted["order_number"] = "ORD1"
+        second.extracted["order_number"] = "ORD2"
+
+        self.assertIn("lamp", first._check_and_add_history())
+        self.assertNotIn("lamp", second._check_and_add_history())
+        self.assertNotIn("chair", first._check_and_add_history())
+
+        history = first._check_and_add_history()
+        self.assertIs(first._check_and_add_history(), history) # Rendered once
+        save_session("ORD1", "it is still missing")
+        self.assertIn("still missing", first._check_and_add_history())
+        self.assertIsNone(CustomerSupportAgent(None, audio_mode=False)._check_and_add_history())
+
+    def test_history_is_rendered_again_only_when_the_issue_changes(self):
+        save_session("ORD1", "my lamp never arrived")
+        agent = CustomerSupportAgent(None, mode="natural", audio_mode=False)
+        agent.extracted["order_number"] = "ORD1"
+        agent.store.append("user", "Hello, my order is ORD1")
+        history = agent._check_and_add_history()
+
+        # New user messages alone keep the history (and the prefix of the reply prompt)
+        agent.store.append("user", "It was a lamp")
+        agent.store.append("user", "Still nothing")
+        self.assertIs(agent._check_and_add_history(), history)
+
+        agent.extracted["description"] = "lamp not delivered"
+        self.assertIsNot(agent._check_and_add_history(), history)
+
+
+if __name__ == "__main__":
+    unittest.main()
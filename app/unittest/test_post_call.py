@@ -0,0 +1,177 @@
+# app/unittest/test_post_call.py
+
+import unittest
+import tempfile
+import threading
+import time
+import shutil
+from pathlib import Path
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.agent.customer_support_agent import CustomerSupportAgent
+from app.agent.post_call_worker import PostCallWorker, parse_frustration_score, post_call_job
+from app.utils.post_call_queue import PostCallQueue
+from app.utils.storage import save_conversation, load_conversations
+
+
+EXTRACTED = {"order_number": "ORD5", "category": "shipping", "description": "package lost", "urgency": "high"}
+
+
+def job(order_number="ORD5"):
+    conversation = [{"role": "user", "content": "My package is lost"}]
+    return post_call_job(dict(EXTRACTED, order_number=order_number), conversation,
+                         conversation + [{"role": "developer", "content": "Summarize"}],
+                         conversation + [{"role": "assistant", "content": "Rate the frustration"}], "natural", "en")
+
+
+class PostCallModel:
+    """Answers the summary and the frustration prompts after a delay, tracking the calls running at the same time."""
+    def __init__(self, delay=0.1, failures=0):
+        self.delay = delay
+        self.failures = failures
+        self.running = 0
+        self.max_running = 0
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def chat(self, messages, temperature=0.3):
+        with self.lock:
+            self.calls += 1
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("backend down")
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self.lock:
+            self.running -= 1
+        instruction = messages[-1]["content"]
+        if "frustration" in instruction.lower():
+            return "7"
+        if "Summarize" in instruction or "summary" in instruction.lower():
+            return "Lost package"
+        if "valid '" in instruction:
+            key = instruction.split("valid '")[1].split("'")[0]
+            return EXTRACTED[key]
+        if messages[0]["role"] == "system" and "Supervisor" in messages[0]["content"]:
+            return "Yes"
+        return "Could you tell me more?"
+
+
+class ScriptedIO:
+    def __init__(self, text):
+        self.text = text
+        self.written = []
+
+    def read(self, prefix, audio=False):
+        return self.text
+
+    def write(self, msg, audio=False):
+        self.written.append(msg)
+
+
+class TestPostCallQueue(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_fifo_and_done(self):
+        queue = PostCallQueue(self.test_dir, fsync=False)
+        first, second = queue.put({"n": 1}), queue.put({"n": 2})
+        job_id, claimed = queue.claim()
+        self.assertEqual((job_id, claimed["n"], claimed["attempts"]), (first, 1, 0))
+        queue.done(job_id)
+        self.assertEqual(queue.claim()[0], second)
+        self.assertIsNone(queue.claim())
+
+    def test_jobs_survive_a_restart(self):
+        queue = PostCallQueue(self.test_dir)
+        queue.put({"n": 1})
+        queue.put({"n": 2})
+        queue.claim() # The process stops while the job is processed
+
+        restarted = PostCallQueue(self.test_dir)
+        self.assertEqual(restarted.pending(), 2)
+        self.assertEqual(restarted.recover(), 1)
+        self.assertEqual([restarted.claim()[1]["n"], restarted.claim()[1]["n"]], [1, 2])
+
+    def test_non_ascii_jobs(self):
+        queue = PostCallQueue(self.test_dir, fsync=False)
+        queue.put({"summary": "El envío llegó roto"})
+        self.assertEqual(queue.claim()[1]["summary"], "El envío llegó roto")
+
+    def test_parse_frustration_score(self):
+        self.assertEqual(parse_frustration_score("7"), 7)
+        self.assertIsNone(parse_frustration_score("11"))
+        self.assertIsNone(parse_frustration_score("very"))
+
+
+class TestPostCallWorker(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_data_dir = save_conversation.__globals__["DATA_DIR"]
+        save_conversation.__globals__["DATA_DIR"] = Path(self.test_dir)
+        self.queue = PostCallQueue(os.path.join(self.test_dir, "post_call"), fsync=False)
+
+    def tearDown(self):
+        save_conversation.__globals__["DATA_DIR"] = self.original_data_dir
+        shutil.rmtree(self.test_dir)
+
+    def test_summary_and_frustration_run_in_parallel(self):
+        model = PostCallModel(delay=0.2)
+        worker = PostCallWorker(model, self.queue, workers=1, poll_interval=0.05).start()
+        start = time.time()
+        self.queue.put(job())
+        self.assertTrue(worker.drain(timeout=5))
+        elapsed = time.time() - start
+        worker.stop()
+
+        self.assertEqual(model.max_running, 2)
+        self.assertLess(elapsed, 0.35)
+        session = load_conversations("ORD5")[0]
+        self.assertEqual((session["summary"], session["frustration_score"]), ("Lost package", 7))
+        self.assertEqual(worker.stats()["processed"], 1)
+
+    def test_failed_jobs_are_retried(self):
+        model = PostCallModel(delay=0, failures=2)
+        worker = PostCallWorker(model, self.queue, workers=2, retry_delay=0.01, poll_interval=0.05).start()
+        self.queue.put(job("ORD6"))
+        self.assertTrue(worker.drain(timeout=5))
+        worker.stop()
+        self.assertEqual(len(load_conversations("ORD6")), 1)
+        self.assertGreaterEqual(worker.stats()["retried"], 1)
+
+    def test_job_moved_to_failed(self):
+        model = PostCallModel(delay=0, failures=100)
+        worker = PostCallWorker(model, self.queue, max_attempts=2, retry_delay=0.01, poll_interval=0.05).start()
+        job_id = self.queue.put(job("ORD7"))
+        self.assertTrue(worker.drain(timeout=5))
+        worker.stop()
+        self.assertEqual(self.queue.failed(), [job_id])
+        self.assertEqual(load_conversations("ORD7"), [])
+
+    def test_agent_ends_before_the_summary(self):
+        model = PostCallModel(delay=0)
+        agent = CustomerSupportAgent(model, mode="natural", audio_mode=False, post_call_queue=self.queue)
+        agent.userIO = ScriptedIO("ORD5 my package is lost, shipping, high")
+        agent.start()
+
+        self.assertEqual(self.queue.pending(), 1) # Summary, frustration and storage are left to the worker
+        self.assertEqual(load_conversations("ORD5"), [])
+        self.assertIn("ORD5", agent.userIO.written[-1])
+
+        worker = PostCallWorker(model, self.queue, poll_interval=0.05).start() # E.g. after a restart
+        self.assertTrue(worker.drain(timeout=5))
+        worker.stop()
+        session = load_conversations("ORD5")[0]
+        self.assertEqual(session["extracted"], EXTRACTED)
+        self.assertEqual(session["frustration_score"], 7)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,188 @@
+# app/unittest/test_rate_governor.py
+
+import unittest
+import asyncio
+import threading
+import time
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+
+from app.llm_modules.fake_llm_server import FakeLLMServer, RuleBasedResponder
+from app.llm_modules.model_router import for_purpose
+from app.llm_modules.ollama_mistral7b import OllamaMistral7B_Model
+from app.llm_modules.rate_governor import RateGovernor
+
+
+MESSAGES = [{"role": "user", "content": "Hello"}]
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeHTTPError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"HTTP {status_code}")
+        self.response = FakeResponse(status_code, headers)
+
+
+def wait_until(condition, timeout=2.0):
+    end = time.time() + timeout
+    while not condition():
+        if time.time() > end:
+            raise AssertionError("condition not reached")
+        time.sleep(0.005)
+
+
+class TestRateGovernor(unittest.TestCase):
+
+    def test_max_in_flight(self):
+        governor = RateGovernor(max_in_flight=2)
+        threads = [threading.Thread(target=governor.call, args=("reply", MESSAGES, time.sleep, 0.05)) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        stats = governor.stats()
+        self.assertEqual(stats["peak_in_flight"], 2)
+        self.assertEqual((stats["in_flight"], stats["waiting"], stats["granted"]["reply"]), (0, 0, 6))
+
+    def test_reply_goes_ahead_of_background_calls(self):
+        governor = RateGovernor(max_in_flight=1)
+        busy = threading.Event()
+        order = []
+
+        holder = threading.Thread(target=governor.call, args=("reply", MESSAGES, busy.wait))
+        holder.start()
+        wait_until(lambda: governor.in_flight == 1)
+        threads = []
+        for purpose in ("summary", "frustration", "extraction", "reply"):
+            threads.append(threading.Thread(target=governor.call, args=(purpose, MESSAGES, order.append, purpose)))
+            threads[-1].start()
+            wait_until(lambda: governor.waiting == len(threads))
+
+        busy.set()
+        for thread in [holder] + threads:
+            thread.join()
+        self.assertEqual(order, ["reply", "extraction", "summary", "frustration"])
+
+    def test_requests_per_minute(self):
+        governor = RateGovernor(requests_per_minute=600) # Burst of 600, then 10 per second
+        for _ in range(600):
+            governor.call(None, MESSAGES, lambda: None)
+        start = time.time()
+        governor.call(None, MESSAGES, lambda: None)
+        self.assertGreaterEqual(time.time() - start, 0.08)
+
+    def test_tokens_per_minute(self):
+        governor = RateGovernor(tokens_per_minute=6000, completion_tokens=0) # 100 tokens per second
+        long_prompt = [{"role": "user", "content": "x" * 4000}] # ~1000 tokens
+        for _ in range(5):
+            governor.call(None, long_prompt, lambda: None)
+        start = time.time()
+        governor.call(None, long_prompt, lambda: None) # 975 tokens left
+        self.assertGreaterEqual(time.time() - start, 0.2)
+
+    def test_retry_after_429(self):
+        governor = RateGovernor()
+        attempts = []
+
+        def request():
+            attempts.append(time.time())
+            if len(attempts) == 1:
+                raise FakeHTTPError(429, {"Retry-After": "0.2"})
+            return "ok"
+
+        self.assertEqual(governor.call("reply", MESSAGES, request), "ok")
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.2)
+        self.assertEqual(governor.stats()["rate_limited"], 1)
+
+    def test_429_pauses_the_other_calls(self):
+        governor = RateGovernor(retry_after=0.2)
+        attempts = []
+
+        def request():
+            attempts.append(time.time())
+            if len(attempts) == 1:
+                raise FakeHTTPError(429) # No Retry-After header, exponential backoff
+            return "ok"
+
+        self.assertEqual(governor.call(None, MESSAGES, request), "ok")
+        start = time.time()
+        governor._backoff(FakeHTTPError(429, {"retry-after-ms": "150"}), 0)
+        governor.call(None, MESSAGES, lambda: None)
+        self.assertGreaterEqual(attempts[1] - attempts[0], 0.2)
+        self.assertGreaterEqual(time.time() - start, 0.15)
+
+    def test_errors_are_raised(self):
+        governor = RateGovernor(max_retries=1, retry_after=0.0)
+        with self.assertRaises(FakeHTTPError): # Retries exhausted
+            governor.call(None, MESSAGES, self._raise, FakeHTTPError(429))
+        with self.assertRaises(FakeHTTPError): # Not a 429
+            governor.call(None, MESSAGES, self._raise, FakeHTTPError(500))
+        self.assertEqual(governor.stats()["rate_limited"], 1)
+        self.assertEqual(governor.in_flight, 0)
+
+    def test_stream_holds_the_slot(self):
+        governor = RateGovernor(max_in_flight=1)
+        stream = governor.stream("reply", MESSAGES, iter, ["a", "b"])
+        self.assertEqual(next(stream), "a")
+        self.assertEqual(governor.in_flight, 1)
+        stream.close()
+        self.assertEqual(governor.in_flight, 0)
+
+    def test_async_priority_and_cancel(self):
+        governor = RateGovernor(max_in_flight=1)
+        order = []
+
+        async def request(purpose, delay=0.0):
+            await asyncio.sleep(delay)
+            order.append(purpose)
+
+        async def main():
+            holder = asyncio.create_task(governor.acall("reply", MESSAGES, request, "holder", 0.05))
+            await asyncio.sleep(0.01)
+            summary = asyncio.create_task(governor.acall("summary", MESSAGES, request, "summary"))
+            cancelled = asyncio.create_task(governor.acall("reply", MESSAGES, request, "cancelled"))
+            reply = asyncio.create_task(governor.acall("reply", MESSAGES, request, "reply"))
+            await asyncio.sleep(0.01)
+            cancelled.cancel()
+            await asyncio.gather(holder, summary, reply)
+
+        asyncio.run(main())
+        self.assertEqual(order, ["holder", "reply", "summary"])
+        self.assertEqual((governor.in_flight, governor.waiting), (0, 0))
+
+    @staticmethod
+    def _raise(error):
+        raise error
+
+
+class TestGovernedModel(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeLLMServer(responder=RuleBasedResponder(script={"Hello": "Hi there"}), retry_after=0).start()
+
+    def tearDown(self):
+        self.server.stop()
+
+    def test_ollama_429_is_retried(self):
+        governor = RateGovernor(max_in_flight=4)
+        model = OllamaMistral7B_Model(base_url=self.server.base_url, governor=governor)
+        self.server.fail_next(1, status=429)
+        self.assertEqual(for_purpose(model, "summary").chat(MESSAGES), "Hi there")
+        self.server.fail_next(1, status=429)
+        self.assertEqual("".join(model.chat_stream(MESSAGES, purpose="reply")), "Hi there")
+        self.server.fail_next(1, status=429)
+        self.assertEqual(asyncio.run(model.achat(MESSAGES, purpose="extraction")), "Hi there")
+
+        stats = governor.stats()
+        self.assertEqual(stats["rate_limited"], 3)
+        self.assertEqual(stats["granted"], {"summary": 2, "reply": 2, "extraction": 2})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,64 @@
+# app/unittest/test_rule_extractor.py
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.data_validation.rule_extractor import RuleExtractor
+
+
+class TestRuleExtractor(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = RuleExtractor("en")
+
+    def test_order_number(self):
+        self.assertEqual(self.rules.score("order_number", "Yes, my order number is ord1357."), ("ORD1357", 1.0))
+        self.assertEqual(self.rules.score("order_number", "ORD-1357")[1], 0.5)
+        self.assertEqual(self.rules.score("order_number", "ORD12 or maybe ORD13"), (None, 0.0))
+        self.assertEqual(self.rules.score("order_number", "It is RECORD12345"), (None, 0.0))
+
+    def test_category(self):
+        self.assertEqual(self.rules.score("category", "Shipping"), ("shipping", 1.0))
+        self.assertEqual(self.rules.score("category", "Billing."), ("billing", 1.0))
+        self.assertEqual(self.rules.score("category", "Yes, the problem is with the billing of my order"), ("billing", 0.7))
+        self.assertEqual(self.rules.score("category", "My package is lost"), ("shipping", 0.6)) # Synonym
+        self.assertEqual(self.rules.score("category", "The product is fine, the shipping was late"), (None, 0.0))
+        self.assertEqual(self.rules.score("category", "It is not a billing problem, I think"), (None, 0.0))
+
+    def test_urgency(self):
+        self.assertEqual(self.rules.score("urgency", "High urgency."), ("high", 1.0))
+        self.assertEqual(self.rules.score("urgency", "Yes, this is high priority for me, I need it now."), ("high", 0.8))
+        self.assertEqual(self.rules.score("urgency", "Quite high, like I've been charged extra"), ("high", 0.7))
+        self.assertEqual(self.rules.score("urgency", "I was charged 20% higher than the price"), (None, 0.0))
+
+    def test_spanish(self):
+        rules = RuleExtractor("es")
+        self.assertEqual(rules.score("category", "Envio"), ("shipping", 1.0)) # Without the accent
+        self.assertEqual(rules.score("category", "El problema es con el envío."), ("shipping", 0.7))
+        self.assertEqual(rules.score("urgency", "Urgencia alta"), ("high", 1.0))
+        self.assertEqual(rules.score("urgency", "Llega en media hora y el paquete está mal"), ("medium", 0.7))
+
+    def test_extract_leaves_the_rest_to_the_model(self):
+        settled, remaining = self.rules.extract("My order ORD5 has a billing problem, urgent", ["order_number", "category", "description", "urgency"])
+        self.assertEqual(settled, {"order_number": "ORD5"})
+        self.assertEqual(remaining, ["category", "description", "urgency"])
+
+        settled, remaining = self.rules.extract("shipping", ["category", "urgency"])
+        self.assertEqual((settled, remaining), ({"category": "shipping"}, ["urgency"]))
+
+    def test_sentences_are_left_to_the_model(self):
+        keys = ["order_number", "category", "urgency"]
+        self.assertEqual(self.rules.extract("My product never arrived, order ORD123", keys), ({"order_number": "ORD123"}, ["category", "urgency"]))
+        self.assertEqual(self.rules.extract("I was billed twice for a product I returned", keys)[0], {})
+        self.assertEqual(self.rules.extract("I can not say it is high urgency", keys)[0], {})
+        self.assertEqual(RuleExtractor("es").extract("el envío llegó roto", keys)[0], {})
+
+    def test_multiple_or_negated_values(self):
+        self.assertEqual(self.rules.score("category", "product, shipping"), (None, 0.0))
+        self.assertEqual(self.rules.score("category", "not billing"), (None, 0.0))
+        self.assertEqual(self.rules.score("urgency", "not high"), (None, 0.0))
+
+
+if __name__ == "__main__":
+    unittest.main()
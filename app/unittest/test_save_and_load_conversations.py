@@ -8,11 +8,19 @@ import shutil
 import sys
 import os
 import re
+import threading
+import multiprocessing
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
 from app.utils.storage import save_conversation, load_conversations, list_all_orders
 
 
+def save_from_process(data_dir, i):
+    save_conversation.__globals__["DATA_DIR"] = Path(data_dir)
+    extracted = {"order_number": "ORD778", "category": "shipping", "description": "Late", "urgency": "low"}
+    for j in range(10):
+        save_conversation(extracted, [{"role": "user", "text": f"{i}-{j}"}], "Summary", "natural", 3, "en")
+
 
 class TestSaveAndLoadConversations(unittest.TestCase):
     def setUp(self):
@@ -134,5 +142,41 @@ class TestSaveAndLoadConversations(unittest.TestCase):
         orders = list_all_orders()  # Corrected this line
         self.assertIn("ORD12345", orders)
 
+    def test_concurrent_saves_keep_every_session(self):
+        extracted = {"order_number": "ORD777", "category": "shipping", "description": "Late", "urgency": "low"}
+
+        def save(i):
+            for j in range(5):
+                save_conversation(extracted, [{"role": "user", "text": f"{i}-{j}"}], "Summary", "natural", 3, "en")
+
+        threads = [threading.Thread(target=save, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        texts = sorted(session["conversation"][0]["text"] for session in load_conversations("ORD777"))
+        self.assertEqual(texts, sorted(f"{i}-{j}" for i in range(8) for j in range(5)))
+        self.assertEqual([name for name in os.listdir(self.test_dir) if name.endswith(".tmp")], []) # No temporary file left
+
+    def test_concurrent_processes_keep_every_session(self):
+        context = multiprocessing.get_context("fork")
+        processes = [context.Process(target=save_from_process, args=(self.test_dir, i)) for i in range(4)]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join(30)
+
+        texts = sorted(session["conversation"][0]["text"] for session in load_conversations("ORD778"))
+        self.assertEqual(texts, sorted(f"{i}-{j}" for i in range(4) for j in range(10)))
+
+    def test_file_mode_is_kept(self):
+        extracted = {"order_number": "ORD779", "category": "shipping", "description": "Late", "urgency": "low"}
+        save_conversation(extracted, [], "Summary", "natural", 3, "en")
+        path = Path(self.test_dir) / "ORD779.json"
+        os.chmod(path, 0o640)
+        save_conversation(extracted, [], "Summary", "natural", 3, "en")
+        self.assertEqual(path.stat().st_mode & 0o777, 0o640)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
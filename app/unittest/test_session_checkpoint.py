@@ -0,0 +1,201 @@
+# app/unittest/test_session_checkpoint.py
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+from pathlib import Path
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.agent.async_customer_support_agent import AsyncCustomerSupportAgent
+from app.agent.customer_support_agent import CustomerSupportAgent
+from app.agent.session_checkpoint import restore_state
+from app.utils.checkpoint_store import FileCheckpointStore, SQLiteCheckpointStore
+from app.utils.storage import save_conversation, load_conversations
+
+
+VALUES = {"order_number": "ORD5", "category": "shipping", "description": "package lost", "urgency": "high"}
+
+
+class TurnByTurnModel:
+    """Extracts only the values present in the user messages, the other prompts get a fixed answer."""
+    def chat(self, messages, temperature=0.3):
+        instruction = messages[-1]["content"]
+        user_text = " ".join(m["content"] for m in messages if m["role"] == "user")
+        if "valid '" in instruction:
+            key = instruction.split("valid '")[1].split("'")[0]
+            if VALUES[key] in user_text:
+                return VALUES[key]
+            return "INVALID" if "INVALID" in instruction else "NONE"
+        if "frustration" in instruction:
+            return "2"
+        if messages[0]["role"] == "system" and "Supervisor" in messages[0]["content"]:
+            return "Yes"
+        return "Could you tell me more?"
+
+    async def achat(self, messages, temperature=0.3):
+        return self.chat(messages, temperature)
+
+
+class Crash(Exception):
+    pass
+
+
+class TurnsIO:
+    """Answers with a list of user messages, raises Crash when there are no more (the process stops)."""
+    def __init__(self, user_messages):
+        self.user_messages = list(user_messages)
+        self.written = []
+
+    def read(self, prefix, audio=False):
+        if not self.user_messages:
+            raise Crash()
+        return self.user_messages.pop(0)
+
+    def write(self, msg, audio=False):
+        self.written.append(msg)
+
+
+class AsyncTurnsIO(TurnsIO):
+    async def read(self, prefix, audio=False):
+        return TurnsIO.read(self, prefix, audio)
+
+    async def write(self, msg, audio=False):
+        TurnsIO.write(self, msg, audio)
+
+
+def run_sync(agent, io):
+    agent.userIO = io
+    try:
+        agent.start()
+    except Crash:
+        pass
+
+
+class TestCheckpointStores(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def check_store(self, store):
+        store.append("s1", {"t": "start"})
+        store.append("s1", {"t": "turn", "n": 2})
+        store.append("s2", {"t": "start"})
+        self.assertEqual(store.load("s1"), [{"t": "start"}, {"t": "turn", "n": 2}])
+        self.assertEqual(store.list_sessions(), ["s1", "s2"])
+        self.assertTrue(store.exists("s2"))
+        store.delete("s2")
+        self.assertFalse(store.exists("s2"))
+        self.assertEqual(store.load("s2"), [])
+        with self.assertRaises(ValueError):
+            store.append("../s3", {})
+
+    def test_file_store(self):
+        store = FileCheckpointStore(self.test_dir)
+        self.check_store(store)
+        with open(Path(self.test_dir) / "s1.jsonl", "a") as f:
+            f.write('{"t": "tu') # Cut by a crash
+        self.assertEqual(len(store.load("s1")), 2)
+
+    def test_sqlite_store(self):
+        store = SQLiteCheckpointStore(os.path.join(self.test_dir, "checkpoints.sqlite3"))
+        self.check_store(store)
+        store.close()
+
+
+class TestSessionCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_data_dir = save_conversation.__globals__["DATA_DIR"]
+        save_conversation.__globals__["DATA_DIR"] = Path(self.test_dir)
+        self.store = FileCheckpointStore(os.path.join(self.test_dir, "checkpoints"))
+
+    def tearDown(self):
+        save_conversation.__globals__["DATA_DIR"] = self.original_data_dir
+        shutil.rmtree(self.test_dir)
+
+    def test_natural_session_resumes_on_a_new_agent(self):
+        agent = CustomerSupportAgent(TurnByTurnModel(), mode="natural", audio_mode=False, checkpoint_store=self.store)
+        run_sync(agent, TurnsIO(["Hi, order ORD5", "It is a shipping problem"]))
+        self.assertEqual(agent.extracted, {"order_number": "ORD5", "category": "shipping"})
+
+        resumed = CustomerSupportAgent.from_checkpoint(TurnByTurnModel(), self.store, agent.session_id)
+        self.assertEqual(resumed.full_conversation, agent.full_conversation)
+        self.assertEqual((resumed.extracted, resumed.msgs_count, resumed.mode), (agent.extracted, 3, "natural"))
+
+        io = TurnsIO(["The package lost, high"])
+        run_sync(resumed, io)
+        self.assertEqual(io.written[0], "🤖 Could you tell me more?") # The last message is repeated
+        self.assertEqual(resumed.extracted, VALUES)
+        self.assertEqual(len(load_conversations("ORD5")), 1)
+        self.assertFalse(self.store.exists(agent.session_id)) # Finished sessions are removed
+
+    def test_records_are_deltas(self):
+        agent = CustomerSupportAgent(TurnByTurnModel(), mode="natural", audio_mode=False, checkpoint_store=self.store)
+        run_sync(agent, TurnsIO(["Hi, order ORD5", "It is a shipping problem", "Sorry?"]))
+
+        records = self.store.load(agent.session_id)
+        self.assertEqual([record["t"] for record in records], ["start", "turn", "turn", "turn", "turn"])
+        # Each turn only holds its own messages: the user message, the notes and the reply
+        for record in records[2:]:
+            self.assertEqual((record["full"][0][0], record["full"][-1][0]), ("user", "assistant"))
+        self.assertEqual(sum(len(record["full"]) for record in records[1:]), len(agent.full_conversation))
+        self.assertEqual(records[2]["set"], {"order_number": "ORD5"})
+        self.assertEqual(records[3]["set"], {"category": "shipping"})
+        self.assertNotIn("set", records[4])
+        self.assertEqual(restore_state(records)["full_conversation"], agent.full_conversation)
+
+    def test_summarized_messages_are_written_by_index(self):
+        agent = CustomerSupportAgent(TurnByTurnModel(), mode="natural", audio_mode=False, checkpoint_store=self.store, context_budget=200)
+        run_sync(agent, TurnsIO(["Hi, order ORD5", "It is a shipping problem", "Sorry?", "What did you say?", "I did not hear you"]))
+        self.assertGreater(agent.context_budget.compactions, 0)
+
+        records = self.store.load(agent.session_id)
+        summarized = [item for record in records for item in record.get("summarized", [])]
+        self.assertTrue(summarized)
+        self.assertTrue(all(isinstance(item, int) for item in summarized)) # All of them are in the full records
+        resumed = CustomerSupportAgent.from_checkpoint(TurnByTurnModel(), self.store, agent.session_id)
+        self.assertEqual(resumed.context_budget.summarized_messages(), agent.context_budget.summarized_messages())
+        self.assertEqual(resumed.context_budget.summary, agent.context_budget.summary)
+
+    def test_version_1_summarized_pairs(self):
+        records = [{"v": 1, "t": "start", "config": {"mode": "natural"}},
+                   {"v": 1, "t": "turn", "n": 2, "full": [["user", "Hi"]], "summary": "greeting", "summarized": [["user", "Hi"]]}]
+        self.assertEqual(restore_state(records)["summarized"], {("user", "Hi")})
+
+    def test_rigid_session(self):
+        agent = CustomerSupportAgent(TurnByTurnModel(), mode="rigid", audio_mode=False, checkpoint_store=self.store)
+        run_sync(agent, TurnsIO(["ORD5", "shipping"]))
+
+        resumed = CustomerSupportAgent.from_checkpoint(TurnByTurnModel(), self.store, agent.session_id)
+        self.assertEqual(resumed.conversation, agent.conversation)
+        io = TurnsIO(["package lost", "high"])
+        run_sync(resumed, io)
+        self.assertEqual(io.written[0], "🤖 " + resumed.prompts["questions"]["description"]) # Answered questions are skipped
+        self.assertEqual(resumed.extracted, VALUES)
+
+    def test_async_agent_resumes_a_sync_session(self):
+        agent = CustomerSupportAgent(TurnByTurnModel(), mode="natural", audio_mode=False, checkpoint_store=self.store)
+        run_sync(agent, TurnsIO(["Hi, order ORD5"]))
+
+        io = AsyncTurnsIO(["It is a shipping problem, package lost, high"])
+        resumed = AsyncCustomerSupportAgent.from_checkpoint(TurnByTurnModel(), self.store, agent.session_id, userIO=io)
+        asyncio.run(resumed.start())
+        self.assertEqual(resumed.extracted, VALUES)
+        self.assertFalse(self.store.exists(agent.session_id))
+
+    def test_errors(self):
+        with self.assertRaises(KeyError):
+            CustomerSupportAgent.from_checkpoint(TurnByTurnModel(), self.store, "missing")
+        self.store.append("future", {"v": 99, "t": "start", "config": {}})
+        with self.assertRaises(ValueError):
+            CustomerSupportAgent.from_checkpoint(TurnByTurnModel(), self.store, "future")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,211 @@
+# app/unittest/test_session_server.py
+
+import unittest
+import asyncio
+import tempfile
+import shutil
+from pathlib import Path
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.server.session_server import SessionClient, SessionError, SessionServer
+from app.utils.checkpoint_store import FileCheckpointStore
+from app.utils.storage import save_conversation, load_conversations
+
+
+class FakeAsyncModel:
+    """Extracts the values present in the user messages, the other prompts get a fixed answer."""
+    def __init__(self, delay=0.01):
+        self.delay = delay
+
+    async def achat(self, messages, temperature=0.3):
+        await asyncio.sleep(self.delay)
+        instruction = messages[-1]["content"]
+        user_text = " ".join(m["content"] for m in messages if m["role"] == "user")
+        if "valid '" in instruction:
+            key = instruction.split("valid '")[1].split("'")[0]
+            order = next((word for word in user_text.split() if word.startswith("ORD")), "NONE")
+            values = {"order_number": order, "category": "shipping", "description": "package lost", "urgency": "high"}
+            return values[key] if key == "order_number" or "lost" in user_text else "NONE"
+        if "frustration" in instruction:
+            return "3"
+        if messages[0]["role"] == "system" and "Supervisor" in messages[0]["content"]:
+            return "Yes"
+        return "Could you tell me more?"
+
+
+async def talk(client, turns):
+    """Answers each input request with the next turn, returns the agent messages and the end reason."""
+    turns = list(turns)
+    messages = []
+    while True:
+        event = await client.receive()
+        if event is None:
+            return messages, None
+        if event["type"] == "message":
+            messages.append(event["text"])
+        elif event["type"] == "input":
+            if turns:
+                await client.send(turns.pop(0))
+        elif event["type"] == "end":
+            return messages, event["reason"]
+
+
+class TestSessionServer(unittest.TestCase):
+
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.original_data_dir = save_conversation.__globals__["DATA_DIR"]
+        save_conversation.__globals__["DATA_DIR"] = Path(self.test_dir)
+
+    def tearDown(self):
+        save_conversation.__globals__["DATA_DIR"] = self.original_data_dir
+        shutil.rmtree(self.test_dir)
+
+    def run_with_server(self, scenario, **options):
+        async def main():
+            server = await SessionServer(FakeAsyncModel(), port=0, **options).start()
+            try:
+                return await scenario(server)
+            finally:
+                await server.close()
+        return asyncio.run(main())
+
+    def test_session(self):
+        async def scenario(server):
+            client = await SessionClient.connect(server.host, server.port, mode="natural")
+            messages, reason = await talk(client, ["Hi, my order ORD1 never arrived", "The package got lost, urgent"])
+            await client.close()
+            return server, messages, reason
+
+        server, messages, reason = self.run_with_server(scenario)
+        self.assertEqual(reason, "completed")
+        self.assertIn("Could you tell me more?", messages[1])
+        self.assertEqual(len(load_conversations("ORD1")), 1)
+        stats = server.stats()
+        self.assertEqual((stats["active"], stats["started"], stats["completed"], stats["turns"]), (0, 1, 1, 2))
+
+    def test_concurrent_sessions(self):
+        async def scenario(server):
+            clients = [await SessionClient.connect(server.host, server.port) for _ in range(50)]
+            results = await asyncio.gather(*(talk(client, [f"ORD{i} the package got lost"]) for i, client in enumerate(clients)))
+            return [reason for _, reason in results]
+
+        self.assertEqual(self.run_with_server(scenario), ["completed"] * 50)
+        self.assertEqual(len(load_conversations("ORD49")), 1)
+
+    def test_close_closes_the_model_client(self):
+        class ClosingModel(FakeAsyncModel):
+            closed = 0
+
+            async def aclose(self):
+                self.closed += 1
+
+        async def main():
+            server = await SessionServer(ClosingModel(), port=0).start()
+            await server.close()
+            return server.model.closed
+
+        self.assertEqual(asyncio.run(main()), 1)
+
+    def test_session_limit(self):
+        async def scenario(server):
+            first = await SessionClient.connect(server.host, server.port)
+            with self.assertRaises(SessionError):
+                await SessionClient.connect(server.host, server.port)
+            await first.close()
+            return server.stats()["rejected"]
+
+        self.assertEqual(self.run_with_server(scenario, max_sessions=1), 1)
+
+    def test_idle_timeout(self):
+        async def scenario(server):
+            client = await SessionClient.connect(server.host, server.port)
+            return await talk(client, [])
+
+        messages, reason = self.run_with_server(scenario, idle_timeout=0.2)
+        self.assertEqual(reason, "idle")
+
+    def test_resume_after_disconnect(self):
+        async def scenario(server):
+            client = await SessionClient.connect(server.host, server.port)
+            self.assertEqual((await client.receive())["type"], "message") # Welcome
+            await client.close()
+
+            resumed = await SessionClient.connect(server.host, server.port, session_id=client.session_id)
+            messages, reason = await talk(resumed, ["ORD7 the package got lost"])
+            with self.assertRaises(SessionError):
+                await SessionClient.connect(server.host, server.port, session_id=client.session_id) # Ended
+            return reason
+
+        self.assertEqual(self.run_with_server(scenario), "completed")
+
+    def test_resume_on_another_server(self):
+        store = FileCheckpointStore(os.path.join(self.test_dir, "checkpoints"))
+
+        async def main():
+            first = await SessionServer(FakeAsyncModel(), port=0, checkpoint_store=store).start()
+            client = await SessionClient.connect(first.host, first.port)
+            await client.receive() # Welcome
+            await client.receive() # Input request
+            await client.send("Hi, my order is ORD9")
+            while (await client.receive())["type"] != "input": # Reply of the first turn
+                pass
+            await first.close() # The process stops, the session is in the checkpoint store
+
+            second = await SessionServer(FakeAsyncModel(), port=0, checkpoint_store=store).start()
+            try:
+                resumed = await SessionClient.connect(second.host, second.port, session_id=client.session_id)
+                return await talk(resumed, ["The package got lost"])
+            finally:
+                await second.close()
+
+        messages, reason = asyncio.run(main())
+        self.assertEqual(messages[0], "🤖 Could you tell me more?") # The last message is repeated
+        self.assertEqual(reason, "completed")
+        self.assertEqual(load_conversations("ORD9")[0]["extracted"]["order_number"], "ORD9")
+
+    def test_invalid_lines(self):
+        async def scenario(server):
+            client = await SessionClient.connect(server.host, server.port)
+            client.writer.write(b"not json\n{\"type\": \"other\"}\n")
+            errors = []
+            while len(errors) < 2:
+                event = await client.receive()
+                if event["type"] == "error":
+                    errors.append(event["error"])
+            await client.send("ORD3 the package got lost") # The input request came before the errors
+            messages, reason = await talk(client, [])
+            return errors, reason
+
+        errors, reason = self.run_with_server(scenario)
+        self.assertEqual(len(errors), 2)
+        self.assertEqual(reason, "completed")
+
+    def test_failed_session_sends_the_error(self):
+        class FailingModel:
+            async def achat(self, messages, temperature=0.3):
+                raise ConnectionError("backend down")
+
+        async def main():
+            server = await SessionServer(FailingModel(), port=0).start()
+            try:
+                client = await SessionClient.connect(server.host, server.port)
+                events = []
+                while not events or events[-1]["type"] != "end":
+                    event = await client.receive()
+                    events.append(event)
+                    if event["type"] == "input":
+                        await client.send("ORD3 the package got lost")
+                return events, server.stats()["errors"]
+            finally:
+                await server.close()
+
+        events, errors = asyncio.run(main())
+        self.assertEqual(events[-2], {"type": "error", "error": "Session failed: ConnectionError: backend down"})
+        self.assertEqual(events[-1]["reason"], "error")
+        self.assertEqual(errors, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
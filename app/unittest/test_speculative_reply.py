@@ -0,0 +1,76 @@
+# app/unittest/test_speculative_reply.py
+
+import unittest
+import threading
+import time
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.agent.speculative_reply import SpeculativeReply
+
+
+class StreamModel:
+    """Streams a reply word by word, waiting `delay` between words."""
+    def __init__(self, reply="Could you give me your order number?", delay=0.02, error=None):
+        self.reply = reply
+        self.delay = delay
+        self.error = error
+        self.closed = threading.Event()
+
+    def chat_stream(self, messages, temperature=0.3):
+        try:
+            if self.error:
+                raise self.error
+            for word in self.reply.split(" "):
+                time.sleep(self.delay)
+                yield word + " "
+        finally:
+            self.closed.set()
+
+
+class ChatModel:
+    def chat(self, messages, temperature=0.3):
+        return "Hello"
+
+
+class TestSpeculativeReply(unittest.TestCase):
+
+    def setUp(self):
+        self.prompt = [{"role": "system", "content": "You are SupportBot."}, {"role": "user", "content": "Hi"}]
+
+    def test_reply_is_generated_in_background(self):
+        model = StreamModel(delay=0.02)
+        speculative = SpeculativeReply(model, self.prompt)
+        time.sleep(0.2) # The extraction runs meanwhile
+
+        start = time.time()
+        reply = "".join(speculative.deltas())
+        self.assertEqual(reply.strip(), model.reply)
+        self.assertLess(time.time() - start, 0.05) # Already buffered
+
+    def test_matches_the_predicted_prompt_only(self):
+        speculative = SpeculativeReply(ChatModel(), self.prompt)
+        self.assertTrue(speculative.matches(list(self.prompt)))
+        self.assertFalse(speculative.matches(self.prompt + [{"role": "developer", "content": "Notes corrected"}]))
+        self.assertEqual(list(speculative.deltas()), ["Hello"])
+
+    def test_prompt_is_copied(self):
+        prompt = list(self.prompt)
+        speculative = SpeculativeReply(ChatModel(), prompt)
+        prompt.append({"role": "developer", "content": "Notes corrected"})
+        self.assertFalse(speculative.matches(prompt))
+
+    def test_cancel_closes_the_stream(self):
+        model = StreamModel(reply=" ".join(["word"] * 100), delay=0.01)
+        speculative = SpeculativeReply(model, self.prompt)
+        speculative.cancel()
+        self.assertTrue(model.closed.wait(1))
+
+    def test_errors_are_raised_on_use(self):
+        speculative = SpeculativeReply(StreamModel(error=ConnectionError("down")), self.prompt)
+        with self.assertRaises(ConnectionError):
+            list(speculative.deltas())
+
+
+if __name__ == "__main__":
+    unittest.main()
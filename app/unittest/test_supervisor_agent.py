@@ -0,0 +1,190 @@
+# app/unittest/test_supervisor_agent.py
+
+import unittest
+import asyncio
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.agent.supervisor_agent import SupervisorAgent
+from app.agent.async_supervisor_agent import AsyncSupervisorAgent
+
+REQUIRED_KEYS = ["order_number", "category", "description", "urgency"]
+
+
+class ScriptedModel:
+    """Returns the scripted answers in order, recording the prompts."""
+    def __init__(self, answers):
+        self.answers = list(answers)
+        self.prompts = []
+
+    def chat(self, messages, temperature=0.3):
+        self.prompts.append([dict(m) for m in messages])
+        return self.answers.pop(0)
+
+    async def achat(self, messages, temperature=0.3):
+        return self.chat(messages, temperature)
+
+
+class TestSupervisorAgent(unittest.TestCase):
+
+    def setUp(self):
+        self.conversation = [{"role": "user", "content": "Order ORD12345, my package never arrived, it is urgent"}]
+        self.extracted = {"order_number": "ORD12345", "category": "shipping", "description": "package never arrived", "urgency": "high"}
+
+    def test_correct_notes(self):
+        model = ScriptedModel(["Yes"])
+        supervisor = SupervisorAgent(model, REQUIRED_KEYS)
+
+        self.assertTrue(supervisor.validate(self.conversation, self.extracted))
+        self.assertEqual(len(model.prompts), 1)
+
+    def test_fixed_notes(self):
+        model = ScriptedModel(["No", "Yes", "{'urgency': 'medium'}"])
+        supervisor = SupervisorAgent(model, REQUIRED_KEYS)
+
+        self.assertTrue(supervisor.validate(self.conversation, self.extracted))
+        self.assertEqual(self.extracted["urgency"], "medium")
+        self.assertEqual(len(model.prompts), 3)
+
+    def test_incorrect_fields_are_removed(self):
+        model = ScriptedModel(["No", "No", "['category']"])
+        supervisor = SupervisorAgent(model, REQUIRED_KEYS)
+
+        self.assertFalse(supervisor.validate(self.conversation, self.extracted))
+        self.assertNotIn("category", self.extracted)
+
+    def test_async_validate_follows_the_same_dialogue(self):
+        model = ScriptedModel(["No", "Yes", "{'urgency': 'low'}"])
+        supervisor = AsyncSupervisorAgent(model, REQUIRED_KEYS)
+
+        self.assertTrue(asyncio.run(supervisor.validate(self.conversation, self.extracted)))
+        self.assertEqual(self.extracted["urgency"], "low")
+        self.assertEqual(len(model.prompts), 3)
+
+
+class TestAdaptiveReview(unittest.TestCase):
+
+    def setUp(self):
+        self.conversation = [{"role": "user", "content": "Order ORD12345, my package never arrived, it is urgent"}]
+        self.extracted = {"order_number": "ORD12345", "category": "shipping"}
+
+    def test_unchanged_notes_are_not_reviewed_again(self):
+        model = ScriptedModel(["Yes"])
+        supervisor = SupervisorAgent(model, REQUIRED_KEYS)
+
+        self.assertFalse(supervisor.review(self.conversation, self.extracted)) # Approved, but not complete
+        self.assertFalse(supervisor.review(self.conversation, self.extracted))
+        self.assertEqual(len(model.prompts), 1)
+        self.assertEqual(supervisor.stats(), {"reviews": 1, "skipped_reviews": 1, "calls": 1, "avoided_calls": 1, "fallbacks": 0})
+
+    def test_avoided_calls_of_fixed_notes(self):
+        model = ScriptedModel(["No", "Yes", "{'category': 'shipping'}"])
+        supervisor = SupervisorAgent(model, REQUIRED_KEYS)
+        extracted = {"order_number": "ORD12345", "category": "billing"}
+
+        supervisor.review(self.conversation, extracted) # Fixed and approved with 3 calls
+        supervisor.review(self.conversation, extracted)
+        self.assertEqual((supervisor.calls, supervisor.avoided_calls), (3, 3))
+
+    def test_empty_notes_are_not_reviewed(self):
+        model = ScriptedModel([])
+        supervisor = SupervisorAgent(model, REQUIRED_KEYS)
+
+        self.assertFalse(supervisor.review(self.conversation, {}))
+        self.assertEqual(supervisor.skipped_reviews, 1)
+
+    def test_changed_notes_are_reviewed(self):
+        model = ScriptedModel(["Yes", "Yes"])
+        supervisor = SupervisorAgent(model, REQUIRED_KEYS)
+        supervisor.review(self.conversation, self.extracted)
+
+        self.extracted.update(description="package never arrived", urgency="high")
+        self.assertTrue(supervisor.review(self.conversation, self.extracted))
+        self.assertEqual(len(model.prompts), 2)
+
+    def test_notes_failing_the_local_check_are_reviewed(self):
+        model = ScriptedModel(["Yes", "No", "Yes", "{'urgency': 'high'}"])
+        supervisor = SupervisorAgent(model, REQUIRED_KEYS)
+        supervisor.review(self.conversation, self.extracted)
+
+        self.extracted["urgency"] = "whenever" # Removed by validate_format, the model may find the right value
+        self.assertFalse(supervisor.review(self.conversation, self.extracted))
+        self.assertEqual(self.extracted["urgency"], "high")
+        self.assertEqual(supervisor.stats(), {"reviews": 2, "skipped_reviews": 0, "calls": 4, "avoided_calls": 0, "fallbacks": 0})
+
+    def test_rejected_notes_are_reviewed_again(self):
+        model = ScriptedModel(["No", "No", "['category']", "Yes"])
+        supervisor = SupervisorAgent(model, REQUIRED_KEYS)
+
+        supervisor.review(self.conversation, self.extracted)
+        self.assertEqual(self.extracted, {"order_number": "ORD12345"})
+        supervisor.review(self.conversation, self.extracted)
+        self.assertEqual(len(model.prompts), 4)
+
+    def test_async_review(self):
+        model = ScriptedModel(["Yes"])
+        supervisor = AsyncSupervisorAgent(model, REQUIRED_KEYS)
+
+        asyncio.run(supervisor.review(self.conversation, self.extracted))
+        asyncio.run(supervisor.review(self.conversation, self.extracted))
+        self.assertEqual(supervisor.stats(), {"reviews": 1, "skipped_reviews": 1, "calls": 1, "avoided_calls": 1, "fallbacks": 0})
+
+
+class TestVerdictMode(unittest.TestCase):
+
+    def setUp(self):
+        self.conversation = [{"role": "user", "content": "Order ORD12345, my package never arrived, it is urgent"}]
+        self.extracted = {"order_number": "ORD12345", "category": "shipping", "description": "package never arrived", "urgency": "low"}
+
+    def test_correct_notes_in_one_call(self):
+        model = ScriptedModel(['{"correct": true, "corrections": {}, "drop": []}'])
+        supervisor = SupervisorAgent(model, REQUIRED_KEYS, mode="verdict")
+
+        self.assertTrue(supervisor.validate(self.conversation, self.extracted))
+        self.assertEqual(len(model.prompts), 1)
+        self.assertEqual(supervisor.approved_notes, self.extracted)
+
+    def test_corrections_in_one_call(self):
+        model = ScriptedModel(['```json\n{"correct": false, "corrections": {"urgency": "high", "refund": "yes"}, "drop": []}\n```'])
+        supervisor = SupervisorAgent(model, REQUIRED_KEYS, mode="verdict")
+
+        self.assertTrue(supervisor.validate(self.conversation, self.extracted))
+        self.assertEqual(self.extracted["urgency"], "high")
+        self.assertNotIn("refund", self.extracted) # Only the required keys are corrected
+        self.assertEqual(len(model.prompts), 1)
+
+    def test_dropped_fields(self):
+        model = ScriptedModel(['{"correct": false, "corrections": {"urgency": "high"}, "drop": ["category"]}'])
+        supervisor = SupervisorAgent(model, REQUIRED_KEYS, mode="verdict")
+
+        self.assertFalse(supervisor.validate(self.conversation, self.extracted))
+        self.assertNotIn("category", self.extracted)
+        self.assertEqual(self.extracted["urgency"], "high")
+        self.assertEqual(supervisor.approved_notes, {})
+
+    def test_malformed_verdict_falls_back_to_the_dialogue(self):
+        for answer in ["Yes", '{"correct": "maybe"}', '{"correct": false, "drop": "category"}', "{" + " " * 3000 + '"correct": true}']:
+            model = ScriptedModel([answer, "No", "Yes", "{'urgency': 'medium'}"])
+            supervisor = SupervisorAgent(model, REQUIRED_KEYS, mode="verdict")
+            extracted = dict(self.extracted)
+
+            self.assertTrue(supervisor.validate(self.conversation, extracted))
+            self.assertEqual(extracted["urgency"], "medium")
+            self.assertEqual(len(model.prompts), 4)
+            self.assertEqual(supervisor.stats()["fallbacks"], 1)
+
+    def test_async_verdict(self):
+        model = ScriptedModel(['{"correct": "no", "corrections": {"urgency": "high"}}'])
+        supervisor = AsyncSupervisorAgent(model, REQUIRED_KEYS, mode="verdict")
+
+        self.assertTrue(asyncio.run(supervisor.validate(self.conversation, self.extracted)))
+        self.assertEqual(self.extracted["urgency"], "high")
+        self.assertEqual(len(model.prompts), 1)
+
+    def test_invalid_mode(self):
+        with self.assertRaises(ValueError):
+            SupervisorAgent(ScriptedModel([]), REQUIRED_KEYS, mode="json")
+
+
+if __name__ == "__main__":
+    unittest.main()
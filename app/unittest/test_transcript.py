@@ -0,0 +1,67 @@
+# app/unittest/test_transcript.py
+
+import unittest
+import os
+import sys
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../../")))
+from app.agent.transcript import TranscriptRenderer
+from app.agent.supervisor_agent import SupervisorAgent
+
+REQUIRED_KEYS = ["order_number", "category", "description", "urgency"]
+
+
+def turn(user, assistant):
+    return [{"role": "user", "content": user}, {"role": "assistant", "content": assistant}]
+
+
+class TestTranscriptRenderer(unittest.TestCase):
+
+    def setUp(self):
+        self.conversation = [{"role": "system", "content": "You are a support agent"}, {"role": "assistant", "content": "Hi, how can I help?"}]
+        self.conversation += turn("My package\n never arrived", "What is your order number?")
+
+    def test_compact_lines(self):
+        conversation = self.conversation[:1] + [{"role": "developer", "content": "Summary: the customer said hello", "summary": True}] + self.conversation[1:]
+        conversation.append({"role": "developer", "content": "Notes: {}"})
+        text = TranscriptRenderer().render(conversation)
+        self.assertEqual(text, "S: Summary: the customer said hello\nA: Hi, how can I help?\nU: My package never arrived\nA: What is your order number?")
+
+    def test_only_new_messages_are_rendered(self):
+        renderer = TranscriptRenderer()
+        notes = {"role": "developer", "content": "Notes: {}"}
+        renderer.render(self.conversation + [notes])
+
+        # Next check: the notes of the previous turn are replaced by new messages and new notes
+        conversation = self.conversation + turn("ORD123", "Thanks") + [{"role": "developer", "content": "Notes: {'order_number': 'ORD123'}"}]
+        text = renderer.render(conversation)
+        self.assertEqual(text, TranscriptRenderer().render(conversation))
+        self.assertTrue(text.endswith("A: What is your order number?\nU: ORD123\nA: Thanks"))
+        self.assertEqual((renderer.reused, renderer.rendered), (4, 5 + 3))
+
+    def test_changed_prefix(self):
+        renderer = TranscriptRenderer()
+        renderer.render(self.conversation + turn("ORD123", "Thanks"))
+
+        compacted = self.conversation[:1] + [{"role": "developer", "content": "Summary: lost package", "summary": True}] + turn("ORD123", "Thanks")
+        self.assertEqual(renderer.render(compacted), "S: Summary: lost package\nU: ORD123\nA: Thanks")
+        self.assertEqual(renderer.render([]), "")
+
+
+class TestSupervisorTranscript(unittest.TestCase):
+
+    def test_role_intro_uses_the_transcript(self):
+        prompts = []
+        class Model:
+            def chat(self, messages, temperature=0.3):
+                prompts.append(messages[0]["content"])
+                return "Yes"
+
+        supervisor = SupervisorAgent(Model(), REQUIRED_KEYS)
+        conversation = turn("Order ORD12345, my package never arrived, it is urgent", "Thanks")
+        supervisor.validate(conversation, {"order_number": "ORD12345", "category": "shipping", "description": "lost", "urgency": "high"})
+        self.assertIn("U: Order ORD12345, my package never arrived, it is urgent\nA: Thanks", prompts[0])
+        self.assertNotIn("'role'", prompts[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -59,6 +59,27 @@ class TestUserIO(unittest.TestCase):
         mock_audio_player.add_audio.assert_called_once_with(b"audio data")
         mock_audio_player.wait_for_completion.assert_called_once()
 
+    def test_write_stream_text_mode(self):
+        captured_output = StringIO()
+        sys.stdout = captured_output
+        result = self.io.write_stream(iter(["Hello", " world", "!"]), prefix="> ", audio=False)
+        sys.stdout = sys.__stdout__
+        self.assertEqual(result, "Hello world!")
+        self.assertIn("> Hello world!", captured_output.getvalue())
+
+    @patch("app.utils.io_comunications.AudioPlayer")
+    def test_write_stream_audio_mode_speaks_sentences(self, mock_audio_player_class):
+        mock_audio_player = MagicMock()
+        mock_audio_player_class.return_value = mock_audio_player
+
+        result = self.io.write_stream(iter(["Hi there. How", " can I help", "?"]), audio=True)
+
+        self.assertEqual(result, "Hi there. How can I help?")
+        self.assertEqual(self.mock_llm.text_to_speech.call_args_list[0][0][0], "Hi there.")
+        self.assertEqual(self.mock_llm.text_to_speech.call_args_list[1][0][0], "How can I help?")
+        mock_audio_player.finish.assert_called_once()
+        mock_audio_player.wait_for_completion.assert_called_once()
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -108,9 +108,21 @@ class AudioPlayer:
         self.p.terminate()
         #print("Audio playback completed.")
 
-    def add_audio(self, audio_data):
+    def add_audio(self, audio_data, last: bool = True):
+        """
+        Queues audio chunks for playback.
+
+        Args:
+            audio_data: Iterable of PCM chunks.
+            last (bool): If False, more audio will follow (e.g. sentence by sentence TTS of a streamed reply),
+                         playback keeps waiting until `finish()` or a call with last=True.
+        """
         for chunk in audio_data:
             self.audio_queue.put(chunk)
+        if last:
+            self.finish()
+
+    def finish(self):
         self.audio_added.set()  # Signal that all audio has been added
 
     def wait_for_completion(self):
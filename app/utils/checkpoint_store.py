@@ -0,0 +1,139 @@
+# app/utils/checkpoint_store.py
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from pathlib import Path
+from typing import List
+
+SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{1,128}$") # Also used as file name
+
+
+def _check_session_id(session_id: str) -> None:
+    if not SESSION_ID.match(session_id):
+        raise ValueError(f"Invalid session id: {session_id!r}")
+
+
+class FileCheckpointStore:
+    """
+    Keeps the checkpoint records of each session in a JSON lines file (one line appended per record).
+
+    A line cut by a crash while it was written is ignored when the records are loaded.
+    """
+    def __init__(self, directory: str = "data/checkpoints", fsync: bool = False) -> None:
+        """
+        Args:
+            directory (str): Directory of the session files, shared by the processes that can resume a session.
+            fsync (bool): If True each record is flushed to the disk before returning (slower, survives a power loss).
+        """
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+
+    def append(self, session_id: str, record: dict) -> int:
+        """
+        Appends a record to the session.
+
+        Returns:
+            int: Bytes written.
+        """
+        _check_session_id(session_id)
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        with open(self._path(session_id), "ab") as f:
+            f.write(line)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        return len(line)
+
+    def load(self, session_id: str) -> List[dict]:
+        """
+        Returns the records of the session in the order they were written (empty if there is none).
+        """
+        _check_session_id(session_id)
+        path = self._path(session_id)
+        if not path.exists():
+            return []
+        records = []
+        with open(path, "rb") as f:
+            for line in f:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break # Cut line, written when the process stopped
+        return records
+
+    def exists(self, session_id: str) -> bool:
+        _check_session_id(session_id)
+        return self._path(session_id).exists()
+
+    def delete(self, session_id: str) -> None:
+        _check_session_id(session_id)
+        self._path(session_id).unlink(missing_ok=True)
+
+    def list_sessions(self) -> List[str]:
+        return sorted(path.stem for path in self.directory.glob("*.jsonl"))
+
+    def _path(self, session_id: str) -> Path:
+        return self.directory / f"{session_id}.jsonl"
+
+
+class SQLiteCheckpointStore:
+    """
+    Keeps the checkpoint records of each session in a SQLite table (one row per record).
+
+    The database uses WAL mode, so several processes can append and read sessions at the same time.
+    """
+    def __init__(self, path: str = "data/checkpoints.sqlite3") -> None:
+        """
+        Args:
+            path (str): Database file (":memory:" for a private in-memory database).
+        """
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None) # Autocommit, one statement per record
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS checkpoints (session_id TEXT NOT NULL, seq INTEGER NOT NULL, record TEXT NOT NULL, PRIMARY KEY (session_id, seq))")
+
+    def append(self, session_id: str, record: dict) -> int:
+        """
+        Appends a record to the session.
+
+        Returns:
+            int: Bytes written.
+        """
+        _check_session_id(session_id)
+        data = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO checkpoints (session_id, seq, record) "
+                "SELECT ?, COALESCE(MAX(seq), -1) + 1, ? FROM checkpoints WHERE session_id = ?",
+                (session_id, data, session_id))
+        return len(data.encode("utf-8"))
+
+    def load(self, session_id: str) -> List[dict]:
+        """
+        Returns the records of the session in the order they were written (empty if there is none).
+        """
+        with self._lock:
+            rows = self._db.execute("SELECT record FROM checkpoints WHERE session_id = ? ORDER BY seq", (session_id,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def exists(self, session_id: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM checkpoints WHERE session_id = ? LIMIT 1", (session_id,)).fetchone() is not None
+
+    def delete(self, session_id: str) -> None:
+        with self._lock:
+            self._db.execute("DELETE FROM checkpoints WHERE session_id = ?", (session_id,))
+
+    def list_sessions(self) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute("SELECT DISTINCT session_id FROM checkpoints ORDER BY session_id")]
+
+    def close(self) -> None:
+        self._db.close()
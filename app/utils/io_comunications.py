@@ -1,6 +1,11 @@
 # app/utils/io_comunications.py
 from app.utils.audio_utils import AudioPlayer, record_audio_until_silence
+from typing import Iterable
+import asyncio
 import os
+import re
+
+SENTENCE_END = re.compile(r"[.!?](?=\s)") # End of a sentence, used to start the TTS of streamed text
 
 
 class UserIO:
@@ -100,3 +105,86 @@ class UserIO:
                 print(f"📄 (Text mode)")
             print(msg)
 
+    def write_stream(self, chunks: Iterable[str], prefix: str = "", audio: bool = False) -> str:
+        """
+        Writes a message that is still being generated (e.g. the deltas of `chat_stream`).
+
+        In text mode every delta is printed as soon as it arrives. In audio mode the text is
+        converted to speech sentence by sentence, so playback starts after the first sentence.
+
+        Args:
+            chunks (Iterable[str]): Text deltas of the message.
+            prefix (str): Text printed before the message (not spoken).
+            audio (bool): Whether to use audio output.
+
+        Returns:
+            str: The full message.
+        """
+        parts = []
+        if not audio:
+            if self.verbose:
+                print(f"📄 (Text mode)")
+            print(prefix, end="", flush=True)
+            for chunk in chunks:
+                parts.append(chunk)
+                print(chunk, end="", flush=True)
+            print()
+            return "".join(parts).strip()
+
+        if self.verbose:
+            print(f"🎤 (Audio mode, streaming)")
+        player = AudioPlayer()
+        pending = ""
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                pending += chunk
+                # Speak every complete sentence, keep the rest until more text arrives
+                ends = list(SENTENCE_END.finditer(pending))
+                if ends:
+                    cut = ends[-1].end()
+                    self._speak_sentence(player, pending[:cut])
+                    pending = pending[cut:]
+            self._speak_sentence(player, pending)
+        finally:
+            player.finish()
+
+        message = "".join(parts).strip()
+        print(f"[INFO] Converting text to speech: {message}")
+        player.wait_for_completion()
+        if self.verbose:
+            print(f"🎤 Finished Audio")
+        return message
+
+    def _speak_sentence(self, player: AudioPlayer, text: str) -> None:
+        text = text.strip()
+        if text:
+            player.add_audio(self.llm_model.text_to_speech(text), last=False)
+
+
+class AsyncUserIO:
+    """
+    Async adapter over UserIO for the async agents.
+
+    The console and the microphone are blocking, so each call runs in a worker thread and the
+    event loop keeps serving other sessions meanwhile. Network transports (or tests) can provide
+    any object with the same `async read(prefix, audio)` / `async write(msg, audio)` methods.
+    """
+    def __init__(self, userIO: UserIO):
+        """
+        Args:
+            userIO (UserIO): The blocking input/output used underneath.
+        """
+        self.userIO = userIO
+
+    async def read(self, prefix: str, audio: bool = False) -> str:
+        """
+        Reads input from the user, see `UserIO.read`.
+        """
+        return await asyncio.to_thread(self.userIO.read, prefix, audio)
+
+    async def write(self, msg: str, audio: bool = False) -> None:
+        """
+        Writes a message to the user, see `UserIO.write`.
+        """
+        await asyncio.to_thread(self.userIO.write, msg, audio)
@@ -0,0 +1,106 @@
+# app/utils/order_history_cache.py
+
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Tuple
+
+
+class OrderHistoryCache:
+    """
+    LRU cache of the stored sessions of each order, shared by all the agents of the process.
+
+    Entries are keyed by the path of the order file, so a lookup is a dict access plus a `stat` of
+    that file (no directory scan). The file size and modification time are kept with each entry,
+    a file written by another process since the load is read again, and `invalidate` drops the
+    entry when this process saves a new session. An order without a file is cached as well.
+
+    The cached sessions are shared between the callers and must not be modified.
+    """
+    def __init__(self, max_orders: int = 256) -> None:
+        """
+        Args:
+            max_orders (int): Orders kept in memory, the least recently used one is evicted above it.
+        """
+        if max_orders < 1:
+            raise ValueError("max_orders must be at least 1")
+        self.max_orders = max_orders
+        self._entries = OrderedDict() # path -> (file signature, value)
+        self._loading = {} # path -> loads in progress
+        self._stale = set() # Paths invalidated while they were loading, the loaded value is not stored
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, path: Path, loader: Callable[[Path], Any]) -> Any:
+        """
+        Returns the cached value of the file, calling `loader(path)` if it is not cached or it changed.
+
+        Args:
+            path (Path): Order file.
+            loader (Callable[[Path], Any]): Reads the file, called without the lock held.
+        """
+        key = str(path)
+        signature = self._signature(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            self._loading[key] = self._loading.get(key, 0) + 1
+
+        value, loaded = None, False
+        try:
+            value = loader(path)
+            loaded = True
+        finally:
+            with self._lock:
+                stale = key in self._stale or not loaded
+                self._loading[key] -= 1
+                if not self._loading[key]:
+                    del self._loading[key]
+                    self._stale.discard(key)
+                if not stale: # Else a new session was saved while loading (or the load failed), the next lookup reads it
+                    self._entries[key] = (signature, value)
+                    self._entries.move_to_end(key)
+                    while len(self._entries) > self.max_orders:
+                        self._entries.popitem(last=False)
+                        self.evictions += 1
+        return value
+
+    def invalidate(self, path: Path) -> None:
+        """
+        Drops the cached value of the file (called after writing it).
+        """
+        key = str(path)
+        with self._lock:
+            if key in self._loading:
+                self._stale.add(key)
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Returns:
+            Dict[str, int]: Cached orders, hits, misses, evictions and invalidations.
+        """
+        with self._lock:
+            return {"orders": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "evictions": self.evictions, "invalidations": self.invalidations}
+
+    @staticmethod
+    def _signature(key: str) -> Optional[Tuple[int, int]]:
+        try:
+            stat = os.stat(key)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
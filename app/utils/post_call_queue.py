@@ -0,0 +1,119 @@
+# app/utils/post_call_queue.py
+
+import json
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+
+class PostCallQueue:
+    """
+    Durable FIFO queue of finished calls waiting for their summary, frustration score and storage.
+
+    Each job is a JSON file that moves between three directories:
+        pending/     written with a temporary file and an atomic rename, so a job is never half written
+        processing/  claimed by a worker (the rename is atomic, only one worker gets each job)
+        failed/      jobs that failed `max_attempts` times, kept for inspection
+    A job is removed when it is done. After a restart, `recover` moves the jobs left in processing/
+    back to pending/, so a job is processed at least once (it may be processed twice if the process
+    stopped between saving the conversation and removing the job).
+    """
+    def __init__(self, directory: str = "data/post_call", fsync: bool = True) -> None:
+        """
+        Args:
+            directory (str): Directory of the queue, can be shared by the processes of one machine.
+            fsync (bool): If True each job is flushed to the disk before `put` returns (survives a power loss).
+        """
+        self.directory = Path(directory)
+        self.pending_dir = self.directory / "pending"
+        self.processing_dir = self.directory / "processing"
+        self.failed_dir = self.directory / "failed"
+        for path in (self.pending_dir, self.processing_dir, self.failed_dir):
+            path.mkdir(parents=True, exist_ok=True)
+        self.fsync = fsync
+        self.available = threading.Event() # Set by `put`, wakes the workers of this process
+
+    def put(self, job: dict) -> str:
+        """
+        Adds a job to the queue.
+
+        Returns:
+            str: Id of the job (ids sort in the order the jobs were added).
+        """
+        job_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        self._write(self.pending_dir, job_id, dict(job, id=job_id, attempts=job.get("attempts", 0)))
+        self.available.set()
+        return job_id
+
+    def claim(self) -> Optional[Tuple[str, dict]]:
+        """
+        Takes the oldest pending job.
+
+        Returns:
+            Optional[Tuple[str, dict]]: (job id, job), None if there is no pending job.
+        """
+        for name in sorted(os.listdir(self.pending_dir)):
+            if not name.endswith(".json"):
+                continue
+            try:
+                os.replace(self.pending_dir / name, self.processing_dir / name)
+            except FileNotFoundError:
+                continue # Claimed by another worker
+            with open(self.processing_dir / name, "r", encoding="utf-8") as f:
+                return name[:-len(".json")], json.load(f)
+        return None
+
+    def done(self, job_id: str) -> None:
+        (self.processing_dir / f"{job_id}.json").unlink(missing_ok=True)
+
+    def retry(self, job_id: str, job: dict) -> None:
+        """
+        Puts a claimed job back in pending/ with its attempt count.
+        """
+        self._write(self.pending_dir, job_id, job)
+        self.done(job_id)
+        self.available.set()
+
+    def fail(self, job_id: str, job: dict) -> None:
+        """
+        Moves a claimed job to failed/.
+        """
+        self._write(self.failed_dir, job_id, job)
+        self.done(job_id)
+
+    def recover(self) -> int:
+        """
+        Moves the jobs left in processing/ by a stopped process back to pending/.
+        Only call it when no other worker is using the queue.
+
+        Returns:
+            int: Jobs recovered.
+        """
+        names = [name for name in os.listdir(self.processing_dir) if name.endswith(".json")]
+        for name in names:
+            os.replace(self.processing_dir / name, self.pending_dir / name)
+        if names:
+            self.available.set()
+        return len(names)
+
+    def pending(self) -> int:
+        """
+        Returns:
+            int: Jobs not done yet (pending or being processed).
+        """
+        return sum(1 for path in (self.pending_dir, self.processing_dir) for name in os.listdir(path) if name.endswith(".json"))
+
+    def failed(self) -> List[str]:
+        return sorted(name[:-len(".json")] for name in os.listdir(self.failed_dir) if name.endswith(".json"))
+
+    def _write(self, directory: Path, job_id: str, job: dict) -> None:
+        tmp_path = directory / f".{job_id}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f, ensure_ascii=False)
+            if self.fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, directory / f"{job_id}.json")
@@ -1,13 +1,34 @@
 # app/utils/storage.py
 
 import json
+import os
+import stat
+import threading
+import uuid
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
-from typing import Any, List, TypedDict
+from typing import Any, Callable, Iterator, List, TypedDict
+
+try:
+    import fcntl
+except ImportError: # Not available on Windows, only the threads of one process are serialized there
+    fcntl = None
+
+from app.utils.order_history_cache import OrderHistoryCache
 
 DATA_DIR = Path("data/conversations")
 DATA_DIR.mkdir(parents=True, exist_ok=True)
 
+# Stored sessions of the orders looked up by the agents of this process, invalidated by save_conversation
+order_history = OrderHistoryCache(max_orders=256)
+
+# One lock per order file, the sessions of an order are read, changed and written under it.
+# The threads of this process take the threading.Lock, the processes (agents, post call workers,
+# bulk rescorer) an flock on a `.<order>.json.lock` file next to it.
+_file_locks = {}
+_file_locks_guard = threading.Lock()
+
 class Message(TypedDict):
     role: str
     text: str
@@ -33,6 +54,18 @@ def _get_file_path(order_number: str) -> Path:
     """
     return DATA_DIR / f"{order_number.upper()}.json"
 
+@contextmanager
+def _file_lock(file_path: Path) -> Iterator[None]:
+    with _file_locks_guard:
+        lock = _file_locks.setdefault(str(file_path), threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        with open(file_path.with_name(f".{file_path.name}.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX) # Released when the file is closed
+            yield
+
 def save_conversation(extracted: ExtractedData, convo: List[Message], summary: str, mode: str, frustration_score:int, lang: str) -> None:
     """
     Save a conversation session to the appropriate order-number-based JSON file.
@@ -57,16 +90,34 @@ def save_conversation(extracted: ExtractedData, convo: List[Message], summary: s
         "lang": lang
     }
 
-    if file_path.exists():
-        with open(file_path, "r") as f:
-            sessions = json.load(f)
-    else:
-        sessions = []
+    with _file_lock(file_path): # Other threads or processes (e.g. the post call workers) may save a session of the same order
+        sessions = _load_sessions(file_path)
+        sessions.append(new_session)
+        _write_sessions(file_path, sessions)
 
-    sessions.append(new_session)
+def update_sessions(order_number: str, update: Callable[[ConversationSession], bool]) -> int:
+    """
+    Updates the stored sessions of an order in place and writes the file back atomically
+    (a temporary file renamed over the old one, readers never see a half written file).
 
-    with open(file_path, "w") as f:
-        json.dump(sessions, f, indent=2)
+    The file is read and written under the lock of the order file (shared by the threads and the processes
+    of the machine), so sessions saved since an earlier load, or by `save_conversation` while the update
+    runs, are kept.
+
+    Args:
+        order_number (str): The order number of the sessions.
+        update (Callable[[ConversationSession], bool]): Called with each session, modifies it and returns True if it changed.
+
+    Returns:
+        int: Number of sessions updated (the file is not written if it is 0).
+    """
+    file_path = _get_file_path(order_number)
+    with _file_lock(file_path):
+        sessions = _load_sessions(file_path)
+        updated = sum(1 for session in sessions if update(session))
+        if updated:
+            _write_sessions(file_path, sessions)
+    return updated
 
 def load_conversations(order_number: str) -> List[ConversationSession]:
     """
@@ -78,8 +129,31 @@ def load_conversations(order_number: str) -> List[ConversationSession]:
     Returns:
         List[ConversationSession]: List of conversation sessions for the order.
     """
-    file_path = _get_file_path(order_number)
+    return _load_sessions(_get_file_path(order_number))
+
+def load_order_history(order_number: str) -> List[ConversationSession]:
+    """
+    Cached version of `load_conversations`, used to look up the history of an order every turn.
+
+    Args:
+        order_number (str): The order number to load conversations for.
+
+    Returns:
+        List[ConversationSession]: List of conversation sessions for the order (shared, do not modify it).
+    """
+    return order_history.get(_get_file_path(order_number), _load_sessions)
+
+def _write_sessions(file_path: Path, sessions: List[ConversationSession]) -> None:
+    # Unique temporary name, a writer never truncates the file of another one
+    tmp_path = file_path.with_name(f".{file_path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp_path, "x") as f:
+        json.dump(sessions, f, indent=2)
+    if file_path.exists():
+        os.chmod(tmp_path, stat.S_IMODE(file_path.stat().st_mode)) # Keep the mode of the replaced file
+    os.replace(tmp_path, file_path)
+    order_history.invalidate(file_path)
 
+def _load_sessions(file_path: Path) -> List[ConversationSession]:
     if file_path.exists():
         with open(file_path, "r") as f:
             return json.load(f)
@@ -0,0 +1,19 @@
+# app/utils/tokens.py
+
+from typing import Dict, List
+
+CHARS_PER_TOKEN = 4 # Rough average for English/Spanish text with the usual BPE tokenizers
+TOKENS_PER_MESSAGE = 4 # Role and separators added by the chat template
+
+
+def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    """
+    Estimates the prompt size of a list of messages (no tokenizer needed, ~4 characters per token).
+
+    Args:
+        messages (List[Dict[str, str]]): A list of message dictionaries, each with 'role' and 'content'.
+
+    Returns:
+        int: Estimated number of tokens.
+    """
+    return sum(TOKENS_PER_MESSAGE + len(m.get("content", "")) // CHARS_PER_TOKEN + 1 for m in messages)
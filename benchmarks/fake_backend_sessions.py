@@ -0,0 +1,112 @@
+# benchmarks/fake_backend_sessions.py
+#
+# Runs concurrent natural sessions of the AsyncCustomerSupportAgent against the FakeLLMServer
+# (Ollama protocol) and reports the session throughput, the latency of each turn as seen by the
+# user and the request timing of the transport. No model backend is needed.
+#
+# Run from the project root:
+#   python -m benchmarks.fake_backend_sessions --sessions 50 --first-token 0.2 --per-token 0.01 --error-rate 0.02
+#   python -m benchmarks.fake_backend_sessions --supervisor-mode verdict   # single call supervisor review
+#
+# The fake server runs in this process by default. For many sessions start it in its own process
+# (python -m app.llm_modules.fake_llm_server ...) or use a real Ollama server, and pass --base-url.
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from app.agent.async_customer_support_agent import AsyncCustomerSupportAgent
+from app.llm_modules.fake_llm_server import FakeLLMServer, LatencyProfile
+from app.llm_modules.http_transport import HTTPTransport
+from app.llm_modules.ollama_mistral7b import OllamaMistral7B_Model
+from app.utils import storage
+
+USER_TURNS = [
+    "Hi, my order ORD{n} never arrived",
+    "It is a shipping problem, the package has been lost for two weeks",
+    "This is really urgent, high priority please",
+]
+
+
+class TimedScriptedIO:
+    """
+    Async input/output that answers with the scripted user turns and records the time between
+    each user message and the next message of the agent.
+    """
+    def __init__(self, order: int):
+        self.turns = [turn.format(n=order) for turn in USER_TURNS]
+        self.read_at = None
+        self.latencies = []
+
+    async def read(self, prefix, audio=False):
+        self.read_at = time.perf_counter()
+        return self.turns.pop(0) if self.turns else "That is all"
+
+    async def write(self, msg, audio=False):
+        if self.read_at is not None:
+            self.latencies.append(time.perf_counter() - self.read_at)
+            self.read_at = None
+
+
+def percentile(values, q):
+    values = sorted(values)
+    return values[int(q * (len(values) - 1))] if values else None
+
+
+async def run_sessions(model, sessions: int, extraction_mode: str, supervisor_mode: str = "dialogue"):
+    ios = [TimedScriptedIO(10000 + i) for i in range(sessions)]
+    agents = [AsyncCustomerSupportAgent(model, mode="natural", audio_mode=False, extraction_mode=extraction_mode, supervisor_mode=supervisor_mode, userIO=io) for io in ios]
+    await asyncio.gather(*(agent.start() for agent in agents))
+    return [latency for io in ios for latency in io.latencies]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent agent sessions against the fake LLM server.")
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--extraction-mode", default="per_field", choices=["per_field", "structured"])
+    parser.add_argument("--supervisor-mode", default="dialogue", choices=["dialogue", "verdict"])
+    parser.add_argument("--first-token", type=float, default=0.2)
+    parser.add_argument("--per-token", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--distribution", default="lognormal", choices=["fixed", "uniform", "lognormal"])
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--pool-size", type=int, default=64)
+    parser.add_argument("--base-url", default=None, help="Ollama API to use instead of an in-process fake server")
+    args = parser.parse_args()
+
+    # Keep the benchmark sessions out of data/conversations
+    data_dir = tempfile.mkdtemp()
+    original_data_dir = storage.DATA_DIR
+    storage.DATA_DIR = Path(data_dir)
+
+    server = None
+    if not args.base_url:
+        latency = LatencyProfile(args.first_token, args.per_token, args.jitter, args.distribution)
+        server = FakeLLMServer(latency=latency, error_rate=args.error_rate).start()
+    try:
+        model = OllamaMistral7B_Model(base_url=args.base_url or server.base_url, transport=HTTPTransport(pool_size=args.pool_size))
+        start = time.perf_counter()
+        latencies = asyncio.run(run_sessions(model, args.sessions, args.extraction_mode, args.supervisor_mode))
+        elapsed = time.perf_counter() - start
+    finally:
+        if server:
+            server.stop()
+        storage.DATA_DIR = original_data_dir
+        shutil.rmtree(data_dir)
+
+    metrics = model.get_metrics()
+    print(f"sessions: {args.sessions}  extraction: {args.extraction_mode}  supervisor: {args.supervisor_mode}  time: {elapsed:.2f}s  throughput: {args.sessions / elapsed:.1f} sessions/s")
+    print(f"turn latency  p50: {percentile(latencies, 0.50):.3f}s  p95: {percentile(latencies, 0.95):.3f}s  p99: {percentile(latencies, 0.99):.3f}s")
+    print(f"requests: {metrics['count']}  errors: {metrics['errors']}  request p50: {metrics['p50']:.3f}s  p95: {metrics['p95']:.3f}s")
+    if server:
+        print(f"injected errors: {server.stats()['errors']}")
+
+
+if __name__ == "__main__":
+    main()
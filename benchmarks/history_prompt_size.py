@@ -0,0 +1,66 @@
+# benchmarks/history_prompt_size.py
+#
+# Compares the size of the order history added to the reply prompts when the full previous sessions
+# are dumped (the former behaviour) and when the HistoryRetriever selects the relevant snippets,
+# for customers with a growing number of previous calls. The previous calls are the recorded
+# sessions of data/conversations repeated, the query is the user messages of one of them.
+# Also reports the time to build the index and to score a query.
+#
+# Run from the project root:
+#   python -m benchmarks.history_prompt_size --calls 1,5,10,50,200
+
+import argparse
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from app.utils.tokens import CHARS_PER_TOKEN
+from app.agent.customer_support_agent import CustomerSupportAgent
+from app.agent.history_retriever import HistoryRetriever
+from app.utils.storage import list_all_orders, load_conversations
+
+ROLE_PREFIX = {"user": "[USER]", "assistant": "[YOU]", "developer": "[DEVELOPER]", "summary": "[SUMMARY]"}
+
+
+def render(sessions_messages) -> str:
+    msg = ""
+    for session, messages in sessions_messages:
+        msg += f"\n\n{session.get('timestamp', '')} -> "
+        for message in messages:
+            if message["role"] in ROLE_PREFIX:
+                msg += f"\n{ROLE_PREFIX[message['role']]}: \"{message['content']}\""
+    return msg
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Order history tokens per prompt, full dump vs retrieval.")
+    parser.add_argument("--calls", default="1,5,10,50,200", help="Previous calls of the customer")
+    parser.add_argument("--budget", type=int, default=CustomerSupportAgent.history_budget)
+    parser.add_argument("--top-k", type=int, default=CustomerSupportAgent.history_top_k)
+    args = parser.parse_args()
+
+    recorded = [s for order in list_all_orders() for s in load_conversations(order)]
+    if not recorded:
+        print("No sessions found in data/conversations")
+        return
+    query = "\n".join(m["content"] for m in recorded[0]["conversation"] if m["role"] == "user")
+
+    print(f"{'calls':>6}{'full ~tokens':>14}{'retrieved ~tokens':>19}{'index ms':>10}{'query ms':>10}")
+    for calls in [int(n) for n in args.calls.split(",")]:
+        sessions = [recorded[i % len(recorded)] for i in range(calls)]
+        full = render((s, s["conversation"]) for s in sessions)
+
+        start = time.perf_counter()
+        retriever = HistoryRetriever(sessions, top_k=args.top_k, max_tokens=args.budget)
+        index_time = time.perf_counter() - start
+        start = time.perf_counter()
+        retrieved = render(retriever.retrieve(query))
+        query_time = time.perf_counter() - start
+
+        print(f"{calls:>6}{len(full) // CHARS_PER_TOKEN:>14}{len(retrieved) // CHARS_PER_TOKEN:>19}"
+              f"{1000 * index_time:>10.2f}{1000 * query_time:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
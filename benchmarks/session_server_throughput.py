@@ -0,0 +1,135 @@
+# benchmarks/session_server_throughput.py
+#
+# Runs scripted client sessions against the SessionServer at increasing concurrency and reports,
+# for each level, the session throughput, the turn latency seen by the clients (user message sent
+# -> next agent message received) and the CPU time used per session. The largest level whose p95
+# turn latency stays under the target is the capacity of one server process, which runs one event
+# loop and so uses one core.
+#
+# Run from the project root:
+#   python -m benchmarks.session_server_throughput --levels 10,50,100,200 --target-p95 2.0
+#
+# By default the session server and a FakeLLMServer run in this process, so the CPU time includes
+# the fake backend and the clients. For numbers of the server alone, start it in its own process
+# (python -m app.server.session_server --backend ollama --base-url ...) and pass --server host:port.
+
+import argparse
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from app.llm_modules.fake_llm_server import FakeLLMServer, LatencyProfile
+from app.llm_modules.http_transport import HTTPTransport
+from app.llm_modules.ollama_mistral7b import OllamaMistral7B_Model
+from app.server.session_server import SessionClient, SessionServer
+from app.utils import storage
+from benchmarks.fake_backend_sessions import USER_TURNS, percentile
+
+
+async def client_session(host: str, port: int, order: int, latencies: list) -> str:
+    """
+    Plays the scripted user turns of one session and records the latency of each turn.
+    """
+    client = await SessionClient.connect(host, port, mode="natural")
+    turns = [turn.format(n=order) for turn in USER_TURNS]
+    sent_at = None
+    try:
+        while True:
+            event = await client.receive()
+            if event is None:
+                return "closed"
+            if event["type"] == "message" and sent_at is not None:
+                latencies.append(time.perf_counter() - sent_at)
+                sent_at = None
+            elif event["type"] == "input":
+                await client.send(turns.pop(0) if turns else "That is all")
+                sent_at = time.perf_counter()
+            elif event["type"] == "end":
+                return event["reason"]
+    finally:
+        await client.close()
+
+
+async def run_level(host: str, port: int, sessions: int, first_order: int):
+    latencies = []
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    reasons = await asyncio.gather(*(client_session(host, port, first_order + i, latencies) for i in range(sessions)), return_exceptions=True)
+    return {
+        "elapsed": time.perf_counter() - start,
+        "cpu": time.process_time() - cpu_start,
+        "completed": sum(1 for reason in reasons if reason == "completed"),
+        "latencies": latencies,
+    }
+
+
+async def run(args, levels):
+    server = None
+    if args.server:
+        host, port = args.server.rsplit(":", 1)
+        port = int(port)
+    else:
+        model = OllamaMistral7B_Model(base_url=args.base_url, transport=HTTPTransport(pool_size=args.pool_size))
+        server = await SessionServer(model, port=0, max_sessions=max(levels)).start()
+        host, port = server.host, server.port
+
+    results = []
+    try:
+        for i, sessions in enumerate(levels):
+            results.append((sessions, await run_level(host, port, sessions, 10000 * (i + 1))))
+    finally:
+        if server:
+            await server.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Session throughput and turn latency of the session server.")
+    parser.add_argument("--levels", default="10,50,100,200", help="Concurrent sessions of each run")
+    parser.add_argument("--target-p95", type=float, default=2.0, help="Turn latency target (seconds)")
+    parser.add_argument("--first-token", type=float, default=0.2)
+    parser.add_argument("--per-token", type=float, default=0.01)
+    parser.add_argument("--jitter", type=float, default=0.3)
+    parser.add_argument("--pool-size", type=int, default=64)
+    parser.add_argument("--base-url", default=None, help="Ollama API to use instead of an in-process fake server")
+    parser.add_argument("--server", default=None, help="host:port of a running session server")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.levels.split(",")]
+
+    # Keep the benchmark sessions out of data/conversations
+    data_dir = tempfile.mkdtemp()
+    original_data_dir = storage.DATA_DIR
+    storage.DATA_DIR = Path(data_dir)
+
+    fake_server = None
+    if not args.server and not args.base_url:
+        fake_server = FakeLLMServer(latency=LatencyProfile(args.first_token, args.per_token, args.jitter, "lognormal")).start()
+        args.base_url = fake_server.base_url
+    try:
+        results = asyncio.run(run(args, levels))
+    finally:
+        if fake_server:
+            fake_server.stop()
+        storage.DATA_DIR = original_data_dir
+        shutil.rmtree(data_dir)
+
+    capacity = 0
+    print(f"{'sessions':>8} {'completed':>9} {'time':>7} {'sessions/s':>10} {'p50':>7} {'p95':>7} {'p99':>7} {'cpu/session':>11}")
+    for sessions, result in results:
+        latencies = result["latencies"]
+        p95 = percentile(latencies, 0.95)
+        if p95 is not None and p95 <= args.target_p95 and result["completed"] == sessions:
+            capacity = max(capacity, sessions)
+        print(f"{sessions:>8} {result['completed']:>9} {result['elapsed']:>6.2f}s {sessions / result['elapsed']:>10.1f} "
+              f"{percentile(latencies, 0.50) or 0:>6.3f}s {p95 or 0:>6.3f}s {percentile(latencies, 0.99) or 0:>6.3f}s "
+              f"{1000 * result['cpu'] / sessions:>9.1f}ms")
+    print(f"concurrent sessions per core at p95 <= {args.target_p95}s: {capacity or f'< {levels[0]}'}")
+
+
+if __name__ == "__main__":
+    main()
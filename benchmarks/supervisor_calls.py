@@ -0,0 +1,96 @@
+# benchmarks/supervisor_calls.py
+#
+# Replays the natural sessions recorded in data/conversations through the supervisor schedule of
+# CustomerSupportAgent._start_natural (a check every `check_every_n_msg` turns and once all the fields
+# are collected) and reports the supervisor reviews and LLM calls made by `validate` (every scheduled
+# check is reviewed by the model, the agent default) and by the adaptive `review` (the model only
+# reviews new notes, CustomerSupportAgent.adaptive_supervisor = True), with the calls `review` reports
+# as avoided and the calls it actually saves compared with `validate`.
+# No backend is needed: the notes of each turn are the recorded values given so far, and a replay
+# model approves the notes that match the recorded ones. The recorded sessions give about one field
+# per turn, the `stall` rows add turns without new information after each user message (small talk,
+# repeated or unclear answers) to show longer calls.
+#
+# Run from the project root:
+#   python -m benchmarks.supervisor_calls
+
+import os
+import sys
+from collections import Counter
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from app.agent.customer_support_agent import CustomerSupportAgent
+from app.agent.supervisor_agent import SupervisorAgent
+from app.utils.storage import list_all_orders, load_conversations
+
+REQUIRED_KEYS = ["order_number", "category", "description", "urgency"]
+
+
+class ApprovingModel:
+    """
+    Stand-in supervisor model: answers "Yes" to the notes check if the notes are the recorded values.
+    """
+    def __init__(self, extracted: dict):
+        self.extracted = extracted
+        self.notes = {}
+
+    def chat(self, messages, temperature: float = 0.3) -> str:
+        if len(messages) == 2: # notes_check
+            return "Yes" if all(self.extracted.get(key) == value for key, value in self.notes.items()) else "No"
+        if len(messages) == 4: # fix_prompt
+            return "No"
+        return "[]" # which_incorrect
+
+
+def replay_session(session: dict, adaptive: bool, stall: int = 0) -> dict:
+    """
+    Replays the user turns of a natural session, the i-th recorded field is known from the (i+1)-th
+    recorded user message on. Each recorded user message is followed by `stall` turns without new information.
+    """
+    lang = session.get("lang", "en")
+    model = ApprovingModel(session["extracted"])
+    supervisor = SupervisorAgent(model, REQUIRED_KEYS, lang)
+    validate = supervisor.review if adaptive else supervisor.validate
+    reveal_turn = {key: i + 1 for i, key in enumerate(session["extracted"])}
+
+    conversation = []
+    user_turns = 0
+    msgs_count = 1
+    for message in session["conversation"]:
+        if message["role"] == "developer":
+            continue
+        conversation.append(message)
+        if message["role"] != "user":
+            continue
+
+        user_turns += 1
+        known = {key: value for key, value in session["extracted"].items() if reveal_turn[key] <= user_turns}
+        for turn in range(stall + 1):
+            if turn:
+                conversation += [{"role": "assistant", "content": "Could you tell me more?"}, {"role": "user", "content": "Ok."}]
+            extracted = dict(known)
+            model.notes = dict(extracted)
+            complete = all(key in extracted for key in REQUIRED_KEYS)
+            if (complete or msgs_count % CustomerSupportAgent.check_every_n_msg == 0) and validate(conversation, extracted):
+                return supervisor.stats()
+            msgs_count += 1
+    return supervisor.stats()
+
+
+def main():
+    sessions = [s for order in list_all_orders() for s in load_conversations(order) if s.get("mode") == "natural"]
+    print(f"{len(sessions)} natural sessions")
+    print(f"{'stall':>5} {'policy':<10} {'reviews':>8} {'skipped':>8} {'calls':>6} {'avoided':>8} {'saved':>6}")
+    for stall in (0, 1, 3):
+        baseline = None
+        for adaptive in (False, True):
+            totals = Counter()
+            for session in sessions:
+                totals.update(replay_session(session, adaptive, stall))
+            baseline = totals["calls"] if baseline is None else baseline
+            print(f"{stall:>5} {'review' if adaptive else 'validate':<10} {totals['reviews']:>8} {totals['skipped_reviews']:>8} "
+                  f"{totals['calls']:>6} {totals['avoided_calls']:>8} {baseline - totals['calls']:>6}")
+
+
+if __name__ == "__main__":
+    main()
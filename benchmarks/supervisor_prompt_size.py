@@ -0,0 +1,70 @@
+# benchmarks/supervisor_prompt_size.py
+#
+# Compares the size of the supervisor `role_intro` prompt when the conversation is embedded as the
+# `repr` of the message dicts (the former behaviour) and as a compact TranscriptRenderer transcript,
+# over the sessions recorded in data/conversations. Each user message of a session is replayed as
+# one supervisor check (the conversation so far plus the notes of the turn), the worst case of a
+# review every turn. Also reports the messages rendered by the memoized renderer and the time per check.
+#
+# Run from the project root:
+#   python -m benchmarks.supervisor_prompt_size
+
+import os
+import sys
+import time
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "../")))
+
+from app.agent.transcript import TranscriptRenderer
+from app.utils.prompt_loader import load_prompts
+from app.utils.storage import list_all_orders, load_conversations
+from app.utils.tokens import estimate_tokens
+
+
+def checks(session: dict):
+    """
+    Yields the conversation given to the supervisor after each user message of the session.
+    """
+    prompts = load_prompts("customer_support", session.get("lang", "en"))
+    conversation = []
+    for message in session["conversation"]:
+        if message["role"] == "developer" and conversation and not message.get("summary"):
+            continue # Notes saved with the session, the notes of the turn are added below
+        conversation.append(message)
+        if message["role"] == "user":
+            yield conversation + [{"role": "developer", "content": prompts["partial_notes"].format(extracted=session["extracted"])}]
+
+
+def main():
+    sessions = [s for order in list_all_orders() for s in load_conversations(order)]
+    totals = {"repr": 0, "transcript": 0}
+    repr_time = transcript_time = 0.0
+    n_checks = messages = rendered = 0
+    for session in sessions:
+        lang = session.get("lang", "en")
+        intro = load_prompts("supervisor", lang)["role_intro"]
+        renderer = TranscriptRenderer()
+        for conversation in checks(session):
+            start = time.perf_counter()
+            full = intro.format(conversation=conversation)
+            repr_time += time.perf_counter() - start
+
+            start = time.perf_counter()
+            compact = intro.format(conversation=renderer.render(conversation))
+            transcript_time += time.perf_counter() - start
+
+            totals["repr"] += estimate_tokens([{"role": "system", "content": full}])
+            totals["transcript"] += estimate_tokens([{"role": "system", "content": compact}])
+            n_checks += 1
+            messages += len(conversation)
+        rendered += renderer.rendered
+
+    print(f"{len(sessions)} sessions, {n_checks} supervisor checks")
+    print(f"{'conversation':<12} {'tokens':>8} {'per check':>10} {'us/check':>9}")
+    for name, elapsed in (("repr", repr_time), ("transcript", transcript_time)):
+        print(f"{name:<12} {totals[name]:>8} {totals[name] / n_checks:>10.1f} {1e6 * elapsed / n_checks:>9.1f}")
+    print(f"saved: {1 - totals['transcript'] / totals['repr']:.1%} of the role_intro tokens")
+    print(f"messages rendered: {rendered} of {messages} embedded (the rest reused from the previous check)")
+
+
+if __name__ == "__main__":
+    main()
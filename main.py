@@ -2,6 +2,7 @@
 
 from app.llm_modules.open_ai import OpenAI_Model
 from app.llm_modules.ollama_mistral7b import OllamaMistral7B_Model
+from app.llm_modules.model_router import Routed_Model
 from app.agent.customer_support_agent import CustomerSupportAgent
 
 from setup_vars import *
@@ -46,6 +47,11 @@ descriptions = {
     "READ_SILENCE_DURATION": ("Bot wait time on silence (sec)", "e.g., 2.0"),
     "READ_MAX_DURATION": ("Max listening time per user input (sec)", "e.g., 60"),
     "READ_SILENCE_THRESHOLD": ("Volume sensitivity for silence detection", "Lower = more sensitive, e.g., 5"),
+    "EXTRACTION_MODE": ("How the notes are extracted each turn", "Options: 'per_field' (one call per missing field), 'structured' (one JSON call per turn)"),
+    "CONTEXT_BUDGET": ("Max estimated tokens per prompt before summarizing older turns", "e.g., 3000 (0 = never summarize)"),
+    "SPECULATIVE_REPLY": ("Start the reply while the notes are extracted (natural mode)", "True = lower latency, False = one reply call per turn"),
+    "FAST_EXTRACTION": ("Extract the fixed format fields with local rules first", "True = fewer LLM calls, False = every field is asked to the LLM"),
+    "SUPERVISOR_MODE": ("How the supervisor reviews the notes", "Options: 'dialogue' (2-4 yes/no and fix calls), 'verdict' (one JSON call)"),
 }
 
 type_cast = {
@@ -57,6 +63,11 @@ type_cast = {
     "READ_SILENCE_DURATION": float,
     "READ_MAX_DURATION": int,
     "READ_SILENCE_THRESHOLD": float,
+    "EXTRACTION_MODE": str,
+    "CONTEXT_BUDGET": int,
+    "SPECULATIVE_REPLY": str_to_bool,
+    "FAST_EXTRACTION": str_to_bool,
+    "SUPERVISOR_MODE": str,
 }
 
 if __name__ == "__main__":
@@ -68,7 +79,12 @@ if __name__ == "__main__":
         "VERBOSE": VERBOSE,
         "READ_SILENCE_DURATION": READ_SILENCE_DURATION,
         "READ_MAX_DURATION": READ_MAX_DURATION,
-        "READ_SILENCE_THRESHOLD": READ_SILENCE_THRESHOLD
+        "READ_SILENCE_THRESHOLD": READ_SILENCE_THRESHOLD,
+        "EXTRACTION_MODE": EXTRACTION_MODE,
+        "CONTEXT_BUDGET": CONTEXT_BUDGET,
+        "SPECULATIVE_REPLY": SPECULATIVE_REPLY,
+        "FAST_EXTRACTION": FAST_EXTRACTION,
+        "SUPERVISOR_MODE": SUPERVISOR_MODE
     }
 
     config = default_config.copy()
@@ -94,8 +110,19 @@ if __name__ == "__main__":
 
 
 
+    # This runs one interactive session, to host many sessions over the network use
+    # python -m app.server.session_server --port 8765 (see app/server/session_server.py for the protocol)
     model = OpenAI_Model()
     # Can also use the model = OllamaMistral7B_Model() Local model. (Only supports AUDIO_MODE = False)
+    # Or mix them by call purpose, e.g. the short classification prompts on the local model:
+    # model = Routed_Model({"extraction": OllamaMistral7B_Model(), "frustration": OllamaMistral7B_Model()},
+    #                      default=OpenAI_Model(), fallback=OpenAI_Model(), latency_budgets={"extraction": 5.0})
+    # When several sessions share one Ollama server, wrap it with Batched_Model(OllamaMistral7B_Model(), slots=OLLAMA_NUM_PARALLEL)
+    # To cut the tail latency, Hedged_Model(model, hedge_percentile=0.95, deadlines={"reply": 20.0, "extraction": 8.0})
+    # Many agents on one account: share a RateGovernor(requests_per_minute=500, tokens_per_minute=200000, max_in_flight=32)
+    # between the instances, e.g. OpenAI_Model(governor=governor), replies are sent before summaries and frustration scores
+    # To end the call with the last reply, pass post_call_queue=PostCallQueue("data/post_call") to the agent and run
+    # PostCallWorker(model, queue).start(), the summary, the frustration score and the storage are done in the background
 
 
     agent = CustomerSupportAgent(model=model,
@@ -106,5 +133,10 @@ if __name__ == "__main__":
                                  verbose=config["VERBOSE"],
                                  read_silence_duration=config["READ_SILENCE_DURATION"],
                                  read_max_duration=config["READ_MAX_DURATION"],
-                                 read_silence_threshold=config["READ_SILENCE_THRESHOLD"])
+                                 read_silence_threshold=config["READ_SILENCE_THRESHOLD"],
+                                 extraction_mode=config["EXTRACTION_MODE"],
+                                 context_budget=config["CONTEXT_BUDGET"],
+                                 speculative_reply=config["SPECULATIVE_REPLY"],
+                                 fast_extraction=config["FAST_EXTRACTION"],
+                                 supervisor_mode=config["SUPERVISOR_MODE"])
     agent.start()
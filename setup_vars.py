@@ -5,4 +5,9 @@ LANG = "en" # Supported lang en/es
 VERBOSE = False # In order to allow debug comments to see full prompts, responses, and usefull extra info
 READ_SILENCE_DURATION = 2.0 # Seconds the bot is waiting. How long to wait in seconds before stopping on silence.
 READ_MAX_DURATION = 60 # Max Seconds the bot is listening to the user.
-READ_SILENCE_THRESHOLD = 5 # Threshold use to define "silence". Lower values more sensitive to lower volumes
\ No newline at end of file
+READ_SILENCE_THRESHOLD = 5 # Threshold use to define "silence". Lower values more sensitive to lower volumes
+EXTRACTION_MODE = "per_field" # Supported modes per_field/structured (structured asks for all the missing fields in a single JSON call per turn)
+CONTEXT_BUDGET = 3000 # Estimated tokens allowed per prompt, older turns and the order history are summarized above it (0 to disable)
+SPECULATIVE_REPLY = False # If True the reply starts while the notes are extracted, it is generated again only if the notes change its prompt
+FAST_EXTRACTION = False # If True order numbers and whole category/urgency answers are extracted with local rules, the LLM is only asked for the rest
+SUPERVISOR_MODE = "dialogue" # Supported modes dialogue/verdict (verdict reviews the notes with one JSON call, dialogue with 2-4 yes/no and fix calls)